@@ -3,63 +3,205 @@ Flask application for Moroccan Spice Classification
 Deploys the best EfficientNet-B3 model as a web service
 """
 
+import time
+_import_start = time.perf_counter()
+
 import torch
 import torch.nn as nn
 from PIL import Image
 import numpy as np
 from pathlib import Path
 import json
-from flask import Flask, render_template, request, jsonify
+import hmac
+import io
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Request, Response, g, render_template, request, jsonify
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import os
-from datetime import datetime
+from batching import BatchScheduler
+from upload_writer import UploadWriter
+from prediction_cache import PredictionCache, content_key
+from inference_backends import BACKENDS, backend_path, load_backend
+from cascade import MOBILENET_IMAGE_SIZE, MOBILENET_PATH, load_mobilenet, mobilenet_preprocessor, needs_escalation
+from preprocessing import Preprocessor
+from image_quality import BLUR_THRESHOLD, ImageQualityError, check_usable, quality_rejections
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Counter, Gauge, Histogram, Registry, process_rss_bytes
+from profiling import RequestProfiler
+from augmentation import TTA_VIEWS, TestTimeAugmentation
+from model_registry import (REGISTRY_CONFIG_PATH, ModelRegistry, ModelSpec, ModelUnavailableError,
+                            load_registry_config, load_torchscript)
 
-# Try to import EfficientNet
+# EfficientNet must be installed beforehand (pip install -r requirements.txt)
 try:
     from efficientnet_pytorch import EfficientNet
 except ImportError:
-    import subprocess
-    subprocess.check_call(['pip', 'install', 'efficientnet_pytorch'])
-    from efficientnet_pytorch import EfficientNet
+    EfficientNet = None
+    print("❌ efficientnet_pytorch is not installed: pip install -r requirements.txt")
+
+# Startup time breakdown (seconds), reported on /health
+STARTUP_TIMINGS = {'import': time.perf_counter() - _import_start}
+
+class SpiceRequest(Request):
+    """Request with a larger upload limit for the batch endpoint"""
+    
+    @property
+    def max_content_length(self):
+        if self.path == '/predict/batch':
+            return MAX_BATCH_UPLOAD_SIZE
+        return super().max_content_length
 
 app = Flask(__name__)
+app.request_class = SpiceRequest
 CORS(app)
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif'}
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz')
+
+# /predict/batch: total upload size, images per forward pass, decoder threads
+MAX_BATCH_UPLOAD_SIZE = int(os.getenv('MAX_BATCH_UPLOAD_MB', 500)) * 1024 * 1024
+BATCH_CHUNK_SIZE = int(os.getenv('BATCH_CHUNK_SIZE', 16))
+DECODE_WORKERS = int(os.getenv('DECODE_WORKERS', min(8, os.cpu_count() or 1)))
+
+# Uploads are decoded from memory; only a sample is kept on disk
+UPLOAD_SAMPLE_RATE = float(os.getenv('UPLOAD_SAMPLE_RATE', 0.01))
+UPLOAD_RETENTION = int(os.getenv('UPLOAD_RETENTION', 1000))
+
+# Prediction cache keyed by the hash of the uploaded bytes ('memory', 'disk' or 'off')
+PREDICTION_CACHE = os.getenv('PREDICTION_CACHE', 'memory')
+PREDICTION_CACHE_SIZE = int(os.getenv('PREDICTION_CACHE_SIZE', 1024))
+PREDICTION_CACHE_TTL = float(os.getenv('PREDICTION_CACHE_TTL', 3600))
+PREDICTION_CACHE_PATH = os.getenv('PREDICTION_CACHE_PATH', 'cache/predictions.sqlite')
+
+MODEL_PATH = Path('models/model_efficientnet_best.pth')
 
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+# Offline startup: build the architecture without ImageNet weights and load only the local checkpoint
+OFFLINE_STARTUP = os.getenv('OFFLINE_STARTUP', '1') == '1'
+MODEL_MMAP = os.getenv('MODEL_MMAP', '0') == '1'
+MODEL_WARMUP = os.getenv('MODEL_WARMUP', '1')  # '1' at import, 'worker' after fork (gunicorn.conf.py), '0' never
+IMAGE_SIZE = 300
+PREPROCESS_DRAFT = os.getenv('PREPROCESS_DRAFT', '1') == '1'  # reduced-resolution JPEG decoding
+
+# Quality pre-filter: checks that reject an upload before inference (empty = disabled)
+QUALITY_CHECKS = ('too_dark', 'too_bright', 'low_contrast', 'blurry')
+QUALITY_REJECT = [c.strip() for c in os.getenv('QUALITY_REJECT', '').split(',') if c.strip()]
+if not set(QUALITY_REJECT) <= set(QUALITY_CHECKS):
+    raise ValueError(f"QUALITY_REJECT must only contain {QUALITY_CHECKS}, got {QUALITY_REJECT}")
+QUALITY_BLUR_THRESHOLD = float(os.getenv('QUALITY_BLUR_THRESHOLD', BLUR_THRESHOLD))
+
+# Inference backend: eager, torchscript, int8_dynamic (FC layer only) or int8_static (see scripts/export_backends.py)
+INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'eager')
+if INFERENCE_BACKEND not in BACKENDS:
+    raise ValueError(f"INFERENCE_BACKEND must be one of {BACKENDS}, got {INFERENCE_BACKEND}")
+MODEL_ARTIFACT = backend_path(INFERENCE_BACKEND) or MODEL_PATH
+
+# Cascade: MobileNetV3 answers when its confidence reaches the threshold, EfficientNet-B3 otherwise
+INFERENCE_MODE = os.getenv('INFERENCE_MODE', 'single')  # 'single' or 'cascade'
+CASCADE_THRESHOLD = float(os.getenv('CASCADE_THRESHOLD', 0.90))
+
+# Model registry: other models answer /predict?model=<name>, loaded on first use within a memory
+# budget; every loaded checkpoint is watched and hot-swapped when it changes (0 = no watching)
+DEFAULT_MODEL = 'efficientnet'
+STAGE1_MODEL = 'mobilenetv3'
+MODEL_MEMORY_BUDGET_MB = float(os.getenv('MODEL_MEMORY_BUDGET_MB', 1024))
+MODEL_WATCH_INTERVAL = float(os.getenv('MODEL_WATCH_INTERVAL', 5))
+MODEL_REGISTRY_CONFIG = Path(os.getenv('MODEL_REGISTRY_CONFIG', REGISTRY_CONFIG_PATH))
+
+# Test-time augmentation: views of augment_image averaged with the original image, added in
+# batched passes of TTA_STEP views until the top-1/top-2 margin reaches TTA_MARGIN.
+# TTA=1 applies it to every /predict call, ?tta=1 / ?tta=0 chooses per request
+TTA_DEFAULT = os.getenv('TTA', '0') == '1'
+TTA_VIEW_NAMES = [v.strip() for v in os.getenv('TTA_VIEWS', ','.join(TTA_VIEWS)).split(',') if v.strip()]
+TTA_MARGIN = float(os.getenv('TTA_MARGIN', 0.3))
+TTA_STEP = int(os.getenv('TTA_STEP', 2))
+
+# Sampled profiling: one /predict call in PROFILE_EVERY is traced (0 = off, switchable via /admin/profiling)
+PROFILE_EVERY = int(os.getenv('PROFILE_EVERY', 0))
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_RETENTION = int(os.getenv('PROFILE_RETENTION', 20))
+PROFILE_STACK_INTERVAL_MS = float(os.getenv('PROFILE_STACK_INTERVAL_MS', 2))
+
+# Token expected in the X-Admin-Token header of /admin/* (unset = admin endpoints disabled)
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
-# Device
-device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+upload_writer = UploadWriter(UPLOAD_FOLDER,
+                             sample_rate=UPLOAD_SAMPLE_RATE,
+                             retention=UPLOAD_RETENTION)
+
+tta = TestTimeAugmentation(TTA_VIEW_NAMES, margin=TTA_MARGIN, step=TTA_STEP)
+
+request_profiler = RequestProfiler(PROFILE_DIR,
+                                   sample_every=PROFILE_EVERY,
+                                   retention=PROFILE_RETENTION,
+                                   stack_interval_ms=PROFILE_STACK_INTERVAL_MS)
+
+# Micro-batching (concurrent requests share one forward pass)
+BATCHING_ENABLED = os.getenv('BATCHING_ENABLED', '1') == '1'
+MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', 8))
+MAX_BATCH_WAIT_MS = float(os.getenv('MAX_BATCH_WAIT_MS', 5))
+
+# Device (exported backends are built for CPU inference)
+device = torch.device('cuda' if torch.cuda.is_available() and INFERENCE_BACKEND == 'eager' else 'cpu')
 
 # Class names
 CLASS_NAMES = ['anis', 'cannelle', 'carvi', 'clou_girofle', 'cubebe', 'cumin', 
                'curcuma', 'gingembre', 'paprika', 'poivre noir', 'safran']
 
 # Load model
-def load_model():
-    """Load the trained EfficientNet-B3 model"""
-    model = EfficientNet.from_pretrained('efficientnet-b3', num_classes=11)
-    model = model.to(device)
+def load_checkpoint(path):
+    """Load a checkpoint on the CPU, memory-mapped when MODEL_MMAP=1"""
+    if MODEL_MMAP:
+        try:
+            return torch.load(path, map_location='cpu', mmap=True)
+        except TypeError:
+            print("⚠️  This torch version cannot memory-map checkpoints, loading normally")
+    return torch.load(path, map_location='cpu')
+
+def load_model(timings=STARTUP_TIMINGS):
+    """Load the trained EfficientNet-B3 model (load times are recorded in `timings`)"""
+    if INFERENCE_BACKEND != 'eager':
+        timings['model_build'] = 0.0
+        start = time.perf_counter()
+        model = load_backend(INFERENCE_BACKEND)
+        timings['weight_load'] = time.perf_counter() - start
+        print(f"✅ {INFERENCE_BACKEND} backend loaded from {MODEL_ARTIFACT}")
+        return model
+    
+    if EfficientNet is None:
+        raise ImportError("efficientnet_pytorch is not installed")
+    
+    # Build architecture (ImageNet weights are only fetched when no local checkpoint is used)
+    start = time.perf_counter()
+    if OFFLINE_STARTUP or MODEL_PATH.exists():
+        if not MODEL_PATH.exists():
+            raise FileNotFoundError(f"Model file not found at {MODEL_PATH} (OFFLINE_STARTUP=1)")
+        model = EfficientNet.from_name('efficientnet-b3', num_classes=len(CLASS_NAMES))
+    else:
+        model = EfficientNet.from_pretrained('efficientnet-b3', num_classes=len(CLASS_NAMES))
+    timings['model_build'] = time.perf_counter() - start
     
     # Load weights
-    model_path = Path('models/model_efficientnet_best.pth')
-    if model_path.exists():
-        checkpoint = torch.load(model_path, map_location=device)
+    start = time.perf_counter()
+    if MODEL_PATH.exists():
+        checkpoint = load_checkpoint(MODEL_PATH)
         model.load_state_dict(checkpoint['model_state_dict'])
-        print(f"✅ Model loaded from {model_path}")
+        print(f"✅ Model loaded from {MODEL_PATH}")
     else:
-        print(f"⚠️  Model file not found at {model_path}")
-    
+        print(f"⚠️  Model file not found at {MODEL_PATH}")
+    model = model.to(device)
     model.eval()
+    timings['weight_load'] = time.perf_counter() - start
+    
     return model
 
 # Load model on startup
@@ -70,55 +212,405 @@ except Exception as e:
     print(f"❌ Error loading model: {e}")
     model_loaded = False
 
+# First cascade stage (falls back to EfficientNet-B3 only if it cannot be loaded)
+stage1_model = None
+if INFERENCE_MODE == 'cascade' and model_loaded:
+    try:
+        start = time.perf_counter()
+        stage1_model = load_mobilenet(len(CLASS_NAMES), device)
+        stage1_preprocessor = mobilenet_preprocessor(draft=PREPROCESS_DRAFT)
+        STARTUP_TIMINGS['stage1_load'] = time.perf_counter() - start
+        print(f"✅ Cascade stage 1 (MobileNetV3) loaded, threshold {CASCADE_THRESHOLD:.2f}")
+    except Exception as e:
+        print(f"⚠️  Cascade disabled, MobileNetV3 could not be loaded: {e}")
+
+# Ready for /health once every model has run a forward pass in this process
+models_warm = False
+
+def warmup_models():
+    """Run one dummy forward pass per model so the first request does not pay for lazy init"""
+    global models_warm
+    start = time.perf_counter()
+    with torch.no_grad():
+        model(torch.zeros(1, 3, IMAGE_SIZE, IMAGE_SIZE, device=device))
+        if stage1_model is not None:
+            stage1_model(torch.zeros(1, 3, MOBILENET_IMAGE_SIZE, MOBILENET_IMAGE_SIZE, device=device))
+    STARTUP_TIMINGS['warmup'] = time.perf_counter() - start
+    models_warm = True
+
+if MODEL_WARMUP == '1' and model_loaded:
+    warmup_models()
+
+STARTUP_TIMINGS['total'] = time.perf_counter() - _import_start
+print("⏱️  Startup: " + ", ".join(f"{k} {v:.2f}s" for k, v in STARTUP_TIMINGS.items()))
+
+# Built once: draft decoding, resize and fused normalization
+preprocessor = Preprocessor(IMAGE_SIZE, draft=PREPROCESS_DRAFT)
+
+def on_model_swap(loaded):
+    """Serve a hot-swapped checkpoint from now on and invalidate the predictions of the old one"""
+    global model, stage1_model, served_version
+    if loaded.name == DEFAULT_MODEL:
+        model = loaded.module
+    elif loaded.name == STAGE1_MODEL and stage1_model is not None:
+        stage1_model = loaded.module
+    else:
+        return
+    # Only once the new module serves: a request never reads a version newer than its model
+    served_version = serving_version()
+    if prediction_cache is not None:
+        prediction_cache.set_model_version(served_version)
+
+# The default model and the cascade stage 1 are pinned; TorchScript exports of the other
+# trained models (and entries of MODEL_REGISTRY_CONFIG) are loaded when first requested
+model_registry = ModelRegistry(device, memory_budget_mb=MODEL_MEMORY_BUDGET_MB,
+                               watch_interval=MODEL_WATCH_INTERVAL, on_swap=on_model_swap)
+model_registry.register(ModelSpec(DEFAULT_MODEL, MODEL_ARTIFACT, lambda path: load_model(timings={}),
+                                  preprocessor, CLASS_NAMES, pinned=True))
+model_registry.register(ModelSpec(STAGE1_MODEL, MOBILENET_PATH,
+                                  lambda path: load_mobilenet(len(CLASS_NAMES), device, path),
+                                  stage1_preprocessor if stage1_model is not None
+                                  else mobilenet_preprocessor(draft=PREPROCESS_DRAFT),
+                                  CLASS_NAMES, pinned=stage1_model is not None))
+for name in ('resnet50', 'cnn_custom'):
+    model_registry.register(ModelSpec(name, Path(f'models/model_{name}.pt'),
+                                      lambda path: load_torchscript(path, device),
+                                      Preprocessor(224, draft=PREPROCESS_DRAFT), CLASS_NAMES))
+for spec in load_registry_config(MODEL_REGISTRY_CONFIG, device, CLASS_NAMES, draft=PREPROCESS_DRAFT):
+    model_registry.register(spec)
+
+if model_loaded:
+    model_registry.adopt(DEFAULT_MODEL, model, STARTUP_TIMINGS.get('weight_load', 0.0))
+if stage1_model is not None:
+    model_registry.adopt(STAGE1_MODEL, stage1_model, STARTUP_TIMINGS.get('stage1_load', 0.0))
+
+def serving_version():
+    """Checkpoint version(s) behind default predictions: cached predictions are tied to it"""
+    default = model_registry.peek(DEFAULT_MODEL)
+    version = default.version if default is not None else 'untrained'
+    stage1 = model_registry.peek(STAGE1_MODEL)
+    if stage1_model is not None and stage1 is not None:
+        version += f"+cascade{CASCADE_THRESHOLD}:{stage1.version}"
+    return version
+
+# Version of the default predictions, updated by on_model_swap
+served_version = serving_version()
+
+prediction_cache = PredictionCache(max_entries=PREDICTION_CACHE_SIZE,
+                                   ttl=PREDICTION_CACHE_TTL,
+                                   backend=PREDICTION_CACHE,
+                                   path=PREDICTION_CACHE_PATH,
+                                   model_version=served_version) \
+    if PREDICTION_CACHE != 'off' else None
+
+# Prometheus metrics, served on /metrics
+metrics = Registry()
+REQUESTS = metrics.register(Counter(
+    'spice_requests_total', 'HTTP requests by endpoint and status code', ('endpoint', 'status')))
+REQUEST_SECONDS = metrics.register(Histogram(
+    'spice_request_seconds', 'Request latency until the response starts, by endpoint', ('endpoint',)))
+STAGE_SECONDS = metrics.register(Histogram(
+    'spice_stage_seconds', 'Time spent per stage: upload_read, save, decode, resize, normalize, '
+    'preprocess, forward, forward_stage1, topk', ('stage',)))
+PREDICTIONS = metrics.register(Counter(
+    'spice_predictions_total', 'Predictions served by class and answering model', ('class', 'stage')))
+STARTUP_SECONDS = metrics.register(Gauge(
+    'spice_startup_seconds', 'Model load time breakdown', ('phase',)))
+STARTUP_SECONDS.set_function(lambda: {(phase,): seconds for phase, seconds in STARTUP_TIMINGS.items()})
+RSS_BYTES = metrics.register(Gauge('spice_process_resident_memory_bytes', 'Resident memory of this process'))
+RSS_BYTES.set_function(lambda: {(): process_rss_bytes()})
+MODEL_LOADED = metrics.register(Gauge('spice_model_loaded', '1 if the model is loaded'))
+MODEL_LOADED.set_function(lambda: {(): int(model_loaded)})
+
+def observe_stage(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    REQUESTS.inc(endpoint, response.status_code)
+    if 'request_start' in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, endpoint)
+    return response
+
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def preprocess_image(image_path):
-    """Preprocess image for model input"""
-    from torchvision import transforms
+preprocessor.observer = observe_stage
+
+def preprocess_image(image):
+    """Preprocess image (path, file-like object or PIL image) for model input"""
+    return preprocessor(image).to(device)
+
+def format_prediction(probabilities, stage='efficientnet', class_names=CLASS_NAMES):
+    """Build (predicted_class, confidence, top_3, stage) from one row of softmax output"""
+    confidence, predicted_idx = torch.max(probabilities, 0)
+    predicted_class = class_names[predicted_idx.item()]
+    confidence_score = confidence.item() * 100
     
-    transform = transforms.Compose([
-        transforms.Resize((300, 300)),
-        transforms.ToTensor(),
-        transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-    ])
+    # Get top 3 predictions
+    top_3_probs, top_3_indices = torch.topk(probabilities, 3)
+    top_3 = [
+        {
+            'class': class_names[idx.item()],
+            'probability': prob.item() * 100
+        }
+        for prob, idx in zip(top_3_probs, top_3_indices)
+    ]
     
-    image = Image.open(image_path).convert('RGB')
-    return transform(image).unsqueeze(0).to(device)
+    return predicted_class, confidence_score, top_3, stage
 
-def predict(image_path):
-    """Predict spice class from image"""
+def run_model_batch(image_tensors, loaded=None):
+    """
+    Run one forward pass over stacked image tensors, one result per image.
+    `loaded` is a registry model (default: the EfficientNet-B3 currently served)
+    """
+    batch = torch.cat(image_tensors).to(device)
+    module = model if loaded is None else loaded.module
+    
+    start = time.perf_counter()
+    with torch.no_grad():
+        outputs = module(batch)
+        probabilities = torch.nn.functional.softmax(outputs, dim=1).cpu()
+    forward_end = time.perf_counter()
+    
+    if loaded is None:
+        results = [format_prediction(row) for row in probabilities]
+    else:
+        results = [format_prediction(row, loaded.name, loaded.class_names) for row in probabilities]
+    observe_stage('forward', forward_end - start)
+    observe_stage('topk', time.perf_counter() - forward_end)
+    return results
+
+def run_cascade_batch(items):
+    """
+    Cascade over (mobilenet_tensor, efficientnet_tensor) pairs: one MobileNetV3
+    pass for the whole batch, one EfficientNet-B3 pass for the unsure images
+    """
+    start = time.perf_counter()
+    with torch.no_grad():
+        stage1 = torch.cat([small for small, _ in items]).to(device)
+        probabilities = torch.nn.functional.softmax(stage1_model(stage1), dim=1).cpu()
+    observe_stage('forward_stage1', time.perf_counter() - start)
+    
+    results = [format_prediction(row, stage='mobilenetv3') for row in probabilities]
+    
+    escalate = needs_escalation(probabilities, CASCADE_THRESHOLD).nonzero().flatten().tolist()
+    if escalate:
+        escalated = run_model_batch([items[i][1] for i in escalate])
+        for i, result in zip(escalate, escalated):
+            results[i] = result
+    
+    return results
+
+run_batch = run_cascade_batch if stage1_model is not None else run_model_batch
+
+batch_scheduler = BatchScheduler(run_batch,
+                                 max_batch_size=MAX_BATCH_SIZE,
+                                 max_wait_ms=MAX_BATCH_WAIT_MS) if BATCHING_ENABLED else None
+
+decode_pool = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix='decode')
+
+def prepare_item(image, loaded=None):
+    """
+    Decode, quality-check and preprocess one image into the input expected by
+    run_batch (or by run_model_batch for a `loaded` registry model)
+    """
+    start = time.perf_counter()
+    if loaded is not None:
+        pil_image = loaded.preprocessor.load(image)
+        if QUALITY_REJECT:
+            check_usable(pil_image, QUALITY_REJECT, QUALITY_BLUR_THRESHOLD)
+        item = loaded.preprocessor(pil_image).to(device)
+    elif stage1_model is None and not QUALITY_REJECT:
+        item = preprocess_image(image)
+    else:
+        pil_image = preprocessor.load(image)
+        if QUALITY_REJECT:
+            check_usable(pil_image, QUALITY_REJECT, QUALITY_BLUR_THRESHOLD)
+        item = preprocess_decoded(pil_image)
+    observe_stage('preprocess', time.perf_counter() - start)
+    return item
+
+def preprocess_decoded(pil_image):
+    """Input expected by run_batch for an image already decoded (and quality-checked)"""
+    if stage1_model is not None:
+        return stage1_preprocessor(pil_image), preprocess_image(pil_image)
+    return preprocess_image(pil_image)
+
+def predict(image, loaded=None):
+    """
+    Predict spice class from image (path or file-like object), with the default
+    model or a `loaded` registry model (run on its own, without micro-batching)
+    """
     if not model_loaded:
-        return None, "Model not loaded", None
+        return None, "Model not loaded", None, None
     
+    model_registry.watch()
     try:
-        # Preprocess image
-        image_tensor = preprocess_image(image_path)
-        
-        # Predict
+        with request_profiler.maybe_profile('predict'):
+            # Preprocess image
+            item = prepare_item(image, loaded)
+            if loaded is not None:
+                return run_model_batch([item], loaded)[0]
+            
+            # Predict (batched with concurrent requests when enabled; a profiled
+            # call runs inline so its operators are recorded on this thread)
+            if batch_scheduler is not None and not request_profiler.active():
+                return batch_scheduler.submit(item).result()
+            return run_batch([item])[0]
+    
+    except ImageQualityError:
+        raise
+    except Exception as e:
+        return None, f"Prediction error: {str(e)}", None, None
+
+def predict_tta(image, loaded=None):
+    """
+    Predict with test-time augmentation (EfficientNet-B3 or a `loaded` registry
+    model, never the cascade): (predicted_class, confidence, top_3, stage, views used)
+    """
+    if not model_loaded:
+        return None, "Model not loaded", None, None, 0
+    
+    module = model if loaded is None else loaded.module
+    views_preprocessor = preprocessor if loaded is None else loaded.preprocessor
+    
+    def forward(batch):
+        start = time.perf_counter()
         with torch.no_grad():
-            outputs = model(image_tensor)
-            probabilities = torch.nn.functional.softmax(outputs, dim=1)
-            confidence, predicted_idx = torch.max(probabilities, 1)
-        
-        predicted_class = CLASS_NAMES[predicted_idx.item()]
-        confidence_score = confidence.item() * 100
-        
-        # Get top 3 predictions
-        top_3_probs, top_3_indices = torch.topk(probabilities[0], 3)
-        top_3 = [
-            {
-                'class': CLASS_NAMES[idx.item()],
-                'probability': prob.item() * 100
-            }
-            for prob, idx in zip(top_3_probs, top_3_indices)
-        ]
-        
-        return predicted_class, confidence_score, top_3
+            probabilities = torch.nn.functional.softmax(module(batch.to(device)), dim=1).cpu()
+        observe_stage('forward', time.perf_counter() - start)
+        return probabilities
     
+    model_registry.watch()
+    try:
+        with request_profiler.maybe_profile('predict_tta'):
+            start = time.perf_counter()
+            pil_image = views_preprocessor.load(image)
+            if QUALITY_REJECT:
+                check_usable(pil_image, QUALITY_REJECT, QUALITY_BLUR_THRESHOLD)
+            observe_stage('preprocess', time.perf_counter() - start)
+            
+            # All the views of one pass go through the model as a single batch
+            probabilities, views = tta(pil_image, views_preprocessor.batch, forward)
+            if loaded is None:
+                return (*format_prediction(probabilities), views)
+            return (*format_prediction(probabilities, loaded.name, loaded.class_names), views)
+    
+    except ImageQualityError:
+        raise
     except Exception as e:
-        return None, f"Prediction error: {str(e)}", None
+        return None, f"Prediction error: {str(e)}", None, None, 0
+
+def prediction_response(predicted_class, confidence, top_3, stage, cached, views=None):
+    """JSON fields of a successful prediction (`views`: images averaged by test-time augmentation)"""
+    PREDICTIONS.inc(predicted_class, stage)
+    response = {
+        'success': True,
+        'predicted_class': predicted_class,
+        'confidence': round(confidence, 2),
+        'top_3_predictions': top_3,
+        'stage': stage,
+        'cached': cached
+    }
+    if views is not None:
+        response['tta'] = True
+        response['views'] = views
+    return response
+
+def parse_tta(value):
+    """?tta=1 / ?tta=0 of a request, TTA_DEFAULT when absent"""
+    if value is None or value == '':
+        return TTA_DEFAULT
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+def classify_upload(image_bytes, filename, model_name=DEFAULT_MODEL, use_tta=False):
+    """
+    Classify one uploaded image with a registry model: (JSON payload, HTTP status)
+    of /predict. Shared by the Flask view and the ASGI entry point (asgi.py).
+    """
+    loaded = None
+    if model_name != DEFAULT_MODEL:
+        if model_name not in model_registry:
+            return {
+                'success': False,
+                'error': f"Unknown model '{model_name}'. Available: {', '.join(model_registry.names())}"
+            }, 400
+        try:
+            loaded = model_registry.get(model_name)
+        except ModelUnavailableError as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }, 503
+
+    # Predict (repeat images are served from the cache). The version is read
+    # once: the result is stored under it even if a hot-swap lands meanwhile
+    version = served_version if loaded is None else loaded.version
+    cache_key = content_key(image_bytes) if prediction_cache is not None else None
+    if cache_key and loaded is not None:
+        cache_key = f"{loaded.name}:{cache_key}"
+    if cache_key and use_tta:
+        cache_key = f"tta:{cache_key}"
+    cached = prediction_cache.get(cache_key, version) if cache_key else None
+
+    views = None
+    if cached is not None:
+        predicted_class, confidence, top_3, stage = cached[:4]
+        if use_tta:
+            views = cached[4]
+    else:
+        try:
+            if use_tta:
+                predicted_class, confidence, top_3, stage, views = predict_tta(io.BytesIO(image_bytes), loaded)
+            else:
+                predicted_class, confidence, top_3, stage = predict(io.BytesIO(image_bytes), loaded)
+        except ImageQualityError as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'quality_issues': e.issues
+            }, 422
+
+        if predicted_class is None:
+            return {
+                'success': False,
+                'error': confidence
+            }, 500
+
+        if cache_key:
+            prediction_cache.put(cache_key, [predicted_class, confidence, top_3, stage]
+                                 + ([views] if use_tta else []), version)
+
+    response = prediction_response(predicted_class, confidence, top_3, stage,
+                                   cached=cached is not None, views=views)
+
+    # Keep a sample of uploads, written in the background: the file does not exist yet
+    start = time.perf_counter()
+    filepath = upload_writer.maybe_save(image_bytes, secure_filename(filename))
+    observe_stage('save', time.perf_counter() - start)
+    if filepath is not None:
+        response['pending_path'] = filepath
+
+    return response, 200
+
+def frame_probabilities(image_bytes, loaded):
+    """
+    Softmax output of one live camera frame (asgi.py /stream) for a registry
+    model: run inline, without prediction cache, upload sample or micro-batching
+    """
+    item = prepare_item(io.BytesIO(image_bytes), loaded)
+    start = time.perf_counter()
+    with torch.no_grad():
+        probabilities = torch.nn.functional.softmax(loaded.module(item), dim=1)[0].cpu()
+    observe_stage('forward', time.perf_counter() - start)
+    return probabilities
 
 @app.route('/')
 def index():
@@ -158,45 +650,248 @@ def predict_api():
             'error': 'File type not allowed. Use: jpg, jpeg, png, gif'
         }), 400
     
-    try:
-        # Save file
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], timestamp + filename)
-        file.save(filepath)
-        
-        # Predict
-        predicted_class, confidence, top_3 = predict(filepath)
-        
-        if predicted_class is None:
+    # Sampled profiling (no-op unless PROFILE_EVERY or /admin/profiling enables it)
+    with request_profiler.maybe_profile('predict_api'):
+        try:
+            # Read upload into memory (no disk round trip)
+            start = time.perf_counter()
+            image_bytes = file.read()
+            observe_stage('upload_read', time.perf_counter() - start)
+
+            payload, status = classify_upload(image_bytes, file.filename,
+                                              request.args.get('model', DEFAULT_MODEL),
+                                              parse_tta(request.args.get('tta')))
+            return jsonify(payload), status
+
+        except Exception as e:
             return jsonify({
                 'success': False,
-                'error': confidence
+                'error': str(e)
             }), 500
+
+def read_upload(name, stream, size=None):
+    """Read one batch upload, refused on its name and announced size before any byte is read; returns (bytes, error)"""
+    if not allowed_file(name):
+        return None, 'File type not allowed. Use: jpg, jpeg, png, gif'
+    if size is not None and size > MAX_FILE_SIZE:
+        return None, 'File too large. Maximum size is 10MB'
+    # Never trust the announced size: an archive header can lie about what it decompresses to
+    data = stream.read(MAX_FILE_SIZE + 1)
+    if len(data) > MAX_FILE_SIZE:
+        return None, 'File too large. Maximum size is 10MB'
+    return data, None
+
+def iter_batch_uploads(uploads):
+    """Yield (filename, bytes, error) for every image of the uploaded files or zip/tar archives, one at a time"""
+    for name, stream in uploads:
+        lower = name.lower()
         
-        return jsonify({
-            'success': True,
-            'predicted_class': predicted_class,
-            'confidence': round(confidence, 2),
-            'top_3_predictions': top_3,
-            'image_path': filepath
-        }), 200
-    
+        if lower.endswith('.zip'):
+            with zipfile.ZipFile(stream) as archive:
+                for info in archive.infolist():
+                    if info.is_dir():
+                        continue
+                    with archive.open(info) as member:
+                        yield (info.filename, *read_upload(info.filename, member, info.file_size))
+        elif lower.endswith(('.tar', '.tar.gz', '.tgz')):
+            with tarfile.open(fileobj=stream, mode='r|*') as archive:
+                for member in archive:
+                    if not member.isfile():
+                        continue
+                    yield (member.name, *read_upload(member.name, archive.extractfile(member), member.size))
+        else:
+            yield (name, *read_upload(name, stream))
+
+def decode_upload(name, data, error=None):
+    """Decode one batch upload; returns (PIL image, error)"""
+    if error is not None:
+        return None, error
+    try:
+        return preprocessor.load(io.BytesIO(data)), None
     except Exception as e:
+        return None, f"Could not decode image: {str(e)}"
+
+def prepare_decoded(image, error):
+    """Preprocess one decoded batch upload; returns (item, error)"""
+    if error is not None:
+        return None, error
+    start = time.perf_counter()
+    try:
+        item = preprocess_decoded(image)
+    except Exception as e:
+        return None, f"Could not decode image: {str(e)}"
+    observe_stage('preprocess', time.perf_counter() - start)
+    return item, None
+
+def predict_chunk(chunk):
+    """Decode a chunk concurrently, run one forward pass, build one NDJSON line per image"""
+    lines = []
+    pending = []
+    version = served_version
+    
+    decoded = list(decode_pool.map(lambda upload: decode_upload(*upload[1:]), chunk))
+    if QUALITY_REJECT:
+        # One vectorized quality pass over every decoded image of the chunk
+        usable = [i for i, (image, _) in enumerate(decoded) if image is not None]
+        rejections = quality_rejections([decoded[i][0] for i in usable], QUALITY_REJECT, QUALITY_BLUR_THRESHOLD)
+        for i, rejection in zip(usable, rejections):
+            if rejection is not None:
+                decoded[i] = None, str(rejection)
+    
+    prepared = decode_pool.map(lambda upload: prepare_decoded(*upload), decoded)
+    for (index, name, data, _), (item, error) in zip(chunk, prepared):
+        result = {'index': index, 'filename': name}
+        cache_key = content_key(data) if prediction_cache is not None and item is not None else None
+        cached = prediction_cache.get(cache_key, version) if cache_key else None
+        
+        if error is not None:
+            result.update({'success': False, 'error': error})
+        elif cached is not None:
+            result.update(prediction_response(*cached, cached=True))
+        else:
+            pending.append((len(lines), item, cache_key))
+        lines.append(result)
+    
+    if pending:
+        try:
+            predictions = run_batch([item for _, item, _ in pending])
+            for (line, _, cache_key), prediction in zip(pending, predictions):
+                lines[line].update(prediction_response(*prediction, cached=False))
+                if cache_key:
+                    prediction_cache.put(cache_key, list(prediction), version)
+        except Exception as e:
+            for line, _, _ in pending:
+                lines[line].update({'success': False, 'error': f"Prediction error: {str(e)}"})
+    
+    return lines
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch_api():
+    """
+    Classify many images (multipart 'images' files and/or zip/tar archives).
+    Results are streamed as NDJSON, one line per image as each chunk finishes,
+    followed by a summary line.
+    """
+    if not model_loaded:
         return jsonify({
             'success': False,
-            'error': str(e)
+            'error': 'Model not loaded'
         }), 500
+    
+    files = [f for f in request.files.getlist('images') + request.files.getlist('archive') if f.filename]
+    if not files:
+        return jsonify({
+            'success': False,
+            'error': 'No images provided'
+        }), 400
+    
+    # The request closes its files once the view returns: hand the stream its own spooled copies
+    uploads = []
+    for f in files:
+        spool = tempfile.SpooledTemporaryFile(max_size=MAX_FILE_SIZE)
+        shutil.copyfileobj(f.stream, spool)
+        spool.seek(0)
+        uploads.append((f.filename, spool))
+    
+    def generate():
+        total = failed = 0
+        chunk = []
+        try:
+            for index, (name, data, error) in enumerate(iter_batch_uploads(uploads)):
+                chunk.append((index, name, data, error))
+                if len(chunk) < BATCH_CHUNK_SIZE:
+                    continue
+                for line in predict_chunk(chunk):
+                    total += 1
+                    failed += not line['success']
+                    yield json.dumps(line) + '\n'
+                chunk = []
+            
+            for line in predict_chunk(chunk) if chunk else []:
+                total += 1
+                failed += not line['success']
+                yield json.dumps(line) + '\n'
+        except Exception as e:
+            yield json.dumps({'success': False, 'error': f"Could not read upload: {str(e)}"}) + '\n'
+        finally:
+            for _, spool in uploads:
+                spool.close()
+        
+        yield json.dumps({'success': True, 'done': True, 'total': total, 'failed': failed}) + '\n'
+    
+    return Response(generate(), mimetype='application/x-ndjson')
 
-@app.route('/health', methods=['GET'])
-def health():
-    """Health check endpoint"""
-    return jsonify({
-        'status': 'healthy',
+def health_status():
+    """(JSON payload, HTTP status) of /health: 503 until the models are warmed up in this worker"""
+    starting = model_loaded and not models_warm and MODEL_WARMUP != '0'
+    return {
+        'status': 'starting' if starting else 'healthy',
+        'ready': model_loaded and not starting,
+        'pid': os.getpid(),
         'model_loaded': model_loaded,
         'device': str(device),
-        'classes': CLASS_NAMES
-    }), 200
+        'backend': INFERENCE_BACKEND,
+        'inference_mode': 'cascade' if stage1_model is not None else 'single',
+        'cascade_threshold': CASCADE_THRESHOLD if stage1_model is not None else None,
+        'classes': CLASS_NAMES,
+        'preprocessing': preprocessor.stats(),
+        'quality_reject': QUALITY_REJECT,
+        'startup_seconds': {k: round(v, 3) for k, v in STARTUP_TIMINGS.items()},
+        'batching': batch_scheduler.stats() if batch_scheduler is not None else None,
+        'uploads': upload_writer.stats(),
+        'models': model_registry.stats(),
+        'profiling': request_profiler.stats(),
+        'tta': {'default': TTA_DEFAULT, **tta.stats()},
+        'cache': prediction_cache.stats() if prediction_cache is not None else None
+    }, 503 if starting else 200
+
+@app.route('/health', methods=['GET'])
+def health():
+    """Health check endpoint (503 until the models are warmed up in this worker)"""
+    payload, status = health_status()
+    return jsonify(payload), status
+
+@app.route('/models', methods=['GET'])
+def list_models():
+    """Registered models, loaded versions and the memory budget of this process"""
+    return jsonify({'success': True, 'default': DEFAULT_MODEL, **model_registry.stats()}), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus metrics of this process"""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+def admin_authorized():
+    """True if the request carries the ADMIN_TOKEN (admin endpoints are disabled without one)"""
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+@app.route('/admin/profiling', methods=['GET', 'POST'])
+def admin_profiling():
+    """
+    Show or change the profiling sampling of this process: POST {"sample_every": N}
+    profiles one /predict call in N, 0 turns it off
+    """
+    if not admin_authorized():
+        return jsonify({
+            'success': False,
+            'error': 'Admin token required (X-Admin-Token)' if ADMIN_TOKEN else 'Admin endpoints are disabled'
+        }), 403
+    
+    if request.method == 'POST':
+        payload = request.get_json(silent=True) or {}
+        try:
+            sample_every = int(payload['sample_every'])
+            if sample_every < 0:
+                raise ValueError
+        except (KeyError, TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'error': 'Expected JSON {"sample_every": N} with N >= 0 (0 = off)'
+            }), 400
+        request_profiler.configure(sample_every)
+    
+    return jsonify({'success': True, 'pid': os.getpid(), 'profiling': request_profiler.stats()}), 200
 
 @app.route('/favicon.ico')
 def favicon():
@@ -232,10 +927,14 @@ if __name__ == '__main__':
     print("🌶️  Moroccan Spice Classification - Web Application")
     print(f"{'='*60}")
     print(f"🖥️  Device: {device}")
+    print(f"⚙️  Backend: {INFERENCE_BACKEND}")
+    print(f"🪜 Inference mode: {'cascade (threshold ' + str(CASCADE_THRESHOLD) + ')' if stage1_model is not None else 'single'}")
     print(f"✅ Model Loaded: {model_loaded}")
-    print(f"📁 Upload Folder: {os.path.abspath(UPLOAD_FOLDER)}")
+    print(f"📁 Upload Folder: {os.path.abspath(UPLOAD_FOLDER)} (sample {UPLOAD_SAMPLE_RATE:.0%}, keep {UPLOAD_RETENTION})")
+    print(f"📦 Batching: {'max ' + str(MAX_BATCH_SIZE) + ' / ' + str(MAX_BATCH_WAIT_MS) + 'ms' if BATCHING_ENABLED else 'Disabled'}")
+    print(f"🔬 Profiling: {'1 request in ' + str(PROFILE_EVERY) + ' → ' + PROFILE_DIR if PROFILE_EVERY else 'Off'}")
     print(f"{'='*60}\n")
     
     port = int(os.getenv('PORT', 5000))
     debug = os.getenv('FLASK_ENV') == 'development'
-    app.run(debug=debug, host='0.0.0.0', port=port)
+    app.run(debug=debug, host='0.0.0.0', port=port, threaded=True)
@@ -0,0 +1,401 @@
+"""
+Asyncio (ASGI) entry point for the spice classifier, same JSON contract as the
+Flask app on /predict, /health, /models and /metrics, plus live camera
+classification over a WebSocket on /stream:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+Uploads are received on the event loop without holding a thread, so slow
+clients cost no worker. Decoding and inference run in a bounded thread pool;
+requests beyond its queue are turned away at once (429 / 503 with
+Retry-After) instead of waiting behind an ever longer queue.
+"""
+
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, File, MultipartDecoder, NeedData
+
+import app as service
+from image_quality import ImageQualityError
+from metrics import Counter, Histogram
+from streaming import FrameStream
+
+# Threads running decode + inference: enough to fill a micro-batch
+ASGI_WORKERS = int(os.getenv('ASGI_WORKERS', max(service.MAX_BATCH_SIZE, service.DECODE_WORKERS)))
+# Received uploads waiting for (or running in) a worker thread; beyond it: 503
+ASGI_MAX_QUEUE = int(os.getenv('ASGI_MAX_QUEUE', 4 * ASGI_WORKERS))
+# Uploads being received at the same time; beyond it: 429 before reading the body
+ASGI_MAX_UPLOADS = int(os.getenv('ASGI_MAX_UPLOADS', 256))
+RETRY_AFTER = os.getenv('ASGI_RETRY_AFTER', '1')
+
+# /stream: open camera streams (each one uses at most one worker thread at a time),
+# largest accepted frame, number of classified frames averaged in each result
+STREAM_MAX_CONNECTIONS = int(os.getenv('STREAM_MAX_CONNECTIONS', 4 * ASGI_WORKERS))
+STREAM_MAX_FRAME_BYTES = int(os.getenv('STREAM_MAX_FRAME_KB', 512)) * 1024
+STREAM_SMOOTHING = int(os.getenv('STREAM_SMOOTHING', 5))
+
+JSON_TYPE = b'application/json'
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+class Admission:
+    """Counters of the two bounded stages; only touched from the event loop"""
+
+    def __init__(self, max_uploads: int, max_queue: int):
+        self.max_uploads = max_uploads
+        self.max_queue = max_queue
+        self.receiving = 0
+        self.queued = 0
+        self.streams = 0
+        self.rejected = {429: 0, 503: 0, 'stream': 0}
+
+    def reject(self, status: int):
+        self.rejected[status] += 1
+        return json_reply({
+            'success': False,
+            'error': 'Too many uploads in progress, retry later' if status == 429
+                     else 'Server overloaded, retry later'
+        }, status, [(b'retry-after', RETRY_AFTER.encode())])
+
+    def stats(self) -> dict:
+        return {
+            'workers': ASGI_WORKERS,
+            'receiving': self.receiving,
+            'max_uploads': self.max_uploads,
+            'queued': self.queued,
+            'max_queue': self.max_queue,
+            'rejected_429': self.rejected[429],
+            'rejected_503': self.rejected[503],
+            'streams': self.streams,
+            'max_streams': STREAM_MAX_CONNECTIONS,
+            'rejected_streams': self.rejected['stream']
+        }
+
+
+admission = Admission(ASGI_MAX_UPLOADS, ASGI_MAX_QUEUE)
+inference_pool = ThreadPoolExecutor(max_workers=ASGI_WORKERS, thread_name_prefix='asgi-inference')
+
+STREAM_FRAMES = service.metrics.register(Counter(
+    'spice_stream_frames_total', 'Camera frames received on /stream: classified, dropped (stale) or failed',
+    ('outcome',)))
+STREAM_FRAME_SECONDS = service.metrics.register(Histogram(
+    'spice_stream_frame_seconds', 'Time from the arrival of a classified frame to its result'))
+
+
+def json_reply(payload, status=200, headers=()):
+    """(status, body, content type, extra headers) of a JSON response"""
+    return status, json.dumps(payload).encode(), JSON_TYPE, list(headers)
+
+
+def error_reply(message, status):
+    return json_reply({'success': False, 'error': message}, status)
+
+
+async def read_files(receive, boundary: bytes, limit: int) -> dict:
+    """
+    Parse a multipart body as it arrives: {field name: (filename, bytes)}
+    of the uploaded files. Raises UploadTooLarge past `limit` bytes.
+    """
+    decoder = MultipartDecoder(boundary, max_form_memory_size=limit)
+    files, current, buffer = {}, None, bytearray()
+    received, more_body = 0, True
+
+    while True:
+        event = decoder.next_event()
+        if isinstance(event, NeedData):
+            if not more_body:
+                break
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                raise ClientDisconnected()
+            chunk = message.get('body', b'')
+            more_body = message.get('more_body', False)
+            received += len(chunk)
+            if received > limit:
+                raise UploadTooLarge()
+            decoder.receive_data(chunk)
+            if not more_body:
+                decoder.receive_data(None)
+        elif isinstance(event, Data):
+            if isinstance(current, File):
+                buffer += event.data
+                if not event.more_data:
+                    files.setdefault(current.name, (current.filename, bytes(buffer)))
+                    buffer = bytearray()
+        elif isinstance(event, Epilogue):
+            break
+        else:
+            current = event  # Preamble, Field or File header
+    return files
+
+
+def classify(image_bytes, filename, model_name, use_tta):
+    """Worker thread: same processing and error contract as the Flask /predict view"""
+    with service.request_profiler.maybe_profile('predict_asgi'):
+        try:
+            return service.classify_upload(image_bytes, filename, model_name, use_tta)
+        except Exception as e:
+            return {'success': False, 'error': str(e)}, 500
+
+
+async def predict(scope, receive):
+    """POST /predict[?model=name][&tta=1]: multipart 'image' field"""
+    if not service.model_loaded:
+        return error_reply('Model not loaded', 500)
+
+    headers = dict(scope['headers'])
+    content_length = headers.get(b'content-length')
+    if content_length is not None and content_length.isdigit() and int(content_length) > service.MAX_FILE_SIZE:
+        return error_reply('File too large. Maximum size is 10MB', 413)
+
+    mimetype, options = parse_options_header(headers.get(b'content-type', b'').decode('latin-1'))
+    if mimetype != 'multipart/form-data' or 'boundary' not in options:
+        return error_reply('No image provided', 400)
+
+    if admission.receiving >= admission.max_uploads:
+        return admission.reject(429)
+
+    admission.receiving += 1
+    try:
+        files = await read_files(receive, options['boundary'].encode('latin-1'), service.MAX_FILE_SIZE)
+    except UploadTooLarge:
+        return error_reply('File too large. Maximum size is 10MB', 413)
+    except ValueError as e:
+        return error_reply(f"Malformed multipart upload: {e}", 400)
+    finally:
+        admission.receiving -= 1
+
+    if 'image' not in files:
+        return error_reply('No image provided', 400)
+    filename, image_bytes = files['image']
+    if filename == '':
+        return error_reply('No selected file', 400)
+    if not service.allowed_file(filename):
+        return error_reply('File type not allowed. Use: jpg, jpeg, png, gif', 400)
+
+    if admission.queued >= admission.max_queue:
+        return admission.reject(503)
+
+    admission.queued += 1
+    try:
+        loop = asyncio.get_running_loop()
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        model_name = query.get('model', [service.DEFAULT_MODEL])[0]
+        use_tta = service.parse_tta(query.get('tta', [None])[0])
+        payload, status = await loop.run_in_executor(inference_pool, classify, image_bytes, filename,
+                                                     model_name, use_tta)
+    finally:
+        admission.queued -= 1
+    return json_reply(payload, status)
+
+
+async def health(scope, receive):
+    payload, status = service.health_status()
+    payload['asgi'] = admission.stats()
+    return json_reply(payload, status)
+
+
+async def models(scope, receive):
+    return json_reply({'success': True, 'default': service.DEFAULT_MODEL, **service.model_registry.stats()})
+
+
+async def metrics(scope, receive):
+    return 200, service.metrics.render().encode(), service.METRICS_CONTENT_TYPE.encode(), []
+
+
+# -------------------------------
+# Live camera stream
+# -------------------------------
+def classify_frame(data, model_name):
+    """Worker thread: (softmax output, registry model) of one camera frame"""
+    loaded = service.model_registry.get(model_name)
+    return service.frame_probabilities(data, loaded), loaded
+
+
+async def classify_frames(session: FrameStream, send, model_name):
+    """Classify the newest frame of a stream, one JSON result per classified frame, until cancelled"""
+    loop = asyncio.get_running_loop()
+    while True:
+        frame_id, data, received_at = await session.next_frame()
+        start = time.perf_counter()
+        try:
+            probabilities, loaded = await loop.run_in_executor(inference_pool, classify_frame, data, model_name)
+        except ImageQualityError as e:
+            payload = {'success': False, 'error': str(e), 'quality_issues': e.issues}
+        except Exception as e:
+            payload = {'success': False, 'error': f"Prediction error: {e}"}
+        else:
+            predicted_class, confidence, top_3, stage = service.format_prediction(
+                session.smooth(probabilities), loaded.name, loaded.class_names)
+            frame_class, frame_confidence, _, _ = service.format_prediction(
+                probabilities, loaded.name, loaded.class_names)
+            payload = {
+                'success': True,
+                'predicted_class': predicted_class,
+                'confidence': round(confidence, 2),
+                'top_3_predictions': top_3,
+                'stage': stage,
+                'smoothed_over': len(session.window),
+                'frame_prediction': {'class': frame_class, 'confidence': round(frame_confidence, 2)}
+            }
+        if not payload['success']:
+            session.failed += 1
+
+        latency = time.perf_counter() - received_at
+        STREAM_FRAMES.inc('classified' if payload['success'] else 'failed')
+        STREAM_FRAME_SECONDS.observe(latency)
+        await send({'type': 'websocket.send', 'text': json.dumps({
+            'frame_id': frame_id,
+            **payload,
+            'latency_ms': round(latency * 1000, 1),
+            'inference_ms': round((time.perf_counter() - start) * 1000, 1),
+            'dropped': session.dropped
+        })})
+
+
+async def close_stream(send, code, message):
+    await send({'type': 'websocket.send', 'text': json.dumps({'success': False, 'error': message})})
+    await send({'type': 'websocket.close', 'code': code})
+
+
+async def stream(scope, receive, send):
+    """
+    WebSocket /stream[?model=name]: the client sends frames as binary messages
+    (JPEG/PNG, ideally downscaled), numbered 1, 2, ... by the server; each
+    result names the frame it belongs to. Frames arriving while the model is
+    busy replace each other: only the newest is classified. The text message
+    "reset" clears the smoothing window.
+    """
+    if (await receive())['type'] != 'websocket.connect':
+        return
+    await send({'type': 'websocket.accept'})
+
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    model_name = query.get('model', [service.DEFAULT_MODEL])[0]
+    if not service.model_loaded:
+        return await close_stream(send, 1011, 'Model not loaded')
+    if model_name not in service.model_registry:
+        return await close_stream(send, 1008, f"Unknown model '{model_name}'. "
+                                              f"Available: {', '.join(service.model_registry.names())}")
+    if admission.streams >= STREAM_MAX_CONNECTIONS:
+        admission.rejected['stream'] += 1
+        return await close_stream(send, 1013, 'Too many camera streams, retry later')
+    # Counted before the first await, so concurrent connections cannot all pass the check
+    admission.streams += 1
+    try:
+        try:
+            # Load (and warm up) a routed model before the first frame
+            await asyncio.get_running_loop().run_in_executor(inference_pool, service.model_registry.get, model_name)
+        except Exception as e:
+            return await close_stream(send, 1011, str(e))
+
+        session = FrameStream(STREAM_SMOOTHING)
+        consumer = asyncio.create_task(classify_frames(session, send, model_name))
+        try:
+            while True:
+                message = await receive()
+                if message['type'] == 'websocket.disconnect':
+                    break
+                data = message.get('bytes')
+                if data is None:
+                    if (message.get('text') or '').strip() == 'reset':
+                        session.reset()
+                    continue
+                if len(data) > STREAM_MAX_FRAME_BYTES:
+                    STREAM_FRAMES.inc('failed')
+                    await send({'type': 'websocket.send', 'text': json.dumps({
+                        'frame_id': session.skip(), 'success': False,
+                        'error': f"Frame too large. Maximum size is {STREAM_MAX_FRAME_BYTES // 1024}KB"
+                    })})
+                    continue
+                dropped = session.dropped
+                session.push(data)
+                if session.dropped > dropped:
+                    STREAM_FRAMES.inc('dropped')
+        finally:
+            consumer.cancel()
+            try:
+                await consumer
+            except (asyncio.CancelledError, Exception):
+                pass  # cancelled, or its last send hit the closed socket
+    finally:
+        admission.streams -= 1
+
+ROUTES = {
+    '/predict': ('POST', predict),
+    '/health': ('GET', health),
+    '/models': ('GET', models),
+    '/metrics': ('GET', metrics)
+}
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Warm up off the event loop when the import did not (MODEL_WARMUP=worker)
+            if service.model_loaded and not service.models_warm and service.MODEL_WARMUP != '0':
+                await asyncio.get_running_loop().run_in_executor(inference_pool, service.warmup_models)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            inference_pool.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI application"""
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] == 'websocket':
+        if scope['path'] == '/stream':
+            return await stream(scope, receive, send)
+        return await send({'type': 'websocket.close', 'code': 1000})  # before accept: 403
+    if scope['type'] != 'http':
+        return
+
+    start = time.perf_counter()
+    path, method = scope['path'], scope['method']
+    route = ROUTES.get(path)
+
+    try:
+        if method == 'OPTIONS':
+            reply = 204, b'', JSON_TYPE, [(b'access-control-allow-methods', b'GET, POST, OPTIONS'),
+                                          (b'access-control-allow-headers', b'*')]
+        elif route is None:
+            reply = error_reply('Endpoint not found', 404)
+        elif method != route[0]:
+            reply = error_reply('Method not allowed', 405)
+        else:
+            reply = await route[1](scope, receive)
+    except ClientDisconnected:
+        return
+    except Exception:
+        reply = error_reply('Internal server error', 500)
+
+    status, body, content_type, extra = reply
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type),
+                    (b'content-length', str(len(body)).encode()),
+                    (b'access-control-allow-origin', b'*')] + extra
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+    endpoint = path if route is not None else 'unmatched'
+    service.REQUESTS.inc(endpoint, status)
+    service.REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint)
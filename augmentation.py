@@ -0,0 +1,123 @@
+"""
+Deterministic image augmentations
+Shared by the dataset balancing scripts (training) and the test-time
+augmentation of app.py (inference), so both see exactly the same views.
+"""
+
+import threading
+from typing import Callable, List, Sequence, Tuple
+
+import torch
+from PIL import Image, ImageEnhance
+
+AUG_TYPES = ["flip", "rotate_15", "rotate_-15", "brightness_up",
+             "brightness_down", "contrast_up", "contrast_down",
+             "color", "sharpness"]
+
+# Views of the test-time augmentation, after the original image
+TTA_VIEWS = ["flip", "rotate_15", "rotate_-15", "brightness_up", "brightness_down"]
+
+
+def augment_image(img: Image.Image, aug_type: str) -> Image.Image:
+    """
+    Apply specific augmentation to an image.
+    """
+    if aug_type == "flip":
+        return img.transpose(Image.FLIP_LEFT_RIGHT)
+
+    elif aug_type == "rotate_15":
+        return img.rotate(15, resample=Image.BICUBIC, expand=False, fillcolor=(255, 255, 255))
+
+    elif aug_type == "rotate_-15":
+        return img.rotate(-15, resample=Image.BICUBIC, expand=False, fillcolor=(255, 255, 255))
+
+    elif aug_type == "brightness_up":
+        enhancer = ImageEnhance.Brightness(img)
+        return enhancer.enhance(1.2)
+
+    elif aug_type == "brightness_down":
+        enhancer = ImageEnhance.Brightness(img)
+        return enhancer.enhance(0.8)
+
+    elif aug_type == "contrast_up":
+        enhancer = ImageEnhance.Contrast(img)
+        return enhancer.enhance(1.2)
+
+    elif aug_type == "contrast_down":
+        enhancer = ImageEnhance.Contrast(img)
+        return enhancer.enhance(0.8)
+
+    elif aug_type == "color":
+        enhancer = ImageEnhance.Color(img)
+        return enhancer.enhance(1.1)
+
+    elif aug_type == "sharpness":
+        enhancer = ImageEnhance.Sharpness(img)
+        return enhancer.enhance(1.3)
+
+    return img
+
+
+class TestTimeAugmentation:
+    """
+    Adaptive test-time augmentation. The original image is classified first;
+    while the top-1/top-2 margin of the averaged softmax stays below `margin`,
+    the next `step` views (0 = all the remaining ones) are added in one batched
+    forward pass. An image costs 1 to 1 + len(views) images of compute, at most
+    1 + ceil(len(views) / step) forward passes.
+    """
+
+    def __init__(self, views: Sequence[str] = TTA_VIEWS, margin: float = 0.3, step: int = 2):
+        unknown = [v for v in views if v not in AUG_TYPES]
+        if unknown:
+            raise ValueError(f"Unknown TTA views {unknown}, use: {', '.join(AUG_TYPES)}")
+        self.views = list(views)
+        self.margin = margin
+        self.step = step if step > 0 else max(1, len(self.views))
+
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._early_stops = 0
+        self._views_used = {n: 0 for n in range(1, len(self.views) + 2)}
+
+    def schedule(self) -> List[List[str]]:
+        """Views of each forward pass ('original' first, alone)"""
+        return [['original']] + [self.views[i:i + self.step] for i in range(0, len(self.views), self.step)]
+
+    def __call__(self, image: Image.Image, preprocess: Callable[[List[Image.Image]], torch.Tensor],
+                 forward: Callable[[torch.Tensor], torch.Tensor]) -> Tuple[torch.Tensor, int]:
+        """
+        (averaged softmax, number of views used) for one decoded image.
+        `preprocess` turns a list of views into a batch, `forward` a batch into softmax rows.
+        """
+        total, used = None, 0
+        for views in self.schedule():
+            batch = preprocess([image if v == 'original' else augment_image(image, v) for v in views])
+            probabilities = forward(batch).sum(0)
+            total = probabilities if total is None else total + probabilities
+            used += len(views)
+            top2 = torch.topk(total / used, 2).values
+            if top2[0] - top2[1] >= self.margin:
+                break
+
+        with self._lock:
+            self._requests += 1
+            self._views_used[used] += 1
+            if used < len(self.views) + 1:
+                self._early_stops += 1
+        return total / used, used
+
+    def stats(self) -> dict:
+        """Configuration and how many views the requests needed"""
+        with self._lock:
+            requests = self._requests
+            return {
+                'views': ['original'] + self.views,
+                'margin': self.margin,
+                'step': self.step,
+                'requests': requests,
+                'early_stops': self._early_stops,
+                'mean_views': round(sum(n * c for n, c in self._views_used.items()) / requests, 2)
+                if requests else None,
+                'views_used': {str(n): c for n, c in self._views_used.items() if c}
+            }
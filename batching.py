@@ -0,0 +1,137 @@
+"""
+Dynamic micro-batching for the prediction service
+Collects concurrent requests and runs them through the model as one batch
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, List
+
+
+class BatchScheduler:
+    """
+    Queue requests from the Flask handlers and hand them to `run_batch`
+    in groups of up to `max_batch_size`, waiting at most `max_wait_ms`
+    after the first request of a batch arrived.
+    """
+
+    def __init__(self, run_batch: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = 8, max_wait_ms: float = 5.0,
+                 latency_window: int = 1000):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+
+        # Metrics
+        self._batch_sizes = {}
+        self._total_requests = 0
+        self._total_batches = 0
+        self._max_queue_depth = 0
+        self._queue_waits = deque(maxlen=latency_window)
+        self._batch_times = deque(maxlen=latency_window)
+
+    def _ensure_worker(self):
+        """Start the worker thread (again after a fork, threads do not survive it)"""
+        if self._worker is not None and self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker_pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._worker = threading.Thread(target=self._loop, name='batch-scheduler', daemon=True)
+            self._worker_pid = os.getpid()
+            self._worker.start()
+
+    def submit(self, item: Any) -> Future:
+        """Queue one item and return a future resolved with its own result"""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+
+        depth = self._queue.qsize()
+        with self._lock:
+            self._total_requests += 1
+            self._max_queue_depth = max(self._max_queue_depth, depth)
+        return future
+
+    def _collect(self) -> list:
+        """Block for the first request, then fill the batch until full or timed out"""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        """Worker thread: collect a batch, run it, dispatch the results"""
+        while True:
+            batch = self._collect()
+            items = [item for item, _, _ in batch]
+            start = time.perf_counter()
+
+            try:
+                results = self.run_batch(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"run_batch returned {len(results)} results for {len(items)} items")
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+            with self._lock:
+                size = len(batch)
+                self._batch_sizes[size] = self._batch_sizes.get(size, 0) + 1
+                self._total_batches += 1
+                self._batch_times.append(time.perf_counter() - start)
+                self._queue_waits.extend(start - enqueued for _, _, enqueued in batch)
+
+    def stats(self) -> dict:
+        """Queue depth, batch size distribution and queue wait percentiles"""
+        with self._lock:
+            waits = sorted(self._queue_waits)
+            batch_times = sorted(self._batch_times)
+            batched = sum(size * count for size, count in self._batch_sizes.items())
+
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self._max_queue_depth,
+                'total_requests': self._total_requests,
+                'total_batches': self._total_batches,
+                'mean_batch_size': batched / self._total_batches if self._total_batches else 0.0,
+                'batch_size_histogram': {str(size): count for size, count in sorted(self._batch_sizes.items())},
+                'queue_wait_ms': percentiles(waits),
+                'batch_time_ms': percentiles(batch_times)
+            }
+
+
+def percentiles(sorted_values: list) -> dict:
+    """p50/p95/p99 in milliseconds of an already sorted list of seconds"""
+    if not sorted_values:
+        return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0}
+
+    def pick(q):
+        idx = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+        return sorted_values[idx] * 1000
+
+    return {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99)}
@@ -0,0 +1,54 @@
+"""
+MobileNetV3-Large first stage for cascade inference
+The cheap model answers confident images, the rest go to EfficientNet-B3
+"""
+
+from pathlib import Path
+
+import torch
+import torch.nn as nn
+
+from preprocessing import Preprocessor
+
+MOBILENET_PATH = Path('models/model_mobilenetv3.pth')
+MOBILENET_IMAGE_SIZE = 224
+# Dataset mean/std the MobileNetV3 notebook was trained with (eda_results/normalization_stats.json
+# at training time). Fixed here: scripts/dataset_stats.py rewrites that file on every run.
+DATASET_MEAN = [0.6029079038616421, 0.55349658545811, 0.5049455058574359]
+DATASET_STD = [0.18706283704399068, 0.20806150460539763, 0.23103543617406605]
+
+
+def create_mobilenetv3_model(num_classes: int) -> nn.Module:
+    """MobileNetV3-Large with the classifier head used in the training notebook"""
+    from torchvision import models
+
+    model = models.mobilenet_v3_large(weights=None)
+    in_features = model.classifier[3].in_features
+    model.classifier[3] = nn.Sequential(
+        nn.Dropout(p=0.2, inplace=True),
+        nn.Linear(in_features, num_classes)
+    )
+    return model
+
+
+def load_mobilenet(num_classes: int, device: torch.device, path: Path = MOBILENET_PATH) -> nn.Module:
+    """Build MobileNetV3 and load the trained checkpoint"""
+    if not Path(path).exists():
+        raise FileNotFoundError(f"MobileNetV3 checkpoint not found at {path}")
+
+    model = create_mobilenetv3_model(num_classes)
+    checkpoint = torch.load(path, map_location='cpu')
+    model.load_state_dict(checkpoint['model_state_dict'])
+    model = model.to(device)
+    model.eval()
+    return model
+
+
+def mobilenet_preprocessor(draft: bool = True) -> Preprocessor:
+    """Evaluation preprocessing of the MobileNetV3 notebook (224px, training dataset normalization)"""
+    return Preprocessor(MOBILENET_IMAGE_SIZE, DATASET_MEAN, DATASET_STD, draft=draft)
+
+
+def needs_escalation(probabilities: torch.Tensor, threshold: float) -> torch.Tensor:
+    """Boolean mask of the rows whose top softmax probability is below `threshold`"""
+    return probabilities.max(dim=1).values < threshold
@@ -0,0 +1,76 @@
+"""
+Gunicorn configuration for production serving:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+- The app and the model weights are loaded once in the master (preload_app);
+  workers are forked from it and share the weight pages copy-on-write.
+- Each worker gets an equal share of the cores for torch intra-op threads,
+  so N workers do not oversubscribe the machine.
+- Each worker runs its warm-up forward pass after the fork, before serving;
+  /health answers 503 "starting" until then.
+"""
+
+import gc
+import os
+
+
+def available_cores():
+    """Cores this process may run on (respects taskset / container cpusets)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def cuda_available():
+    import torch
+    return torch.cuda.is_available()
+
+
+CORES = available_cores()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', max(1, min(4, CORES // 2))))
+# Threads per worker let concurrent requests meet in the micro-batcher
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+
+# torch threads per worker: the cores split evenly between the workers
+TORCH_THREADS = int(os.getenv('TORCH_THREADS', max(1, CORES // workers)))
+TORCH_INTEROP_THREADS = int(os.getenv('TORCH_INTEROP_THREADS', 1))
+
+# OpenMP reads OMP_NUM_THREADS once, when torch is imported: set it before
+# cuda_available() below imports torch
+os.environ.setdefault('OMP_NUM_THREADS', str(TORCH_THREADS))
+# The master only loads weights: no forward pass (and no OpenMP pool) before fork
+os.environ.setdefault('MODEL_WARMUP', 'worker')
+
+# A CUDA context cannot be shared across fork: each worker loads its own model on GPU
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1' and not cuda_available()
+
+
+def when_ready(server):
+    # Objects created by the preload are never collected: keep the GC from
+    # touching (and so copying) their pages in every worker
+    gc.freeze()
+    server.log.info(f"{workers} workers x {threads} threads, {TORCH_THREADS} torch threads each "
+                    f"({CORES} cores), preload {'on' if preload_app else 'off'}")
+
+
+def post_fork(server, worker):
+    import torch
+    torch.set_num_threads(TORCH_THREADS)
+    try:
+        torch.set_num_interop_threads(TORCH_INTEROP_THREADS)
+    except RuntimeError:
+        # Already set in this process (inter-op pool started before the fork)
+        pass
+
+
+def post_worker_init(worker):
+    import app as service
+    if service.model_loaded and not service.models_warm:
+        service.warmup_models()
+        worker.log.info(f"Worker {worker.pid} warmed up in {service.STARTUP_TIMINGS['warmup']:.2f}s")
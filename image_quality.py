@@ -0,0 +1,142 @@
+"""
+Batched image quality scoring
+Brightness, contrast, blur (Laplacian variance) and near-duplicate hashes
+computed on stacked grayscale thumbnails, for whole chunks of images at once
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from PIL import Image
+
+QUALITY_SIZE = 256           # grayscale thumbnail side used for every score
+DARK_THRESHOLD = 50          # mean gray level below which an image is too dark
+BRIGHT_THRESHOLD = 200       # mean gray level above which an image is too bright
+LOW_CONTRAST_THRESHOLD = 30  # gray level std below which contrast is too low
+BLUR_THRESHOLD = 30.0        # Laplacian variance below which an image is blurry
+DUPLICATE_DISTANCE = 4       # max differing bits between two 64-bit dHashes
+
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+class ImageQualityError(ValueError):
+    """Raised when an image is rejected before inference"""
+
+    def __init__(self, quality: dict, issues: List[str]):
+        self.quality = quality
+        self.issues = issues
+        super().__init__(f"Image rejected by quality check: {', '.join(issues)}")
+
+
+def to_gray(image: Image.Image, size: int = QUALITY_SIZE) -> np.ndarray:
+    """(size, size) uint8 grayscale thumbnail of a PIL image"""
+    gray = image.convert('L')
+    if gray.size != (size, size):
+        gray = gray.resize((size, size), Image.BILINEAR)
+    return np.asarray(gray, dtype=np.uint8)
+
+
+def laplacian_variance(gray: np.ndarray) -> np.ndarray:
+    """Variance of the 4-neighbour Laplacian of each (N, H, W) image: low means blurry"""
+    g = gray.astype(np.float32)
+    lap = (g[:, :-2, 1:-1] + g[:, 2:, 1:-1] + g[:, 1:-1, :-2] + g[:, 1:-1, 2:]
+           - 4 * g[:, 1:-1, 1:-1])
+    return lap.reshape(len(g), -1).var(axis=1)
+
+
+def dhash(gray: np.ndarray) -> np.ndarray:
+    """64-bit difference hash of each (N, H, W) image, from 8x9 block means"""
+    n, h, w = gray.shape
+    rows = np.linspace(0, h, 9).astype(int)
+    cols = np.linspace(0, w, 10).astype(int)
+    blocks = np.add.reduceat(np.add.reduceat(gray.astype(np.float32), rows[:-1], axis=1), cols[:-1], axis=2)
+    blocks /= np.outer(np.diff(rows), np.diff(cols))
+    bits = (blocks[:, :, 1:] > blocks[:, :, :-1]).reshape(n, 64)
+    return np.packbits(bits, axis=1).view('>u8').ravel().astype(np.uint64)
+
+
+def hamming_distances(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """(len(a), len(b)) number of differing bits between two arrays of 64-bit hashes"""
+    xor = np.bitwise_xor(np.asarray(a, dtype=np.uint64)[:, None], np.asarray(b, dtype=np.uint64)[None, :])
+    return POPCOUNT[xor.view(np.uint8).reshape(*xor.shape, 8)].sum(axis=-1, dtype=np.uint8)
+
+
+def find_near_duplicates(hashes: Sequence[int], max_distance: int = DUPLICATE_DISTANCE) -> List[Optional[int]]:
+    """For each hash, the index of the first earlier hash within max_distance bits (or None)"""
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    duplicate_of = [None] * len(hashes)
+    for start in range(0, len(hashes), 1024):
+        block = hashes[start:start + 1024]
+        close = hamming_distances(block, hashes[:start + len(block)]) <= max_distance
+        for i, row in enumerate(close):
+            earlier = np.flatnonzero(row[:start + i])
+            if len(earlier):
+                duplicate_of[start + i] = int(earlier[0])
+    return duplicate_of
+
+
+def quality_issues(quality: dict) -> List[str]:
+    """Names of the checks an image failed"""
+    return [name for name in ('too_dark', 'too_bright', 'low_contrast', 'blurry')
+            if quality.get(f"is_{name}")]
+
+
+def check_usable(image: Image.Image, reject: Sequence[str], blur_threshold: float = BLUR_THRESHOLD) -> Dict:
+    """Quality of an image, raising ImageQualityError if it fails one of the `reject` checks"""
+    quality = quality_check(image, blur_threshold)
+    issues = [issue for issue in quality_issues(quality) if issue in reject]
+    if issues:
+        raise ImageQualityError(quality, issues)
+    return quality
+
+
+def quality_rejections(images: Sequence[Image.Image], reject: Sequence[str],
+                       blur_threshold: float = BLUR_THRESHOLD) -> List[Optional[ImageQualityError]]:
+    """check_usable for a chunk in one batched pass: the error of each rejected image, None if usable"""
+    rejections = []
+    for quality in quality_check_batch(images, blur_threshold, detect_duplicates=False):
+        issues = [issue for issue in quality_issues(quality) if issue in reject]
+        rejections.append(ImageQualityError(quality, issues) if issues else None)
+    return rejections
+
+
+def quality_check_batch(images: Sequence[Image.Image], blur_threshold: float = BLUR_THRESHOLD,
+                        detect_duplicates: bool = True) -> List[Dict]:
+    """
+    Score a chunk of images in one vectorized pass over their stacked thumbnails.
+    Keeps the fields of the former per-image quality_check and adds blur_score,
+    is_blurry, dhash and duplicate_of (index of a near-identical earlier image in the chunk).
+    """
+    if not images:
+        return []
+
+    gray = np.stack([to_gray(img) for img in images])
+    flat = gray.reshape(len(gray), -1).astype(np.float32)
+    brightness = flat.mean(axis=1)
+    contrast = flat.std(axis=1)
+    blur = laplacian_variance(gray)
+    hashes = dhash(gray)
+    duplicate_of = find_near_duplicates(hashes) if detect_duplicates else [None] * len(images)
+
+    results = []
+    for i, img in enumerate(images):
+        width, height = img.size
+        results.append({
+            "brightness": float(brightness[i]),
+            "contrast": float(contrast[i]),
+            "blur_score": float(blur[i]),
+            "resolution": width * height,
+            "dimensions": (width, height),
+            "is_too_dark": bool(brightness[i] < DARK_THRESHOLD),
+            "is_too_bright": bool(brightness[i] > BRIGHT_THRESHOLD),
+            "is_low_contrast": bool(contrast[i] < LOW_CONTRAST_THRESHOLD),
+            "is_blurry": bool(blur[i] < blur_threshold),
+            "dhash": f"{int(hashes[i]):016x}",
+            "duplicate_of": duplicate_of[i]
+        })
+    return results
+
+
+def quality_check(image: Image.Image, blur_threshold: float = BLUR_THRESHOLD) -> Dict:
+    """Quality of a single image (a batch of one)"""
+    return quality_check_batch([image], blur_threshold, detect_duplicates=False)[0]
@@ -0,0 +1,115 @@
+"""
+CPU inference backends for the spice classifier
+Eager fp32, TorchScript (traced + frozen) and int8 quantized variants:
+int8_dynamic only quantizes the final linear layer, int8_static the whole network
+"""
+
+import copy
+from pathlib import Path
+from typing import Iterable, Optional
+
+import torch
+import torch.nn as nn
+
+BACKENDS = ('eager', 'torchscript', 'int8_dynamic', 'int8_static')
+MODELS_DIR = Path('models')
+
+# What a backend name does not tell, shown in the export report
+BACKEND_NOTES = {
+    'int8_dynamic': "FC-only: dynamic quantization only covers nn.Linear, the convolutional backbone "
+                    "stays fp32 (use int8_static for a fully int8 model)"
+}
+
+
+def backend_path(name: str, models_dir: Path = MODELS_DIR) -> Optional[Path]:
+    """Artifact produced by scripts/export_backends.py (None for eager)"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {name} (choose from {', '.join(BACKENDS)})")
+    if name == 'eager':
+        return None
+    return Path(models_dir) / f"model_efficientnet_{name}.pt"
+
+
+def select_quantized_engine() -> str:
+    """Pick the int8 kernel library available on this CPU"""
+    engines = torch.backends.quantized.supported_engines
+    for engine in ('x86', 'fbgemm', 'qnnpack'):
+        if engine in engines:
+            torch.backends.quantized.engine = engine
+            return engine
+    raise RuntimeError(f"No quantized engine available (supported: {engines})")
+
+
+def _scriptable(model: nn.Module) -> nn.Module:
+    """Copy of an EfficientNet model that can be traced (plain Swish instead of the autograd one)"""
+    model = copy.deepcopy(model).cpu().eval()
+    if hasattr(model, 'set_swish'):
+        model.set_swish(memory_efficient=False)
+    return model
+
+
+def _trace_and_freeze(model: nn.Module, example: torch.Tensor) -> torch.jit.ScriptModule:
+    """Trace with an example batch, then freeze weights and attributes into the graph"""
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example, check_trace=False)
+    return torch.jit.freeze(traced.eval())
+
+
+def export_backend(model: nn.Module, name: str, example: torch.Tensor,
+                   calibration_batches: Optional[Iterable[torch.Tensor]] = None) -> torch.jit.ScriptModule:
+    """
+    Build the `name` backend from an eager fp32 model.
+    `example` is a (N, 3, H, W) batch used for tracing; int8_static also needs
+    `calibration_batches` to observe activation ranges.
+    """
+    model = _scriptable(model)
+    example = example.cpu()
+
+    if name == 'torchscript':
+        return _trace_and_freeze(model, example)
+
+    if name == 'int8_dynamic':
+        # Only the _fc classifier is an nn.Linear: the backbone convolutions stay fp32
+        select_quantized_engine()
+        quantized = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+        return _trace_and_freeze(quantized, example)
+
+    if name == 'int8_static':
+        from torch.ao.quantization import get_default_qconfig_mapping
+        from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+        if calibration_batches is None:
+            raise ValueError("int8_static needs calibration batches")
+
+        engine = select_quantized_engine()
+        prepared = prepare_fx(model, get_default_qconfig_mapping(engine), (example,))
+        with torch.no_grad():
+            for batch in calibration_batches:
+                prepared(batch.cpu())
+        quantized = convert_fx(prepared)
+        return _trace_and_freeze(quantized, example)
+
+    raise ValueError(f"Backend {name} cannot be exported")
+
+
+def save_backend(module: torch.jit.ScriptModule, name: str, models_dir: Path = MODELS_DIR) -> Path:
+    """Save an exported backend where `load_backend` looks for it"""
+    path = backend_path(name, models_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    torch.jit.save(module, str(path))
+    return path
+
+
+def load_backend(name: str, models_dir: Path = MODELS_DIR) -> torch.jit.ScriptModule:
+    """Load an exported (non-eager) backend for CPU inference"""
+    path = backend_path(name, models_dir)
+    if path is None:
+        raise ValueError("The eager backend is built from the checkpoint, not loaded from an export")
+    if not path.exists():
+        raise FileNotFoundError(f"{path} not found, run: python scripts/export_backends.py --backends {name}")
+
+    if name.startswith('int8'):
+        select_quantized_engine()
+    module = torch.jit.load(str(path), map_location='cpu')
+    module.eval()
+    return module
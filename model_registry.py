@@ -0,0 +1,331 @@
+"""
+Registry of the models the service can answer with
+Models are loaded on first use and kept under a memory budget (LRU eviction);
+a watcher thread hot-swaps a model when its checkpoint file changes on disk.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import torch
+import torch.nn as nn
+
+from prediction_cache import file_fingerprint
+from preprocessing import IMAGENET_MEAN, IMAGENET_STD, Preprocessor
+
+REGISTRY_CONFIG_PATH = Path('models/registry.json')
+
+
+class ModelUnavailableError(RuntimeError):
+    """Raised when a registered model cannot be loaded"""
+
+
+class ModelSpec:
+    """
+    How to load one model: `loader(path)` returns the module in eval mode,
+    `preprocessor` turns an image into its input tensor. Pinned models are
+    never evicted.
+    """
+
+    def __init__(self, name: str, path, loader: Callable[[Path], nn.Module], preprocessor: Preprocessor,
+                 class_names: Sequence[str], pinned: bool = False):
+        self.name = name
+        self.path = Path(path)
+        self.loader = loader
+        self.preprocessor = preprocessor
+        self.class_names = list(class_names)
+        self.pinned = pinned
+
+
+class LoadedModel:
+    """
+    One loaded version of a model. Requests hold a reference to it, so a swap
+    or an eviction never pulls the module from under an in-flight request.
+    """
+
+    def __init__(self, spec: ModelSpec, module: nn.Module, version: str, file_stat, load_seconds: float):
+        self.spec = spec
+        self.module = module
+        self.version = version
+        self.file_stat = file_stat
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.nbytes = module_bytes(module, spec.path)
+
+    @property
+    def name(self) -> str:
+        return self.spec.name
+
+    @property
+    def preprocessor(self) -> Preprocessor:
+        return self.spec.preprocessor
+
+    @property
+    def class_names(self) -> List[str]:
+        return self.spec.class_names
+
+
+def module_bytes(module: nn.Module, path: Path) -> int:
+    """Memory held by a model: its parameters and buffers (the file size for frozen TorchScript)"""
+    tensors = list(module.parameters()) + list(module.buffers())
+    size = sum(t.numel() * t.element_size() for t in tensors)
+    try:
+        size = max(size, path.stat().st_size)
+    except OSError:
+        pass
+    return size
+
+
+def file_stat(path: Path):
+    """(mtime_ns, size) of a checkpoint, None if missing"""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def load_torchscript(path: Path, device: torch.device) -> nn.Module:
+    """Any architecture exported with torch.jit.save (e.g. CNN Custom, ResNet-50)"""
+    return torch.jit.load(str(path), map_location=device).eval()
+
+
+class ModelRegistry:
+    """
+    Named models loaded lazily and kept warm while they fit in
+    `memory_budget_mb`; the least recently used unpinned model is evicted
+    first. Every `watch_interval` seconds (0 = never) the checkpoints of the
+    loaded models are checked: a changed file (mtime/size, then SHA-256) is
+    loaded and warmed up beside the old version, then swapped in at once.
+    `on_swap(loaded)` is called after each swap.
+    """
+
+    def __init__(self, device: torch.device, memory_budget_mb: float = 1024, watch_interval: float = 5.0,
+                 on_swap: Optional[Callable[[LoadedModel], None]] = None):
+        self.device = device
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.watch_interval = float(watch_interval)
+        self.on_swap = on_swap
+
+        self._specs: Dict[str, ModelSpec] = {}
+        self._loaded: 'OrderedDict[str, LoadedModel]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._watcher = None
+        self._watcher_pid = None
+        self.loads = 0
+        self.evictions = 0
+        self.swaps = 0
+        self.failed_swaps = 0
+
+    def register(self, spec: ModelSpec):
+        self._specs[spec.name] = spec
+        self._load_locks[spec.name] = threading.Lock()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._specs
+
+    def names(self) -> List[str]:
+        return list(self._specs)
+
+    def adopt(self, name: str, module: nn.Module, load_seconds: float = 0.0) -> LoadedModel:
+        """Register an already loaded module (the models loaded at import) as the current version"""
+        spec = self._specs[name]
+        loaded = LoadedModel(spec, module, file_fingerprint(spec.path) or 'untrained', file_stat(spec.path),
+                             load_seconds)
+        with self._lock:
+            self._loaded[name] = loaded
+        self._evict()
+        return loaded
+
+    def peek(self, name: str) -> Optional[LoadedModel]:
+        """Current version of a model if it is loaded, without loading it or touching the LRU order"""
+        with self._lock:
+            return self._loaded.get(name)
+
+    def get(self, name: str) -> LoadedModel:
+        """Current version of a model, loading (and warming up) it on first use"""
+        self.watch()
+        with self._lock:
+            loaded = self._loaded.get(name)
+            if loaded is not None:
+                self._loaded.move_to_end(name)
+                return loaded
+
+        if name not in self._specs:
+            raise KeyError(f"Unknown model '{name}'")
+
+        # One thread loads, concurrent requests for the same model wait for it
+        with self._load_locks[name]:
+            with self._lock:
+                loaded = self._loaded.get(name)
+            if loaded is None:
+                loaded = self._load(self._specs[name])
+                with self._lock:
+                    self._loaded[name] = loaded
+                self._evict(keep=name)
+        return loaded
+
+    def _load(self, spec: ModelSpec) -> LoadedModel:
+        """Load, warm up and fingerprint one version of a model"""
+        stat = file_stat(spec.path)
+        if stat is None:
+            raise ModelUnavailableError(f"Model '{spec.name}' is not available: {spec.path} not found")
+
+        start = time.perf_counter()
+        try:
+            module = spec.loader(spec.path)
+            size = spec.preprocessor.size
+            with torch.no_grad():
+                module(torch.zeros(1, 3, size, size, device=self.device))
+        except Exception as e:
+            raise ModelUnavailableError(f"Model '{spec.name}' could not be loaded: {e}") from e
+
+        self.loads += 1
+        print(f"✅ Model '{spec.name}' loaded from {spec.path} in {time.perf_counter() - start:.2f}s")
+        return LoadedModel(spec, module, file_fingerprint(spec.path), stat, time.perf_counter() - start)
+
+    def _evict(self, keep: Optional[str] = None):
+        """Drop least recently used unpinned models (except `keep`) until the loaded ones fit in the budget"""
+        with self._lock:
+            total = sum(m.nbytes for m in self._loaded.values())
+            for name in list(self._loaded):
+                if total <= self.memory_budget:
+                    break
+                if name == keep or self._loaded[name].spec.pinned:
+                    continue
+                total -= self._loaded.pop(name).nbytes
+                self.evictions += 1
+                print(f"♻️  Model '{name}' evicted (memory budget {self.memory_budget / 2**20:.0f} MB)")
+
+    # -------------------------------
+    # Hot-swap
+    # -------------------------------
+    def watch(self):
+        """Start the checkpoint watcher thread if needed (again after a fork); cheap to call per request"""
+        if self.watch_interval <= 0 or (self._watcher is not None and self._watcher_pid == os.getpid()):
+            return
+        with self._lock:
+            if self._watcher is not None and self._watcher_pid == os.getpid():
+                return
+            self._watcher = threading.Thread(target=self._watch, name='model-watcher', daemon=True)
+            self._watcher_pid = os.getpid()
+            self._watcher.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.watch_interval)
+            try:
+                self.check_for_updates()
+            except Exception as e:
+                print(f"⚠️  Model watcher: {e}")
+
+    def check_for_updates(self) -> List[str]:
+        """Swap in every loaded model whose checkpoint changed; returns their names"""
+        with self._lock:
+            current = list(self._loaded.values())
+
+        swapped = []
+        for loaded in current:
+            stat = file_stat(loaded.spec.path)
+            if stat is None or stat == loaded.file_stat:
+                continue
+
+            with self._load_locks[loaded.name]:
+                if file_fingerprint(loaded.spec.path) == loaded.version:
+                    loaded.file_stat = stat  # touched, same content
+                    continue
+                try:
+                    fresh = self._load(loaded.spec)
+                except ModelUnavailableError as e:
+                    # Probably still being written: keep serving the old version, retry on the next change
+                    loaded.file_stat = stat
+                    self.failed_swaps += 1
+                    print(f"⚠️  Hot-swap skipped, keeping version {loaded.version[:12]}: {e}")
+                    continue
+
+                with self._lock:
+                    if loaded.name in self._loaded:
+                        self._loaded[loaded.name] = fresh
+                self.swaps += 1
+                swapped.append(loaded.name)
+                print(f"🔁 Model '{loaded.name}' swapped: {loaded.version[:12]} → {fresh.version[:12]}")
+                if self.on_swap is not None:
+                    self.on_swap(fresh)
+            self._evict()
+        return swapped
+
+    def stats(self) -> dict:
+        """Registered models, loaded versions and counters"""
+        with self._lock:
+            loaded = dict(self._loaded)
+        return {
+            'memory_budget_mb': round(self.memory_budget / 2**20, 1),
+            'loaded_mb': round(sum(m.nbytes for m in loaded.values()) / 2**20, 1),
+            'watch_interval': self.watch_interval,
+            'loads': self.loads,
+            'evictions': self.evictions,
+            'swaps': self.swaps,
+            'failed_swaps': self.failed_swaps,
+            'models': {
+                name: {
+                    'path': str(spec.path),
+                    'available': spec.path.exists(),
+                    'pinned': spec.pinned,
+                    'loaded': name in loaded,
+                    'version': loaded[name].version[:12] if name in loaded else None,
+                    'size_mb': round(loaded[name].nbytes / 2**20, 1) if name in loaded else None
+                }
+                for name, spec in self._specs.items()
+            }
+        }
+
+
+def load_registry_config(path: Path, device: torch.device, default_class_names: Sequence[str],
+                         draft: bool = True) -> List[ModelSpec]:
+    """
+    Extra models from a JSON file, e.g.
+        {"resnet50": {"path": "models/model_resnet50.pt", "image_size": 224},
+         "efficientnet_v2": {"path": "models/effnet_12cls.pth", "arch": "efficientnet_b3",
+                             "image_size": 300, "class_names": [...]}}
+    `arch` is "torchscript" (default), "efficientnet_b3" or "mobilenetv3";
+    `normalization` is "imagenet" (default) or "dataset" (the statistics MobileNetV3 was trained with).
+    """
+    if not Path(path).exists():
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+
+    specs = []
+    for name, entry in config.items():
+        class_names = entry.get('class_names', default_class_names)
+        mean, std = IMAGENET_MEAN, IMAGENET_STD
+        if entry.get('normalization') == 'dataset':
+            from cascade import DATASET_MEAN, DATASET_STD
+            mean, std = DATASET_MEAN, DATASET_STD
+        preprocessor = Preprocessor(int(entry.get('image_size', 224)), mean, std, draft=draft)
+        loader = architecture_loader(entry.get('arch', 'torchscript'), len(class_names), device)
+        specs.append(ModelSpec(name, entry['path'], loader, preprocessor, class_names))
+    return specs
+
+
+def architecture_loader(arch: str, num_classes: int, device: torch.device) -> Callable[[Path], nn.Module]:
+    """loader(path) for the architectures the registry can rebuild from a state dict"""
+    if arch == 'torchscript':
+        return lambda path: load_torchscript(path, device)
+    if arch == 'mobilenetv3':
+        from cascade import load_mobilenet
+        return lambda path: load_mobilenet(num_classes, device, path)
+    if arch == 'efficientnet_b3':
+        def load(path):
+            from efficientnet_pytorch import EfficientNet
+            model = EfficientNet.from_name('efficientnet-b3', num_classes=num_classes)
+            model.load_state_dict(torch.load(path, map_location='cpu')['model_state_dict'])
+            return model.to(device).eval()
+        return load
+    raise ValueError(f"Unknown architecture '{arch}' (use torchscript, efficientnet_b3 or mobilenetv3)")
@@ -0,0 +1,186 @@
+"""
+Content-hash prediction cache
+Repeat uploads of the same image skip the forward pass
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+
+
+def content_key(data: bytes) -> str:
+    """Cache key of an upload: SHA-256 of its raw bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_fingerprint(path, chunk_size: int = 1024 * 1024) -> Optional[str]:
+    """SHA-256 of a file (e.g. a model checkpoint), None if it does not exist"""
+    path = Path(path)
+    if not path.exists():
+        return None
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """
+    Bounded LRU + TTL cache of prediction results.
+
+    The in-process LRU is always used. With backend='disk' a SQLite file is
+    shared by every worker on the machine (gunicorn workers, restarts), the
+    in-process LRU acting as a front cache.
+
+    Entries belong to a model version: `get` and `put` take the version the
+    caller's prediction comes from, captured once per request, so a result of
+    the old checkpoint can never be stored under the new one during a hot-swap.
+    `set_model_version` drops the in-process entries of older versions.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0,
+                 backend: str = 'memory', path: str = 'cache/predictions.sqlite',
+                 model_version: str = ''):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl)
+        self.backend = backend
+        self.path = path
+        self.model_version = model_version or ''
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if backend == 'disk':
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            with self._connect() as conn:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('CREATE TABLE IF NOT EXISTS predictions ('
+                             'key TEXT PRIMARY KEY, value TEXT, '
+                             'created REAL, accessed REAL)')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_accessed ON predictions(accessed)')
+        elif backend != 'memory':
+            raise ValueError(f"Unknown cache backend: {backend} (use 'memory' or 'disk')")
+
+    def _connect(self) -> sqlite3.Connection:
+        """One SQLite connection per thread and process"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _versioned(self, key: str, version: str) -> str:
+        return f"{version}:{key}"
+
+    def set_model_version(self, model_version: str):
+        """Invalidate every entry computed with another checkpoint"""
+        with self._lock:
+            if model_version == self.model_version:
+                return
+            self.model_version = model_version or ''
+            self._entries.clear()
+
+    def get(self, key: str, version: str) -> Optional[Any]:
+        """Cached value for `key` computed by model `version`, or None on a miss or an expired entry"""
+        now = time.time()
+        versioned = self._versioned(key, version)
+
+        with self._lock:
+            entry = self._entries.get(versioned)
+            if entry is not None:
+                value, created = entry
+                if now - created <= self.ttl:
+                    self._entries.move_to_end(versioned)
+                    self.hits += 1
+                    return value
+                del self._entries[versioned]
+
+        if self.backend == 'disk':
+            value = self._disk_get(versioned, now)
+            if value is not None:
+                with self._lock:
+                    self.hits += 1
+                    self._remember(versioned, value, now)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: Any, version: str):
+        """Store a JSON-serializable value computed by model `version` under `key`"""
+        now = time.time()
+        versioned = self._versioned(key, version)
+
+        with self._lock:
+            self._remember(versioned, value, now)
+
+        if self.backend == 'disk':
+            self._disk_put(versioned, value, now)
+
+    def _remember(self, versioned: str, value: Any, created: float):
+        """Insert into the in-process LRU (lock held by caller)"""
+        self._entries[versioned] = (value, created)
+        self._entries.move_to_end(versioned)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_get(self, versioned: str, now: float) -> Optional[Any]:
+        try:
+            conn = self._connect()
+            row = conn.execute('SELECT value, created FROM predictions WHERE key = ?',
+                               (versioned,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                conn.execute('DELETE FROM predictions WHERE key = ?', (versioned,))
+                return None
+            conn.execute('UPDATE predictions SET accessed = ? WHERE key = ?', (now, versioned))
+            return json.loads(row[0])
+        except sqlite3.Error as e:
+            print(f"⚠️  Prediction cache read failed: {e}")
+            return None
+
+    def _disk_put(self, versioned: str, value: Any, now: float):
+        try:
+            conn = self._connect()
+            conn.execute('INSERT OR REPLACE INTO predictions (key, value, created, accessed) '
+                         'VALUES (?, ?, ?, ?)', (versioned, json.dumps(value), now, now))
+
+            # Drop expired entries, then the least recently used beyond capacity
+            conn.execute('DELETE FROM predictions WHERE created < ?', (now - self.ttl,))
+            conn.execute('DELETE FROM predictions WHERE key IN ('
+                         'SELECT key FROM predictions ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+                         (self.max_entries,))
+        except sqlite3.Error as e:
+            print(f"⚠️  Prediction cache write failed: {e}")
+
+    def stats(self) -> dict:
+        """Hit/miss counters for /health"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': self.backend,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'model_version': self.model_version[:12]
+            }
@@ -0,0 +1,135 @@
+"""
+Image preprocessing built once at startup
+Draft-mode JPEG decoding, resize and a fused lookup-table normalization
+"""
+
+import threading
+import time
+from typing import List, Sequence
+
+import numpy as np
+import torch
+from PIL import Image
+
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+STAGES = ('decode', 'resize', 'normalize')
+
+
+class Preprocessor:
+    """
+    Equivalent of transforms.Compose([Resize((size, size)), ToTensor(), Normalize(mean, std)])
+    without rebuilding anything per call.
+
+    - JPEGs are decoded in draft mode, letting libjpeg downscale by 1/2, 1/4 or 1/8
+      while staying at least `size` pixels on each side.
+    - ToTensor + Normalize are fused into one lookup table gather per channel:
+      uint8 HWC in, normalized float32 CHW out, no intermediate float image.
+    - `batch()` writes into a per-thread float buffer that is reused between calls.
+    """
+
+    def __init__(self, size: int, mean: Sequence[float] = IMAGENET_MEAN,
+                 std: Sequence[float] = IMAGENET_STD, draft: bool = True):
+        self.size = size
+        self.draft = draft
+
+        # lut[c, v] = (v / 255 - mean[c]) / std[c]
+        values = np.arange(256, dtype=np.float32) / 255.0
+        self.lut = np.stack([(values - m) / s for m, s in zip(mean, std)]).astype(np.float32)
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._totals = {stage: 0.0 for stage in STAGES}
+        self._count = 0
+        # Optional callback(stage, seconds) called for every image, e.g. to feed a histogram
+        self.observer = None
+
+    # -------------------------------
+    # Stages
+    # -------------------------------
+    def load(self, image, min_size: int = None) -> Image.Image:
+        """Decode a path / file-like object into RGB (PIL images are converted as is)"""
+        if isinstance(image, Image.Image):
+            return image.convert('RGB')
+
+        image = Image.open(image)
+        if self.draft and image.format == 'JPEG':
+            target = min_size or self.size
+            image.draft('RGB', (target, target))
+        return image.convert('RGB')
+
+    def resize(self, image: Image.Image) -> np.ndarray:
+        """Resize to size x size (bilinear, as transforms.Resize) as a uint8 HWC array"""
+        if image.size != (self.size, self.size):
+            image = image.resize((self.size, self.size), Image.BILINEAR)
+        return np.asarray(image, dtype=np.uint8)
+
+    def normalize(self, pixels: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """uint8 HWC -> normalized float32 CHW in one gather per channel"""
+        if out is None:
+            out = np.empty((3, self.size, self.size), dtype=np.float32)
+        for c in range(3):
+            np.take(self.lut[c], pixels[:, :, c], out=out[c])
+        return out
+
+    # -------------------------------
+    # Pipelines
+    # -------------------------------
+    def __call__(self, image) -> torch.Tensor:
+        """Preprocess one image into a new (1, 3, size, size) tensor"""
+        start = time.perf_counter()
+        decoded = self.load(image)
+        decoded_at = time.perf_counter()
+        pixels = self.resize(decoded)
+        resized_at = time.perf_counter()
+        tensor = torch.from_numpy(self.normalize(pixels)).unsqueeze(0)
+        self._record(decoded_at - start, resized_at - decoded_at, time.perf_counter() - resized_at)
+        return tensor
+
+    def batch(self, images: List) -> torch.Tensor:
+        """
+        Preprocess several images into a (N, 3, size, size) tensor backed by this
+        thread's reusable buffer: it is overwritten by the next batch() call.
+        """
+        n = len(images)
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None or buffer.shape[0] < n:
+            buffer = np.empty((max(n, 1), 3, self.size, self.size), dtype=np.float32)
+            self._local.buffer = buffer
+
+        for i, image in enumerate(images):
+            start = time.perf_counter()
+            decoded = self.load(image)
+            decoded_at = time.perf_counter()
+            pixels = self.resize(decoded)
+            resized_at = time.perf_counter()
+            self.normalize(pixels, out=buffer[i])
+            self._record(decoded_at - start, resized_at - decoded_at, time.perf_counter() - resized_at)
+
+        return torch.from_numpy(buffer[:n])
+
+    # -------------------------------
+    # Timings
+    # -------------------------------
+    def _record(self, decode: float, resize: float, normalize: float):
+        with self._lock:
+            self._totals['decode'] += decode
+            self._totals['resize'] += resize
+            self._totals['normalize'] += normalize
+            self._count += 1
+        if self.observer is not None:
+            self.observer('decode', decode)
+            self.observer('resize', resize)
+            self.observer('normalize', normalize)
+
+    def stats(self) -> dict:
+        """Mean time per image of each stage in ms"""
+        with self._lock:
+            count = self._count
+            return {
+                'images': count,
+                'size': self.size,
+                'draft': self.draft,
+                'mean_ms': {stage: (total / count * 1000 if count else 0.0)
+                            for stage, total in self._totals.items()}
+            }
@@ -0,0 +1,230 @@
+"""
+Sampled request profiling
+One request in N runs under torch.profiler (per-operator CPU time and memory)
+and a Python stack sampler; the results are written to rotating trace files.
+When sampling is off, maybe_profile() costs one attribute check.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import nullcontext
+from datetime import datetime
+
+NULL_CONTEXT = nullcontext()
+SUFFIXES = ('.trace.json', '.ops.txt', '.stacks.folded')
+
+
+class StackSampler:
+    """
+    Sample the Python stack of one thread every `interval` seconds from a
+    background thread. Stacks are aggregated in the folded format
+    ("outer;inner count") read by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.002):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+    def folded(self) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class _Counted:
+    """Marks the calling thread as inside a counted call, so nested calls are not counted again"""
+
+    def __init__(self, owner: 'RequestProfiler'):
+        self.owner = owner
+
+    def __enter__(self):
+        self.owner._local.depth = getattr(self.owner._local, 'depth', 0) + 1
+        return self
+
+    def __exit__(self, *exc):
+        self.owner._local.depth -= 1
+        return False
+
+
+class _ProfileSession(_Counted):
+    """One profiled request: torch.profiler and the stack sampler on the calling thread"""
+
+    def __init__(self, owner: 'RequestProfiler', name: str):
+        super().__init__(owner)
+        self.name = name
+
+    def __enter__(self):
+        from torch.profiler import ProfilerActivity, profile
+
+        super().__enter__()
+        self.profiler = profile(activities=[ProfilerActivity.CPU], profile_memory=True, record_shapes=True)
+        try:
+            self.profiler.__enter__()
+        except Exception as e:
+            # Never fail the request because of the profiler
+            print(f"⚠️  Could not start the profiler: {e}")
+            self.profiler = None
+            self.owner._busy.release()
+            return self
+
+        self.owner._local.active = True
+        self.start = time.perf_counter()
+        self.sampler = StackSampler(threading.get_ident(), self.owner.stack_interval)
+        self.sampler.start()
+        return self
+
+    def __exit__(self, *exc):
+        super().__exit__(*exc)
+        if self.profiler is None:
+            return False
+        writing = False
+        try:
+            try:
+                self.profiler.__exit__(*exc)
+            finally:
+                self.sampler.stop()
+                self.owner._local.active = False
+            self.seconds = time.perf_counter() - self.start
+            # Exporting a trace takes longer than the request itself: not on the request path
+            threading.Thread(target=self.owner._write, args=(self,), name='profile-writer', daemon=True).start()
+            writing = True
+        except Exception as e:
+            # Never fail the request because of the profiler
+            print(f"⚠️  Could not stop the profiler: {e}")
+        finally:
+            if not writing:
+                self.owner._busy.release()  # otherwise freed by the writer thread
+        return False
+
+
+class RequestProfiler:
+    """
+    Profile one call in `sample_every` (0 = off) and keep the traces of the
+    last `retention` profiled calls in `folder`. One call is profiled at a
+    time: a sampled call that finds the profiler busy is skipped.
+    """
+
+    def __init__(self, folder: str, sample_every: int = 0, retention: int = 20,
+                 stack_interval_ms: float = 2.0):
+        self.folder = folder
+        self.sample_every = max(0, int(sample_every))
+        self.retention = max(1, int(retention))
+        self.stack_interval = stack_interval_ms / 1000
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._busy = threading.Lock()
+        self._kept = deque()
+        self.seen = 0
+        self.profiled = 0
+        self.skipped = 0
+        self.last_trace = None
+
+        if os.path.isdir(folder):
+            prefixes = {f[:-len(s)] for f in os.listdir(folder) for s in SUFFIXES if f.endswith(s)}
+            paths = [os.path.join(folder, p) for p in prefixes]
+            self._kept.extend(sorted(paths, key=lambda p: min(
+                os.path.getmtime(p + s) for s in SUFFIXES if os.path.exists(p + s))))
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_every > 0
+
+    def configure(self, sample_every: int):
+        """Change the sampling period at runtime (0 turns profiling off)"""
+        with self._lock:
+            self.sample_every = max(0, int(sample_every))
+            self.seen = 0
+
+    def active(self) -> bool:
+        """True while the calling thread is being profiled"""
+        return getattr(self._local, 'active', False)
+
+    def maybe_profile(self, name: str):
+        """
+        Context manager around a call: profiles it if it is the Nth one,
+        a shared no-op otherwise. Calls nested in a counted one are not counted.
+        """
+        if self.sample_every <= 0 or getattr(self._local, 'depth', 0):
+            return NULL_CONTEXT
+
+        with self._lock:
+            self.seen += 1
+            sampled = self.sample_every > 0 and self.seen % self.sample_every == 0
+        if not sampled:
+            return _Counted(self)
+        if not self._busy.acquire(blocking=False):
+            self.skipped += 1
+            return _Counted(self)
+        return _ProfileSession(self, name)
+
+    def _write(self, session: _ProfileSession):
+        """Writer thread: export one session, enforce the retention cap, free the profiler"""
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+            prefix = os.path.join(self.folder, f"{timestamp}_{os.getpid()}_{session.name}")
+
+            averages = session.profiler.key_averages()
+            with open(prefix + '.ops.txt', 'w') as f:
+                f.write(f"{session.name}: {session.seconds * 1000:.1f} ms, "
+                        f"{session.sampler.samples} stack samples\n\n")
+                f.write("Top operators by self CPU time\n")
+                f.write(averages.table(sort_by='self_cpu_time_total', row_limit=30) + '\n\n')
+                f.write("Top operators by self CPU memory\n")
+                f.write(averages.table(sort_by='self_cpu_memory_usage', row_limit=30) + '\n')
+            with open(prefix + '.stacks.folded', 'w') as f:
+                f.write(session.sampler.folded())
+            session.profiler.export_chrome_trace(prefix + '.trace.json')
+
+            self.profiled += 1
+            self.last_trace = prefix + '.trace.json'
+            self._kept.append(prefix)
+            while len(self._kept) > self.retention:
+                oldest = self._kept.popleft()
+                for suffix in SUFFIXES:
+                    try:
+                        os.remove(oldest + suffix)
+                    except OSError:
+                        pass
+        except Exception as e:
+            print(f"⚠️  Could not write profile of {session.name}: {e}")
+        finally:
+            self._busy.release()
+
+    def stats(self) -> dict:
+        """Sampling configuration and counters"""
+        return {
+            'enabled': self.enabled,
+            'sample_every': self.sample_every,
+            'folder': self.folder,
+            'retention': self.retention,
+            'kept': len(self._kept),
+            'profiled': self.profiled,
+            'skipped': self.skipped,
+            'last_trace': self.last_trace
+        }
@@ -0,0 +1,199 @@
+"""
+Balanced dataset with on-the-fly augmentation, an alternative to
+balance_dataset.py. Instead of writing {cls}_aug{n}_{aug_type}.jpg files it
+keeps a compact plan of (source, augmentation, seed) per virtual sample and
+applies augment_image when a DataLoader worker loads the sample.
+
+Usage: python scripts/augmented_dataset.py [--target 1000] [--workers 4] [--epochs 2]
+"""
+
+import argparse
+import hashlib
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import DataLoader, Dataset
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from augmentation import AUG_TYPES, augment_image
+from balance_dataset import RANDOM_SEED, TARGET_IMAGES_PER_CLASS, collect_sources
+
+# ===============================
+# CONFIG
+# ===============================
+ORIGINAL = -1  # augmentation index of an unmodified source image
+IMAGE_SIZE = 300
+BATCH_SIZE = 32
+NUM_WORKERS = 4
+
+# ===============================
+# DATASET
+# ===============================
+def class_seed(cls: str, epoch: int = None) -> int:
+    """Deterministic per-class seed derived from RANDOM_SEED (independent of class order and workers)"""
+    key = f"{RANDOM_SEED}:{cls}" if epoch is None else f"{RANDOM_SEED}:{cls}:{epoch}"
+    digest = hashlib.sha256(key.encode()).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+class BalancedAugmentedDataset(Dataset):
+    """
+    TARGET_IMAGES_PER_CLASS virtual samples per class, with the same rules as
+    balance_dataset(): classes above the target are sampled down, the others keep
+    every original and are topped up with augmented views of their sources.
+    The samples are statistically similar but not the same as the files that
+    script writes: each class draws from its own (RANDOM_SEED, class, epoch) RNG,
+    sources are augmented round-robin rather than a few per source in order, and
+    random transforms are seeded per sample.
+
+    The plan is a few numpy arrays (source index, augmentation index, seed, label),
+    so the target can grow to thousands per class without touching the disk.
+    The seed of each sample also drives the random ops of `transform`, which makes a
+    whole epoch reproducible for a given (RANDOM_SEED, epoch) whatever num_workers is.
+    Call set_epoch() before each epoch to draw new augmentations.
+    """
+
+    def __init__(self, sources: dict = None, target_per_class: int = TARGET_IMAGES_PER_CLASS,
+                 transform=None, class_names: list = None, epoch: int = None):
+        sources = collect_sources() if sources is None else sources
+        self.target_per_class = target_per_class
+        self.transform = transform
+        self.classes = class_names or sorted(cls for cls, images in sources.items() if images)
+        self.class_to_idx = {cls: idx for idx, cls in enumerate(self.classes)}
+
+        # Each source path is stored once, virtual samples refer to it by index
+        self.paths = []
+        self.class_sources = {}
+        for cls in self.classes:
+            start = len(self.paths)
+            self.paths.extend(path for path, _ in sources.get(cls, []))
+            self.class_sources[cls] = np.arange(start, len(self.paths), dtype=np.int32)
+
+        self.set_epoch(epoch)
+
+    def set_epoch(self, epoch: int = None):
+        """Rebuild the plan with new augmentations and seeds drawn for `epoch`"""
+        self.epoch = epoch
+        source_idx, aug_idx, seeds, labels = [], [], [], []
+
+        for cls in self.classes:
+            indices = self.class_sources[cls]
+            if len(indices) == 0:
+                continue
+            rng = random.Random(class_seed(cls, epoch))
+            label = self.class_to_idx[cls]
+
+            if len(indices) >= self.target_per_class:
+                kept = rng.sample(list(indices), self.target_per_class)
+                augmented = []
+            else:
+                kept = list(indices)
+                needed = self.target_per_class - len(indices)
+                augmented = [indices[i % len(indices)] for i in range(needed)]
+
+            for idx in kept:
+                source_idx.append(idx)
+                aug_idx.append(ORIGINAL)
+                seeds.append(rng.getrandbits(32))
+                labels.append(label)
+            for idx in augmented:
+                source_idx.append(idx)
+                aug_idx.append(rng.randrange(len(AUG_TYPES)))
+                seeds.append(rng.getrandbits(32))
+                labels.append(label)
+
+        self.source_idx = np.asarray(source_idx, dtype=np.int32)
+        self.aug_idx = np.asarray(aug_idx, dtype=np.int8)
+        self.seeds = np.asarray(seeds, dtype=np.uint32)
+        self.labels = np.asarray(labels, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.source_idx)
+
+    def sample_info(self, idx: int) -> tuple:
+        """(source path, augmentation type or None, seed, label) of a virtual sample"""
+        aug = int(self.aug_idx[idx])
+        return (self.paths[self.source_idx[idx]], None if aug == ORIGINAL else AUG_TYPES[aug],
+                int(self.seeds[idx]), int(self.labels[idx]))
+
+    def __getitem__(self, idx):
+        path, aug_type, seed, label = self.sample_info(idx)
+
+        image = Image.open(path).convert('RGB')
+        if aug_type is not None:
+            image = augment_image(image, aug_type)
+
+        if self.transform:
+            # Random transforms draw from the sample seed without disturbing the caller's RNG
+            state = random.getstate()
+            with torch.random.fork_rng(devices=[]):
+                random.seed(seed)
+                torch.manual_seed(seed)
+                image = self.transform(image)
+            random.setstate(state)
+
+        return image, label
+
+    def summary(self) -> dict:
+        """Virtual samples per class, split into originals and augmented views"""
+        summary = {}
+        for cls in self.classes:
+            mask = self.labels == self.class_to_idx[cls]
+            augmented = int((self.aug_idx[mask] != ORIGINAL).sum())
+            summary[cls] = {
+                "sources": len(self.class_sources[cls]),
+                "originals": int(mask.sum()) - augmented,
+                "augmented": augmented
+            }
+        return summary
+
+# ===============================
+# MAIN
+# ===============================
+def main(target: int, num_workers: int, epochs: int):
+    """Iterate the lazy dataset through a multi-worker DataLoader and report throughput"""
+    from torchvision import transforms
+
+    transform = transforms.Compose([
+        transforms.Resize((IMAGE_SIZE, IMAGE_SIZE)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+    ])
+    dataset = BalancedAugmentedDataset(target_per_class=target, transform=transform)
+    if len(dataset) == 0:
+        print("❌ No images found in merged or external directories!")
+        return
+
+    print(f"🔄 On-the-fly balanced dataset: {len(dataset)} samples, {len(dataset.classes)} classes "
+          f"({target} per class, {len(dataset.paths)} source images)\n")
+    for cls, counts in dataset.summary().items():
+        print(f"   {cls:15s}: {counts['sources']:4d} sources → {counts['originals']:4d} originals "
+              f"+ {counts['augmented']:4d} augmented")
+
+    loader = DataLoader(dataset, batch_size=BATCH_SIZE, shuffle=True, num_workers=num_workers,
+                        pin_memory=torch.cuda.is_available())
+
+    for epoch in range(epochs):
+        dataset.set_epoch(epoch)
+        start = time.perf_counter()
+        count = 0
+        for images, labels in loader:
+            count += len(labels)
+        elapsed = time.perf_counter() - start
+        print(f"\n   Epoch {epoch}: {count} images in {elapsed:.1f}s ({count / elapsed:.1f} img/s, "
+              f"{num_workers} workers)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', type=int, default=TARGET_IMAGES_PER_CLASS, help="virtual images per class")
+    parser.add_argument('--workers', type=int, default=NUM_WORKERS)
+    parser.add_argument('--epochs', type=int, default=1)
+    args = parser.parse_args()
+
+    main(args.target, args.workers, args.epochs)
@@ -1,9 +1,22 @@
 import os
+import sys
 import shutil
 from pathlib import Path
-from PIL import Image, ImageEnhance, ImageOps
+from PIL import Image, ImageOps
+from concurrent.futures import ProcessPoolExecutor
+import itertools
 import random
 import json
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from augmentation import AUG_TYPES, augment_image
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 # ===============================
 # CONFIG
@@ -13,90 +26,187 @@ EXTERNAL_DIR = "dataset/external"
 BALANCED_DIR = "dataset/balanced"
 TARGET_IMAGES_PER_CLASS = 200
 RANDOM_SEED = 42
+NUM_WORKERS = os.cpu_count() or 1
+LINK_MODE = "hardlink"  # "hardlink", "reflink" or "copy" for unchanged originals
+FICLONE = 0x40049409  # Linux ioctl for copy-on-write clones (btrfs, xfs)
 
 # ===============================
 # AUGMENTATION FUNCTIONS
 # ===============================
-def augment_image(img: Image.Image, aug_type: str) -> Image.Image:
+def create_augmentations(img_path: str, aug_types: list) -> list:
     """
-    Apply specific augmentation to an image.
+    Create the augmented versions of an image, decoding the source once.
     """
-    if aug_type == "flip":
-        return img.transpose(Image.FLIP_LEFT_RIGHT)
-    
-    elif aug_type == "rotate_15":
-        return img.rotate(15, resample=Image.BICUBIC, expand=False, fillcolor=(255, 255, 255))
-    
-    elif aug_type == "rotate_-15":
-        return img.rotate(-15, resample=Image.BICUBIC, expand=False, fillcolor=(255, 255, 255))
-    
-    elif aug_type == "brightness_up":
-        enhancer = ImageEnhance.Brightness(img)
-        return enhancer.enhance(1.2)
-    
-    elif aug_type == "brightness_down":
-        enhancer = ImageEnhance.Brightness(img)
-        return enhancer.enhance(0.8)
-    
-    elif aug_type == "contrast_up":
-        enhancer = ImageEnhance.Contrast(img)
-        return enhancer.enhance(1.2)
-    
-    elif aug_type == "contrast_down":
-        enhancer = ImageEnhance.Contrast(img)
-        return enhancer.enhance(0.8)
-    
-    elif aug_type == "color":
-        enhancer = ImageEnhance.Color(img)
-        return enhancer.enhance(1.1)
-    
-    elif aug_type == "sharpness":
-        enhancer = ImageEnhance.Sharpness(img)
-        return enhancer.enhance(1.3)
-    
-    return img
+    img = Image.open(img_path).convert('RGB')
+    return [(augment_image(img, aug_type), aug_type) for aug_type in aug_types]
 
-def create_augmentations(img_path: str, num_augmentations: int) -> list:
+# ===============================
+# PARALLEL HELPERS
+# ===============================
+def collect_sources() -> dict:
+    """{class: [(image path, 'merged' | 'external'), ...]} in a stable order"""
+    all_sources = {}
+    for source, root in (('merged', MERGED_DIR), ('external', EXTERNAL_DIR)):
+        if not os.path.exists(root):
+            continue
+        for cls in sorted(os.listdir(root)):
+            cls_path = os.path.join(root, cls)
+            if os.path.isdir(cls_path):
+                images = sorted(f for f in os.listdir(cls_path)
+                                if f.lower().endswith(('.jpg', '.jpeg', '.png')))
+                all_sources.setdefault(cls, []).extend(
+                    (os.path.join(cls_path, img), source) for img in images)
+    return all_sources
+
+def link_or_copy(src: str, dst: str) -> str:
     """
-    Create multiple augmented versions of an image.
+    Place an unchanged original in the balanced dataset without copying bytes when possible.
+    Hardlinks share the file with the source: never edit balanced images in place.
     """
-    img = Image.open(img_path).convert('RGB')
-    
-    aug_types = ["flip", "rotate_15", "rotate_-15", "brightness_up", 
-                 "brightness_down", "contrast_up", "contrast_down", 
-                 "color", "sharpness"]
-    
-    augmented_images = []
-    
-    # Generate augmentations
-    for i in range(num_augmentations):
-        aug_type = random.choice(aug_types)
-        aug_img = augment_image(img, aug_type)
-        augmented_images.append((aug_img, aug_type))
-    
-    return augmented_images
+    if os.path.exists(dst):
+        os.remove(dst)
+
+    if LINK_MODE == "hardlink":
+        try:
+            os.link(src, dst)
+            return "hardlink"
+        except OSError:
+            pass
+
+    if LINK_MODE in ("hardlink", "reflink") and hasattr(fcntl, "ioctl"):
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            return "reflink"
+        except OSError:
+            os.remove(dst)
+
+    shutil.copy2(src, dst)
+    return "copy"
+
+def augment_source(job: dict) -> dict:
+    """
+    Worker: decode one source image once and save all of its planned augmentations.
+    """
+    start = time.perf_counter()
+    saved = []
+    try:
+        augmented = create_augmentations(job["img_path"], [aug_type for aug_type, _ in job["outputs"]])
+        for (aug_img, aug_type), (_, output_path) in zip(augmented, job["outputs"]):
+            aug_img.save(output_path, 'JPEG', quality=95)
+            saved.append(output_path)
+        error = None
+    except Exception as e:
+        error = str(e)
+
+    return {
+        "cls": job["cls"],
+        "img_path": job["img_path"],
+        "saved": len(saved),
+        "error": error,
+        "seconds": time.perf_counter() - start
+    }
+
+def plan_augmentations(cls: str, sources, needed: int, per_image: int, first_idx: int,
+                       output_class_dir: str, rng: random.Random) -> list:
+    """
+    Jobs producing `needed` augmentations, at most `per_image` per source taken
+    in order, numbered from first_idx. Augmentation types are drawn from `rng`.
+    """
+    jobs = []
+    aug_count = 0
+    for img_path in sources:
+        if aug_count >= needed:
+            break
+        outputs = []
+        for _ in range(min(per_image, needed - aug_count)):
+            aug_type = rng.choice(AUG_TYPES)
+            img_name = f"{cls}_aug{first_idx + aug_count:04d}_{aug_type}.jpg"
+            outputs.append((aug_type, os.path.join(output_class_dir, img_name)))
+            aug_count += 1
+        jobs.append({"cls": cls, "img_path": img_path, "outputs": outputs})
+    return jobs
+
+def plan_class(cls: str, images_list: list, output_class_dir: str, rng: random.Random) -> dict:
+    """
+    Decide everything random for one class up front: which originals are kept
+    and which augmentations each source produces. Classes are planned in sorted
+    order from the single RANDOM_SEED stream, as the serial script did.
+    """
+    original_count = len(images_list)
+
+    if original_count >= TARGET_IMAGES_PER_CLASS:
+        kept = rng.sample(images_list, TARGET_IMAGES_PER_CLASS)
+        action = "sampled"
+    else:
+        kept = list(images_list)
+        action = "augmented"
+
+    links = [(img_path, os.path.join(output_class_dir, f"{cls}_{idx:04d}.jpg"))
+             for idx, (img_path, source) in enumerate(kept)]
+
+    needed = TARGET_IMAGES_PER_CLASS - original_count if action == "augmented" else 0
+    per_image = (needed // original_count) + 1 if needed else 0
+    jobs = plan_augmentations(cls, [img_path for img_path, _ in images_list], needed, per_image, 0,
+                              output_class_dir, rng)
+
+    return {"action": action, "links": links, "jobs": jobs, "needed": needed, "per_image": per_image,
+            "planned": needed, "output_dir": output_class_dir}
+
+def replan_shortfall(cls: str, plan: dict, images_list: list, result: dict, rng: random.Random) -> list:
+    """
+    Jobs making up for the augmentations lost to sources that failed: spread over
+    the sources the plan did not use yet, then over the ones that worked.
+    """
+    shortfall = plan["needed"] - result["saved"]
+    failed = set(result["failed"])
+    used = {job["img_path"] for job in result["jobs"]}
+    sources = [img_path for img_path, _ in images_list if img_path not in failed]
+    candidates = [p for p in sources if p not in used] + [p for p in sources if p in used]
+    if shortfall <= 0 or not candidates:
+        return []
+
+    jobs = plan_augmentations(cls, itertools.cycle(candidates), shortfall, plan["per_image"], plan["planned"],
+                              plan["output_dir"], rng)
+    plan["planned"] += shortfall
+    return jobs
+
+def run_jobs(jobs: list, results: dict, num_workers: int):
+    """Run augmentation jobs on the process pool, accumulating per-class results"""
+    with ProcessPoolExecutor(max_workers=num_workers) as pool:
+        for job, result in zip(jobs, pool.map(augment_source, jobs, chunksize=4)):
+            cls_result = results[result["cls"]]
+            cls_result["jobs"].append(job)
+            cls_result["saved"] += result["saved"]
+            cls_result["seconds"] += result["seconds"]
+            if result["error"]:
+                print(f"      ⚠️  Augmentation failed for {result['img_path']}: {result['error']}")
+                cls_result["failed"].append(result["img_path"])
 
 # ===============================
 # BALANCING FUNCTION
 # ===============================
-def balance_dataset():
+def balance_dataset(num_workers: int = NUM_WORKERS):
     """
     Balance dataset to TARGET_IMAGES_PER_CLASS per class.
     - Sample down classes with >200 images
     - Augment classes with <200 images
+    Originals are linked rather than copied and augmentations run on a process
+    pool. Every random choice is planned serially from RANDOM_SEED, so the output
+    does not depend on num_workers; augmentations lost to unreadable sources are
+    re-planned onto the other sources of their class.
     """
-    random.seed(RANDOM_SEED)
-    
     # Create output directory
     Path(BALANCED_DIR).mkdir(parents=True, exist_ok=True)
     
     print(f"⚖️  Balancing dataset to {TARGET_IMAGES_PER_CLASS} images per class")
-    print(f"Random seed: {RANDOM_SEED}\n")
+    print(f"Random seed: {RANDOM_SEED} | Workers: {num_workers} | Originals: {LINK_MODE}\n")
     
     balance_log = {
         "config": {
             "target_per_class": TARGET_IMAGES_PER_CLASS,
-            "random_seed": RANDOM_SEED
+            "random_seed": RANDOM_SEED,
+            "link_mode": LINK_MODE
         },
         "classes": {},
         "summary": {
@@ -107,28 +217,7 @@ def balance_dataset():
         }
     }
     
-    # Get all classes from merged and external
-    all_sources = {}
-    
-    # From merged
-    if os.path.exists(MERGED_DIR):
-        for cls in os.listdir(MERGED_DIR):
-            cls_path = os.path.join(MERGED_DIR, cls)
-            if os.path.isdir(cls_path):
-                images = [f for f in os.listdir(cls_path) 
-                         if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
-                all_sources[cls] = [(os.path.join(cls_path, img), 'merged') for img in images]
-    
-    # Add from external
-    if os.path.exists(EXTERNAL_DIR):
-        for cls in os.listdir(EXTERNAL_DIR):
-            cls_path = os.path.join(EXTERNAL_DIR, cls)
-            if os.path.isdir(cls_path):
-                images = [f for f in os.listdir(cls_path) 
-                         if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
-                if cls not in all_sources:
-                    all_sources[cls] = []
-                all_sources[cls].extend([(os.path.join(cls_path, img), 'external') for img in images])
+    all_sources = collect_sources()
     
     if not all_sources:
         print("❌ No images found in merged or external directories!")
@@ -136,89 +225,79 @@ def balance_dataset():
     
     print(f"Found {len(all_sources)} classes\n")
     
-    # Process each class
+    # Plan every class, then place originals (links are cheap, done here)
+    rng = random.Random(RANDOM_SEED)
+    plans = {}
+    link_stats = {}
     for cls in sorted(all_sources.keys()):
-        images_list = all_sources[cls]
-        original_count = len(images_list)
-        
-        # Create output directory for this class
         output_class_dir = os.path.join(BALANCED_DIR, cls)
         Path(output_class_dir).mkdir(parents=True, exist_ok=True)
         
+        plans[cls] = plan_class(cls, all_sources[cls], output_class_dir, rng)
+        link_stats[cls] = {}
+        for img_path, output_path in plans[cls]["links"]:
+            mode = link_or_copy(img_path, output_path)
+            link_stats[cls][mode] = link_stats[cls].get(mode, 0) + 1
+    
+    # Augmentations on the process pool
+    jobs = [job for cls in sorted(plans) for job in plans[cls]["jobs"]]
+    results = {cls: {"saved": 0, "seconds": 0.0, "failed": [], "jobs": []} for cls in plans}
+    
+    start = time.perf_counter()
+    while jobs:
+        run_jobs(jobs, results, num_workers)
+        # Top up classes whose sources failed until the target is met or no source is left
+        jobs = [job for cls in sorted(plans)
+                for job in replan_shortfall(cls, plans[cls], all_sources[cls], results[cls], rng)]
+    elapsed = time.perf_counter() - start
+    
+    # Process each class
+    for cls in sorted(plans):
+        original_count = len(all_sources[cls])
+        plan = plans[cls]
         balance_log["summary"]["total_original"] += original_count
         
-        if original_count >= TARGET_IMAGES_PER_CLASS:
-            # Sample down
-            sampled = random.sample(images_list, TARGET_IMAGES_PER_CLASS)
-            
-            for idx, (img_path, source) in enumerate(sampled):
-                img_name = f"{cls}_{idx:04d}.jpg"
-                output_path = os.path.join(output_class_dir, img_name)
-                shutil.copy2(img_path, output_path)
-            
+        if plan["action"] == "sampled":
             balance_log["classes"][cls] = {
                 "original_count": original_count,
                 "final_count": TARGET_IMAGES_PER_CLASS,
                 "action": "sampled",
-                "sampled_from": original_count
+                "sampled_from": original_count,
+                "originals": link_stats[cls]
             }
             balance_log["summary"]["classes_sampled"].append(cls)
+            balance_log["summary"]["total_balanced"] += TARGET_IMAGES_PER_CLASS
             
             print(f"   {cls:15s}: {original_count:4d} → {TARGET_IMAGES_PER_CLASS:3d} (sampled)")
         
         else:
-            # Need augmentation
-            needed = TARGET_IMAGES_PER_CLASS - original_count
-            
-            # Copy all original images first
-            for idx, (img_path, source) in enumerate(images_list):
-                img_name = f"{cls}_{idx:04d}.jpg"
-                output_path = os.path.join(output_class_dir, img_name)
-                shutil.copy2(img_path, output_path)
-            
-            # Generate augmentations
-            aug_per_image = (needed // original_count) + 1
-            aug_count = 0
-            
-            for img_path, source in images_list:
-                if aug_count >= needed:
-                    break
-                
-                try:
-                    augmented = create_augmentations(img_path, min(aug_per_image, needed - aug_count))
-                    
-                    for aug_img, aug_type in augmented:
-                        img_name = f"{cls}_aug{aug_count:04d}_{aug_type}.jpg"
-                        output_path = os.path.join(output_class_dir, img_name)
-                        aug_img.save(output_path, 'JPEG', quality=95)
-                        aug_count += 1
-                        
-                        if aug_count >= needed:
-                            break
-                
-                except Exception as e:
-                    print(f"      ⚠️  Augmentation failed for {img_path}: {e}")
-                    continue
-            
+            aug_count = results[cls]["saved"]
             final_count = original_count + aug_count
+            seconds = results[cls]["seconds"]
+            throughput = aug_count / seconds if seconds else 0.0
             
             balance_log["classes"][cls] = {
                 "original_count": original_count,
                 "augmented_count": aug_count,
                 "final_count": final_count,
-                "action": "augmented"
+                "action": "augmented",
+                "originals": link_stats[cls],
+                "failed_sources": results[cls]["failed"],
+                "replanned": plan["planned"] - plan["needed"],
+                "augmentations_per_second": throughput
             }
             balance_log["summary"]["classes_augmented"].append(cls)
+            balance_log["summary"]["total_balanced"] += final_count
             
-            print(f"   {cls:15s}: {original_count:4d} → {final_count:3d} (augmented +{aug_count})")
-        
-        balance_log["summary"]["total_balanced"] += TARGET_IMAGES_PER_CLASS if original_count >= TARGET_IMAGES_PER_CLASS else final_count
+            print(f"   {cls:15s}: {original_count:4d} → {final_count:3d} (augmented +{aug_count}, "
+                  f"{throughput:.1f} img/s per worker)")
     
     # Save log
     log_path = os.path.join(BALANCED_DIR, "balance_log.json")
     with open(log_path, 'w') as f:
         json.dump(balance_log, f, indent=2)
     
+    total_aug = sum(r["saved"] for r in results.values())
     print(f"\n{'='*60}")
     print(f"✅ Dataset balanced!")
     print(f"📊 Summary:")
@@ -226,6 +305,7 @@ def balance_dataset():
     print(f"   - Balanced total: {balance_log['summary']['total_balanced']} images")
     print(f"   - Classes sampled: {len(balance_log['summary']['classes_sampled'])}")
     print(f"   - Classes augmented: {len(balance_log['summary']['classes_augmented'])}")
+    print(f"   - Augmentations: {total_aug} in {elapsed:.1f}s ({total_aug / elapsed if elapsed else 0:.1f} img/s)")
     print(f"\n📄 Log: {log_path}")
     print(f"📂 Balanced dataset: {BALANCED_DIR}/")
     print(f"{'='*60}")
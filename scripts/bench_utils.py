@@ -0,0 +1,99 @@
+"""
+Helpers shared by the benchmark scripts: latency summaries, memory,
+machine-readable results and regression checks against a baseline
+"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from batching import percentiles
+from metrics import process_rss_bytes
+
+
+def summarize_latencies(seconds: List[float]) -> dict:
+    """Mean and p50/p95/p99 in ms of a list of durations in seconds"""
+    if not seconds:
+        return {'count': 0, 'mean_ms': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0}
+
+    ordered = sorted(seconds)
+    return {
+        'count': len(ordered),
+        'mean_ms': sum(ordered) / len(ordered) * 1000,
+        **{f"{name}_ms": value for name, value in percentiles(ordered).items()}
+    }
+
+
+def process_rss_mb() -> float:
+    """Current resident memory of this process in MB"""
+    return process_rss_bytes() / 1024 ** 2
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process in MB"""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def environment() -> dict:
+    """Context needed to compare two result files"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+
+    info = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'inference_backend': os.getenv('INFERENCE_BACKEND', 'eager'),
+        'inference_mode': os.getenv('INFERENCE_MODE', 'single')
+    }
+    try:
+        import torch
+        info['torch'] = torch.__version__
+    except ImportError:
+        pass
+    return info
+
+
+def write_results(path: str, results: dict):
+    """Save results as JSON"""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"📄 Results: {path}")
+
+
+def compare_to_baseline(cases: dict, baseline_path: str, tolerance: float) -> bool:
+    """
+    Compare {case: {'p95_ms': ...}} against the same cases in a previous result
+    file. Prints every change and returns False if a p95 grew by more than `tolerance`.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f).get('cases', {})
+
+    ok = True
+    print(f"\n📉 Comparison with {baseline_path} (tolerance {tolerance:.0%} on p95)")
+    for name, current in cases.items():
+        previous = baseline.get(name)
+        if not previous or not previous.get('p95_ms'):
+            continue
+        change = current['p95_ms'] / previous['p95_ms'] - 1
+        regressed = change > tolerance
+        ok &= not regressed
+        marker = '❌' if regressed else '✅'
+        print(f"   {marker} {name:40s} p95 {previous['p95_ms']:8.1f} → {current['p95_ms']:8.1f} ms ({change:+.1%})")
+    return ok
@@ -0,0 +1,149 @@
+"""
+Micro-benchmarks of the prediction hot path of app.py: preprocess_image, the
+forward pass and top-k, across batch sizes and torch thread counts.
+
+Usage: python scripts/benchmark_inference.py [--batch-sizes 1 4 8] [--threads 1 2 4]
+                                             [--baseline old.json]
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault('BATCHING_ENABLED', '0')
+os.environ.setdefault('PREDICTION_CACHE', 'off')
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import torch
+
+import app
+from bench_utils import compare_to_baseline, environment, peak_rss_mb, summarize_latencies, write_results
+
+# ===============================
+# CONFIG
+# ===============================
+SAMPLES_DIR = "src/public/samples"
+OUTPUT_PATH = "benchmarks/benchmark_inference.json"
+BATCH_SIZES = [1, 2, 4, 8, 16]
+RUNS = 20
+WARMUP_RUNS = 2
+
+# ===============================
+# HELPERS
+# ===============================
+def load_samples(samples_dir: str) -> list:
+    """Raw bytes of every sample image the API accepts"""
+    samples = []
+    for f in sorted(os.listdir(samples_dir)):
+        if app.allowed_file(f):
+            with open(os.path.join(samples_dir, f), 'rb') as fh:
+                samples.append((f, fh.read()))
+    return samples
+
+def time_calls(fn, runs: int, warmup: int = WARMUP_RUNS) -> list:
+    """Durations in seconds of `runs` calls of fn(i) after `warmup` calls"""
+    for i in range(warmup):
+        fn(i)
+    times = []
+    for i in range(runs):
+        start = time.perf_counter()
+        fn(i)
+        times.append(time.perf_counter() - start)
+    return times
+
+def print_case(name: str, result: dict):
+    extra = f" {result['images_per_sec']:8.1f} img/s" if 'images_per_sec' in result else ''
+    print(f"   {name:40s} p50 {result['p50_ms']:8.2f}  p95 {result['p95_ms']:8.2f}  "
+          f"p99 {result['p99_ms']:8.2f} ms{extra}")
+
+# ===============================
+# BENCHMARKS
+# ===============================
+def bench_preprocess(samples: list, runs: int) -> dict:
+    """preprocess_image on in-memory uploads, one image per call"""
+    times = time_calls(lambda i: app.preprocess_image(io.BytesIO(samples[i % len(samples)][1])), runs)
+    return {'preprocess': summarize_latencies(times)}
+
+def bench_model(samples: list, batch_sizes: list, threads: list, runs: int) -> dict:
+    """Forward pass and top-k for every (threads, batch size) pair"""
+    images = torch.cat([app.preprocess_image(io.BytesIO(data)).cpu() for _, data in samples])
+    cases = {}
+
+    for n_threads in threads:
+        torch.set_num_threads(n_threads)
+        for batch_size in batch_sizes:
+            batch = images[torch.arange(batch_size) % len(images)].to(app.device)
+
+            def forward(_):
+                with torch.no_grad():
+                    return app.model(batch)
+
+            times = time_calls(forward, runs)
+            result = summarize_latencies(times)
+            result['images_per_sec'] = batch_size / (sum(times) / len(times))
+            cases[f"forward/threads={n_threads}/batch={batch_size}"] = result
+
+            probabilities = torch.nn.functional.softmax(forward(0), dim=1).cpu()
+            times = time_calls(lambda _: [app.format_prediction(row) for row in probabilities], runs)
+            cases[f"topk/threads={n_threads}/batch={batch_size}"] = summarize_latencies(times)
+
+    return cases
+
+# ===============================
+# MAIN
+# ===============================
+def benchmark_inference(samples_dir: str, batch_sizes: list, threads: list, runs: int,
+                        output: str, baseline: str = None, tolerance: float = 0.10) -> bool:
+    """Run every micro-benchmark, save the results, optionally compare with a baseline"""
+    if not app.model_loaded:
+        print("❌ Model not loaded, nothing to benchmark")
+        return False
+
+    samples = load_samples(samples_dir)
+    if not samples:
+        print(f"❌ No sample images in {samples_dir}")
+        return False
+
+    print(f"⏱️  Inference micro-benchmarks ({len(samples)} samples, {runs} runs per case)")
+    print(f"Backend: {app.INFERENCE_BACKEND} | Device: {app.device}\n")
+
+    default_threads = torch.get_num_threads()
+    cases = bench_preprocess(samples, runs)
+    cases.update(bench_model(samples, batch_sizes, threads or [default_threads], runs))
+    torch.set_num_threads(default_threads)
+
+    for name, result in cases.items():
+        print_case(name, result)
+
+    results = {
+        'benchmark': 'inference',
+        'environment': environment(),
+        'config': {'batch_sizes': batch_sizes, 'threads': threads or [default_threads], 'runs': runs},
+        'peak_rss_mb': peak_rss_mb(),
+        'cases': cases
+    }
+    print(f"\n💾 Peak RSS: {results['peak_rss_mb']:.0f} MB")
+    write_results(output, results)
+
+    if baseline:
+        return compare_to_baseline(cases, baseline, tolerance)
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples-dir', default=SAMPLES_DIR)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=BATCH_SIZES)
+    parser.add_argument('--threads', type=int, nargs='+', default=None,
+                        help="torch intra-op thread counts (default: torch's own)")
+    parser.add_argument('--runs', type=int, default=RUNS)
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    parser.add_argument('--baseline', default=None, help="previous result file to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="allowed p95 regression (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    ok = benchmark_inference(args.samples_dir, args.batch_sizes, args.threads, args.runs,
+                             args.output, args.baseline, args.tolerance)
+    sys.exit(0 if ok else 1)
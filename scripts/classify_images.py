@@ -0,0 +1,275 @@
+"""
+Offline bulk classification of a local image folder with the app.py model and
+preprocessing, e.g. to back-fill labels on a large photo archive overnight.
+
+Pipeline: decoder processes feed a bounded queue of decoded images, the model
+consumes fixed-size batches, a writer thread streams one CSV/JSONL row per
+image. The output file is the checkpoint: an interrupted run restarted with the
+same arguments skips every image already written.
+
+Usage: python scripts/classify_images.py INPUT_DIR [--output reports/predictions.jsonl]
+                                         [--batch-size 32] [--workers N] [--model efficientnet]
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dataset_utils import IMAGE_EXTENSIONS
+from preprocessing import Preprocessor
+
+# ===============================
+# CONFIG
+# ===============================
+OUTPUT_PATH = "reports/predictions.jsonl"
+BATCH_SIZE = 32
+NUM_WORKERS = max(1, (os.cpu_count() or 2) // 2)  # the other half runs the forward pass
+DECODE_CHUNK = 16         # images per decoder task
+QUEUE_BATCHES = 4         # decoded batches allowed ahead of the model
+CHECKPOINT_EVERY = 10     # batches between two fsyncs of the output file
+PROGRESS_EVERY = 20       # batches between two progress lines
+FIELDS = ['path', 'predicted_class', 'confidence', 'top_3', 'model', 'model_version', 'error']
+
+# ===============================
+# DECODING (worker processes)
+# ===============================
+_decoder = None
+
+def init_decoder(size: int, draft: bool):
+    global _decoder
+    _decoder = Preprocessor(size, draft=draft)
+
+def decode_chunk(paths: list) -> list:
+    """Worker: (path, uint8 HWC pixels or None, error) for a chunk of images"""
+    results = []
+    for path in paths:
+        try:
+            results.append((path, _decoder.resize(_decoder.load(path)), None))
+        except Exception as e:
+            results.append((path, None, f"Could not decode image: {e}"))
+    return results
+
+# ===============================
+# OUTPUT
+# ===============================
+def output_format(path: str) -> str:
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+def lock_output(path: str):
+    """Exclusive lock on `path`.lock so two runs never append to the same output (None if taken)"""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    lock = open(path + '.lock', 'w')
+    if fcntl is not None:
+        try:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return None
+    return lock
+
+def resume(path: str, fmt: str) -> set:
+    """Paths already classified in an existing output (a torn last row is cut off)"""
+    if not os.path.exists(path):
+        return set()
+    with open(path, 'rb+') as f:
+        data = f.read()
+        end = data.rfind(b'\n') + 1
+        if end < len(data):
+            f.truncate(end)  # the run was interrupted in the middle of a row
+
+    lines = data[:end].decode('utf-8').splitlines()
+    if fmt == 'csv':
+        return {row['path'] for row in csv.DictReader(lines)}
+    return {json.loads(line)['path'] for line in lines if line.strip()}
+
+class ResultWriter:
+    """Writer thread: append rows to the output, fsync every `checkpoint_every` batches"""
+
+    def __init__(self, path: str, fmt: str, checkpoint_every: int = CHECKPOINT_EVERY):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.fmt = fmt
+        self.checkpoint_every = checkpoint_every
+        self._file = open(path, 'a', encoding='utf-8', newline='')
+        self._csv = csv.DictWriter(self._file, fieldnames=FIELDS) if fmt == 'csv' else None
+        if self._csv is not None and new_file:
+            self._csv.writeheader()
+        self._queue = queue.Queue(maxsize=QUEUE_BATCHES)
+        self._thread = threading.Thread(target=self._loop, name='result-writer', daemon=True)
+        self._thread.start()
+
+    def put(self, rows: list):
+        self._queue.put(rows)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+
+    def _loop(self):
+        batches = 0
+        while True:
+            rows = self._queue.get()
+            if rows is None:
+                break
+            for row in rows:
+                if self._csv is not None:
+                    self._csv.writerow({**row, 'top_3': json.dumps(row['top_3']) if row['top_3'] else ''})
+                else:
+                    self._file.write(json.dumps(row) + '\n')
+            self._file.flush()
+            batches += 1
+            if batches % self.checkpoint_every == 0:
+                os.fsync(self._file.fileno())
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+# ===============================
+# MAIN
+# ===============================
+def scan_images(input_dir: str) -> list:
+    """Relative paths of every image under input_dir, in a stable order"""
+    paths = []
+    for root, dirs, names in os.walk(input_dir):
+        dirs.sort()
+        for name in sorted(names):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.relpath(os.path.join(root, name), input_dir))
+    return paths
+
+def classify_images(input_dir: str, output: str = OUTPUT_PATH, batch_size: int = BATCH_SIZE,
+                    num_workers: int = NUM_WORKERS, model_name: str = None, threads: int = None):
+    """Classify every image of input_dir not yet present in `output`"""
+    if not os.path.isdir(input_dir):
+        print(f"❌ {input_dir} not found")
+        return
+
+    lock = lock_output(output)
+    if lock is None:
+        print(f"❌ Another run is already writing {output}")
+        return
+
+    try:
+        fmt = output_format(output)
+        paths = scan_images(input_dir)
+        done = resume(output, fmt)
+        todo = [p for p in paths if p not in done]
+
+        print(f"🏷️  Bulk classification: {input_dir} → {output}")
+        print(f"Images: {len(paths)} | Already classified: {len(paths) - len(todo)} | To classify: {len(todo)}")
+        if not todo:
+            print("✅ Nothing to do")
+            return
+
+        os.environ.setdefault('BATCHING_ENABLED', '0')
+        os.environ.setdefault('PREDICTION_CACHE', 'off')
+        import torch
+        import app
+
+        if threads:
+            torch.set_num_threads(threads)
+        loaded = app.model_registry.get(model_name or app.DEFAULT_MODEL)
+        preprocessor = loaded.preprocessor
+        version = loaded.version[:12]
+        print(f"Model: {loaded.name} ({version}) | Batch size: {batch_size} | Decoders: {num_workers} | "
+              f"Torch threads: {torch.get_num_threads()}\n")
+
+        writer = ResultWriter(output, fmt)
+        buffer = np.empty((batch_size, 3, preprocessor.size, preprocessor.size), dtype=np.float32)
+        batch_paths = []
+        error_rows = []  # unreadable images, written with the next batch
+        stats = {'images': 0, 'errors': 0, 'batches': 0}
+        start = time.perf_counter()
+
+        def run_batch():
+            n = len(batch_paths)
+            predictions = app.run_model_batch([torch.from_numpy(buffer[:n])], loaded)
+            writer.put(error_rows + [{
+                'path': path, 'predicted_class': predicted_class, 'confidence': round(confidence, 2),
+                'top_3': top_3, 'model': loaded.name, 'model_version': version, 'error': None
+            } for path, (predicted_class, confidence, top_3, _) in zip(batch_paths, predictions)])
+            error_rows.clear()
+            stats['images'] += n
+            stats['batches'] += 1
+            batch_paths.clear()
+            if stats['batches'] % PROGRESS_EVERY == 0:
+                elapsed = time.perf_counter() - start
+                print(f"   ... {stats['images'] + stats['errors']}/{len(todo)} images, "
+                      f"{stats['images'] / elapsed:.1f} img/s")
+
+        chunks = iter([todo[i:i + DECODE_CHUNK] for i in range(0, len(todo), DECODE_CHUNK)])
+        max_pending = max(2, QUEUE_BATCHES * batch_size // DECODE_CHUNK)
+        try:
+            # Spawned, not forked: the decoders do not inherit the loaded model and torch thread pools
+            with ProcessPoolExecutor(max_workers=num_workers, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=init_decoder,
+                                     initargs=(preprocessor.size, preprocessor.draft)) as pool:
+                # Bounded queue: at most max_pending decoded chunks wait for the model
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(pool.submit(decode_chunk, [os.path.join(input_dir, p) for p in chunk]))
+                    if len(pending) >= max_pending:
+                        break
+
+                while pending:
+                    for path, pixels, error in pending.popleft().result():
+                        rel = os.path.relpath(path, input_dir)
+                        if pixels is None:
+                            stats['errors'] += 1
+                            error_rows.append({**dict.fromkeys(FIELDS), 'path': rel, 'model': loaded.name,
+                                               'model_version': version, 'error': error})
+                            continue
+                        preprocessor.normalize(pixels, out=buffer[len(batch_paths)])
+                        batch_paths.append(rel)
+                        if len(batch_paths) == batch_size:
+                            run_batch()
+
+                    chunk = next(chunks, None)
+                    if chunk is not None:
+                        pending.append(pool.submit(decode_chunk, [os.path.join(input_dir, p) for p in chunk]))
+
+                if batch_paths:
+                    run_batch()
+                if error_rows:
+                    writer.put(error_rows)
+        finally:
+            writer.close()
+
+        elapsed = time.perf_counter() - start
+        print(f"\n{'='*60}")
+        print(f"✅ {stats['images']} images classified in {elapsed:.1f}s ({stats['images'] / elapsed:.1f} img/s)")
+        print(f"   - Unreadable images: {stats['errors']}")
+        print(f"\n📄 Results: {output}")
+        print(f"{'='*60}")
+    finally:
+        lock.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input_dir')
+    parser.add_argument('--output', default=OUTPUT_PATH, help=".jsonl or .csv")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=NUM_WORKERS, help="decoder processes")
+    parser.add_argument('--model', default=None, help="registry model name (default: the app.py model)")
+    parser.add_argument('--threads', type=int, default=None, help="torch intra-op threads")
+    args = parser.parse_args()
+
+    classify_images(args.input_dir, args.output, args.batch_size, args.workers, args.model, args.threads)
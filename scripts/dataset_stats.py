@@ -0,0 +1,240 @@
+"""
+Single-pass dataset statistics for normalization and EDA. Every image is
+decoded once, on a process pool, into its RGB histogram and luminosity; all
+statistics are then derived from those exact integer counts, so partial results
+from any number of workers merge without loss of precision.
+
+Per-image results are kept in <output-dir>/stats_state.npz: a later run only
+decodes images that are new or changed (size/mtime) and drops removed ones,
+then rewrites the outputs:
+    normalization_stats.json    per-channel pixel mean/std in [0, 1]
+    color_analysis.csv / .json  mean RGB per class
+    luminosity_per_image.csv    luminosity of every image
+    class_statistics.json       mean_rgb, mean_luminosity, luminosity_std per class
+    color_histograms.json       256-bin R/G/B pixel counts per class
+
+Usage: python scripts/dataset_stats.py [--data-dir dataset/splits/train] [--output-dir eda_results]
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from dataset_utils import list_images
+
+# ===============================
+# CONFIG
+# ===============================
+DATA_DIR = "dataset/splits/train"
+OUTPUT_DIR = "eda_results"
+STATE_FILE = "stats_state.npz"
+NUM_WORKERS = os.cpu_count() or 1
+CHANNELS = ["R", "G", "B"]
+LEVELS = np.arange(256, dtype=np.float64)
+
+# ===============================
+# PER-IMAGE STATS (workers)
+# ===============================
+def image_stats(path: str) -> tuple:
+    """Worker: (768-bin RGB histogram, mean luminosity) of one image, or (None, None) if unreadable"""
+    try:
+        with Image.open(path) as img:
+            img = img.convert('RGB')
+            hist = np.array(img.histogram(), dtype=np.int64)
+            lum_hist = np.array(img.convert('L').histogram(), dtype=np.float64)
+        return hist, float((lum_hist * LEVELS).sum() / lum_hist.sum())
+    except Exception:
+        return None, None
+
+# ===============================
+# MERGING
+# ===============================
+def channel_moments(hist: np.ndarray) -> tuple:
+    """
+    Per-channel (mean, std) in [0, 255] from one or more summed (768,) histograms.
+    Sums of integer counts are exact, so the merge order never changes the result;
+    the variance is taken around the mean rather than as E[x²] - E[x]².
+    """
+    counts = hist.reshape(3, 256).astype(np.float64)
+    n = counts.sum(axis=1)
+    mean = (counts * LEVELS).sum(axis=1) / n
+    var = (counts * (LEVELS[None, :] - mean[:, None]) ** 2).sum(axis=1) / n
+    return mean, np.sqrt(var)
+
+def image_means(hists: np.ndarray) -> np.ndarray:
+    """(N, 3) mean RGB of each image from its (N, 768) histograms"""
+    counts = hists.reshape(len(hists), 3, 256).astype(np.float64)
+    return (counts * LEVELS).sum(axis=2) / counts.sum(axis=2)
+
+# ===============================
+# STATE
+# ===============================
+def load_state(path: str, data_dir: str) -> dict:
+    """{relative path: (size, mtime, class, histogram, luminosity)} of a previous run on data_dir"""
+    if not os.path.exists(path):
+        return {}
+    with np.load(path, allow_pickle=False) as state:
+        if str(state["data_dir"]) != os.path.abspath(data_dir):
+            return {}
+        return {
+            rel: (int(size), float(mtime), str(cls), hist, float(lum))
+            for rel, size, mtime, cls, hist, lum in zip(state["paths"], state["sizes"], state["mtimes"],
+                                                         state["classes"], state["hists"], state["luminosity"])
+        }
+
+def save_state(path: str, data_dir: str, entries: dict):
+    rels = sorted(entries)
+    tmp_path = path + ".tmp.npz"
+    np.savez_compressed(
+        tmp_path,
+        data_dir=np.array(os.path.abspath(data_dir)),
+        paths=np.array(rels, dtype=str),
+        sizes=np.array([entries[r][0] for r in rels], dtype=np.int64),
+        mtimes=np.array([entries[r][1] for r in rels], dtype=np.float64),
+        classes=np.array([entries[r][2] for r in rels], dtype=str),
+        hists=np.array([entries[r][3] for r in rels], dtype=np.int64).reshape(len(rels), 768),
+        luminosity=np.array([entries[r][4] for r in rels], dtype=np.float64)
+    )
+    os.replace(tmp_path, path)
+
+# ===============================
+# OUTPUTS
+# ===============================
+def write_outputs(entries: dict, output_dir: str):
+    """Rewrite the EDA files from the per-image entries (no decoding involved)"""
+    rels = sorted(entries)
+    classes = np.array([entries[r][2] for r in rels])
+    hists = np.array([entries[r][3] for r in rels], dtype=np.int64).reshape(len(rels), 768)
+    luminosity = np.array([entries[r][4] for r in rels])
+    means = image_means(hists)
+
+    mean, std = channel_moments(hists.sum(axis=0))
+    normalization = {
+        "mean": {c.lower(): float(m / 255) for c, m in zip(CHANNELS, mean)},
+        "std": {c.lower(): float(s / 255) for c, s in zip(CHANNELS, std)}
+    }
+    with open(os.path.join(output_dir, "normalization_stats.json"), 'w') as f:
+        json.dump(normalization, f, indent=2)
+
+    class_names = sorted(set(classes))
+    color_analysis = {}
+    histograms = {}
+    stats_path = os.path.join(output_dir, "class_statistics.json")
+    class_statistics = {}
+    if os.path.exists(stats_path):
+        with open(stats_path) as f:
+            class_statistics = json.load(f)
+
+    for cls in class_names:
+        mask = classes == cls
+        color_analysis[cls] = {c: float(v) for c, v in zip(CHANNELS, means[mask].mean(axis=0))}
+        class_hist = hists[mask].sum(axis=0).reshape(3, 256)
+        histograms[cls] = {c: class_hist[i].tolist() for i, c in enumerate(CHANNELS)}
+
+        # Keep the fields computed elsewhere (split counts), refresh the color ones
+        entry = class_statistics.setdefault(cls, {})
+        entry["mean_rgb"] = color_analysis[cls]
+        entry["mean_luminosity"] = float(luminosity[mask].mean())
+        entry["luminosity_std"] = float(luminosity[mask].std(ddof=1)) if mask.sum() > 1 else 0.0
+
+    with open(os.path.join(output_dir, "color_analysis.json"), 'w') as f:
+        json.dump(color_analysis, f, indent=2)
+    with open(os.path.join(output_dir, "color_analysis.csv"), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Classe"] + CHANNELS)
+        for cls in class_names:
+            writer.writerow([cls] + [color_analysis[cls][c] for c in CHANNELS])
+
+    with open(os.path.join(output_dir, "luminosity_per_image.csv"), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Classe", "Luminosité"])
+        writer.writerows(zip(classes, luminosity))
+
+    with open(stats_path, 'w') as f:
+        json.dump(class_statistics, f, indent=2)
+    with open(os.path.join(output_dir, "color_histograms.json"), 'w') as f:
+        json.dump(histograms, f)
+
+    return normalization
+
+# ===============================
+# MAIN
+# ===============================
+def dataset_stats(data_dir: str = DATA_DIR, output_dir: str = OUTPUT_DIR, num_workers: int = NUM_WORKERS,
+                  rescan: bool = False):
+    """Update the statistics of data_dir, decoding only images not seen by the previous run"""
+    if not os.path.isdir(data_dir):
+        print(f"❌ {data_dir} not found")
+        return
+
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    state_path = os.path.join(output_dir, STATE_FILE)
+    previous = {} if rescan else load_state(state_path, data_dir)
+
+    print(f"📊 Dataset statistics: {data_dir} → {output_dir}/")
+    print(f"Workers: {num_workers} | Known images: {len(previous)}\n")
+
+    class_names = sorted(d for d in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, d)))
+    entries = {}
+    todo = []
+    for path, label in list_images(data_dir, class_names):
+        rel = os.path.relpath(path, data_dir)
+        st = os.stat(path)
+        known = previous.get(rel)
+        if known and known[0] == st.st_size and known[1] == st.st_mtime:
+            entries[rel] = known
+        else:
+            todo.append((rel, path, st.st_size, st.st_mtime, class_names[label]))
+
+    removed = len(set(previous) - set(entries) - {rel for rel, *_ in todo})
+    print(f"   Unchanged: {len(entries)} | To decode: {len(todo)} | Removed: {removed}")
+
+    failed = []
+    start = time.perf_counter()
+    if todo:
+        with ProcessPoolExecutor(max_workers=num_workers) as pool:
+            results = pool.map(image_stats, [path for _, path, *_ in todo], chunksize=8)
+            for (rel, path, size, mtime, cls), (hist, lum) in zip(todo, results):
+                if hist is None:
+                    print(f"      ⚠️  Unreadable image skipped: {path}")
+                    failed.append(rel)
+                    continue
+                entries[rel] = (size, mtime, cls, hist, lum)
+    elapsed = time.perf_counter() - start
+
+    if not entries:
+        print("❌ No readable images found!")
+        return
+
+    save_state(state_path, data_dir, entries)
+    normalization = write_outputs(entries, output_dir)
+
+    decoded = len(todo) - len(failed)
+    print(f"\n{'='*60}")
+    print(f"✅ Statistics updated ({len(entries)} images, {decoded} decoded in {elapsed:.1f}s"
+          f"{f', {decoded / elapsed:.1f} img/s' if decoded and elapsed else ''})")
+    print(f"   Mean: {normalization['mean']}")
+    print(f"   Std:  {normalization['std']}")
+    if failed:
+        print(f"   ⚠️  {len(failed)} unreadable images")
+    print(f"{'='*60}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--workers', type=int, default=NUM_WORKERS)
+    parser.add_argument('--rescan', action='store_true', help="ignore the previous state and decode everything")
+    args = parser.parse_args()
+
+    dataset_stats(args.data_dir, args.output_dir, args.workers, args.rescan)
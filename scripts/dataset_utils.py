@@ -0,0 +1,33 @@
+"""
+Helpers shared by the dataset and evaluation scripts
+"""
+
+import os
+from typing import List, Optional, Tuple
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def list_images(root: str, class_names: Optional[List[str]] = None,
+                limit: Optional[int] = None) -> List[Tuple[str, Optional[int]]]:
+    """
+    (path, label) pairs from a <root>/<class>/<image> folder.
+    Labels index `class_names` (None for a folder not in it); without
+    `class_names` the sorted folder names are used.
+    With `limit`, images are taken evenly across the folder so every class is represented.
+    """
+    folders = sorted(d for d in os.listdir(root) if os.path.isdir(os.path.join(root, d)))
+    class_names = class_names or folders
+
+    samples = []
+    for cls in folders:
+        cls_dir = os.path.join(root, cls)
+        label = class_names.index(cls) if cls in class_names else None
+        for f in sorted(os.listdir(cls_dir)):
+            if f.lower().endswith(IMAGE_EXTENSIONS):
+                samples.append((os.path.join(cls_dir, f), label))
+
+    if limit and len(samples) > limit:
+        step = len(samples) / limit
+        samples = [samples[int(i * step)] for i in range(limit)]
+    return samples
@@ -0,0 +1,291 @@
+"""
+Near-duplicate index of a dataset: a 64-bit perceptual hash (dHash) and, with
+--embeddings, the penultimate-layer EfficientNet-B3 embedding of every image,
+stored in one array-backed .npz file. Reports duplicate clusters and images
+that leak across splits (a test image nearly identical to a train image).
+
+Only new or changed images (size/mtime) are decoded on later runs, and a
+hash-only run keeps the embeddings of a previous --embeddings run.
+
+Usage: python scripts/duplicate_index.py [--data-dir dataset/splits] [--embeddings]
+                                         [--max-distance 4] [--min-similarity 0.97]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from image_quality import DUPLICATE_DISTANCE, QUALITY_SIZE, dhash, hamming_distances, to_gray
+from dataset_utils import IMAGE_EXTENSIONS
+
+# ===============================
+# CONFIG
+# ===============================
+DATA_DIR = "dataset/splits"
+INDEX_PATH = "dataset/duplicate_index.npz"
+REPORT_PATH = "reports/duplicate_report.json"
+NUM_WORKERS = os.cpu_count() or 1
+HASH_CHUNK = 64          # images per worker task
+EMBED_BATCH = 32         # images per EfficientNet forward pass
+MIN_SIMILARITY = 0.97    # cosine similarity of two near-duplicate embeddings
+BLOCK = 512              # rows compared at once in the all-pairs searches
+
+# ===============================
+# FEATURES
+# ===============================
+def hash_chunk(paths: list) -> list:
+    """Worker: dHash of a chunk of images in one vectorized pass (None for unreadable ones)"""
+    thumbs, ok = [], []
+    for path in paths:
+        try:
+            with Image.open(path) as img:
+                img.draft('RGB', (QUALITY_SIZE, QUALITY_SIZE))  # JPEG: decode at reduced scale
+                thumbs.append(to_gray(img))
+            ok.append(True)
+        except Exception:
+            ok.append(False)
+
+    hashes = iter(dhash(np.stack(thumbs)).tolist()) if thumbs else iter(())
+    return [next(hashes) if good else None for good in ok]
+
+def load_app():
+    """app.py with the eager EfficientNet-B3 (its penultimate layer is not exposed by the exports)"""
+    os.environ['INFERENCE_BACKEND'] = 'eager'
+    os.environ.setdefault('BATCHING_ENABLED', '0')
+    os.environ.setdefault('PREDICTION_CACHE', 'off')
+    import app
+    return app
+
+def embed_images(paths: list, batch_size: int = EMBED_BATCH) -> np.ndarray:
+    """(N, D) L2-normalized float16 penultimate-layer embeddings of the eager EfficientNet-B3"""
+    import torch
+    app = load_app()
+
+    model = app.model
+    features = []
+    with torch.no_grad():
+        for start in range(0, len(paths), batch_size):
+            batch = app.preprocessor.batch(paths[start:start + batch_size]).to(app.device)
+            pooled = model._avg_pooling(model.extract_features(batch)).flatten(1)
+            features.append(torch.nn.functional.normalize(pooled, dim=1).cpu().numpy().astype(np.float16))
+            print(f"   ... {min(start + batch_size, len(paths))}/{len(paths)} embedded")
+    return np.concatenate(features)
+
+# ===============================
+# INDEX
+# ===============================
+def scan(data_dir: str) -> dict:
+    """{relative path: (size, mtime)} of every image under data_dir"""
+    files = {}
+    for root, _, names in os.walk(data_dir):
+        for name in sorted(names):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                path = os.path.join(root, name)
+                st = os.stat(path)
+                files[os.path.relpath(path, data_dir)] = (st.st_size, st.st_mtime)
+    return files
+
+def load_index(path: str, data_dir: str) -> dict:
+    """Arrays of a previous index built on data_dir (empty dict otherwise)"""
+    if not os.path.exists(path):
+        return {}
+    with np.load(path, allow_pickle=False) as index:
+        if str(index["data_dir"]) != os.path.abspath(data_dir):
+            return {}
+        return {key: index[key] for key in index.files}
+
+def update_index(data_dir: str, index_path: str, with_embeddings: bool, num_workers: int) -> dict:
+    """Bring the index up to date with data_dir, computing features for new/changed images only"""
+    files = scan(data_dir)
+    previous = load_index(index_path, data_dir)
+
+    known = {}
+    if previous:
+        for i, (rel, size, mtime) in enumerate(zip(previous["paths"], previous["sizes"], previous["mtimes"])):
+            if files.get(str(rel)) == (int(size), float(mtime)):
+                known[str(rel)] = i
+
+    paths = sorted(files)
+    todo = [rel for rel in paths if rel not in known]
+    removed = sum(str(rel) not in files for rel in previous.get("paths", []))
+    print(f"   Indexed: {len(known)} | To add: {len(todo)} | Removed: {removed}")
+
+    new_hashes = {}
+    start = time.perf_counter()
+    if todo:
+        chunks = [todo[i:i + HASH_CHUNK] for i in range(0, len(todo), HASH_CHUNK)]
+        with ProcessPoolExecutor(max_workers=num_workers) as pool:
+            results = pool.map(hash_chunk, [[os.path.join(data_dir, rel) for rel in chunk] for chunk in chunks])
+            for chunk, hashes in zip(chunks, results):
+                for rel, h in zip(chunk, hashes):
+                    if h is None:
+                        print(f"      ⚠️  Unreadable image skipped: {rel}")
+                    else:
+                        new_hashes[rel] = h
+    paths = [rel for rel in paths if rel in known or rel in new_hashes]
+
+    index = {
+        "data_dir": np.array(os.path.abspath(data_dir)),
+        "paths": np.array(paths, dtype=str),
+        "sizes": np.array([files[rel][0] for rel in paths], dtype=np.int64),
+        "mtimes": np.array([files[rel][1] for rel in paths], dtype=np.float64),
+        "hashes": np.array([previous["hashes"][known[rel]] if rel in known else new_hashes[rel]
+                            for rel in paths], dtype=np.uint64)
+    }
+
+    # Embeddings of unchanged images are carried over, even by a hash-only run
+    embedded = {}
+    if "embeddings" in previous:
+        embedding_keys = previous.get("embedding_keys", previous["paths"])
+        embedded = {str(rel): i for i, rel in enumerate(embedding_keys) if str(rel) in known}
+    keys = [rel for rel in paths if rel in embedded]
+
+    fresh = None
+    if with_embeddings:
+        added = [rel for rel in paths if rel not in embedded]
+        fresh = embed_images([os.path.join(data_dir, rel) for rel in added]) if added else None
+        fresh_row = {rel: i for i, rel in enumerate(added)}
+        keys = paths
+
+    if keys:
+        dim = fresh.shape[1] if fresh is not None else previous["embeddings"].shape[1]
+        embeddings = np.empty((len(keys), dim), dtype=np.float16)
+        for i, rel in enumerate(keys):
+            embeddings[i] = previous["embeddings"][embedded[rel]] if rel in embedded else fresh[fresh_row[rel]]
+        index["embeddings"] = embeddings
+        index["embedding_keys"] = np.array(keys, dtype=str)
+
+    Path(index_path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = index_path + ".tmp.npz"
+    np.savez(tmp_path, **index)
+    os.replace(tmp_path, index_path)
+    print(f"   {len(todo)} images indexed in {time.perf_counter() - start:.1f}s")
+    return index
+
+# ===============================
+# SEARCH
+# ===============================
+def hash_pairs(hashes: np.ndarray, max_distance: int) -> list:
+    """(i, j) pairs, i < j, whose hashes differ by at most max_distance bits"""
+    pairs = []
+    for start in range(0, len(hashes), BLOCK):
+        dist = hamming_distances(hashes[start:start + BLOCK], hashes)
+        i, j = np.nonzero(dist <= max_distance)
+        i += start
+        keep = i < j
+        pairs.extend(zip(i[keep].tolist(), j[keep].tolist()))
+    return pairs
+
+def embedding_pairs(embeddings: np.ndarray, min_similarity: float) -> list:
+    """(i, j) pairs, i < j, whose embeddings have a cosine similarity of at least min_similarity"""
+    pairs = []
+    all_rows = embeddings.astype(np.float32)
+    for start in range(0, len(all_rows), BLOCK):
+        sim = all_rows[start:start + BLOCK] @ all_rows.T
+        i, j = np.nonzero(sim >= min_similarity)
+        i += start
+        keep = i < j
+        pairs.extend(zip(i[keep].tolist(), j[keep].tolist()))
+    return pairs
+
+def clusters(n: int, pairs: list) -> list:
+    """Connected components (size > 1) of the duplicate graph, via union-find"""
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in pairs:
+        parent[find(i)] = find(j)
+
+    groups = {}
+    for i in range(n):
+        groups.setdefault(find(i), []).append(i)
+    return sorted((g for g in groups.values() if len(g) > 1), key=len, reverse=True)
+
+def split_of(rel: str) -> str:
+    """Top-level folder of a relative path (train / val / test under dataset/splits)"""
+    return Path(rel).parts[0]
+
+# ===============================
+# MAIN
+# ===============================
+def duplicate_index(data_dir: str = DATA_DIR, index_path: str = INDEX_PATH, report_path: str = REPORT_PATH,
+                    with_embeddings: bool = False, max_distance: int = DUPLICATE_DISTANCE,
+                    min_similarity: float = MIN_SIMILARITY, num_workers: int = NUM_WORKERS):
+    """Update the index, then report duplicate clusters and cross-split leaks"""
+    if not os.path.isdir(data_dir):
+        print(f"❌ {data_dir} not found")
+        return
+    if with_embeddings and not load_app().model_loaded:
+        print("❌ The EfficientNet-B3 checkpoint could not be loaded: no embeddings without it")
+        return
+
+    print(f"🔍 Near-duplicate index: {data_dir} → {index_path}")
+    print(f"Hash distance ≤ {max_distance} bits"
+          + (f" | Embedding similarity ≥ {min_similarity}" if with_embeddings else "") + "\n")
+
+    index = update_index(data_dir, index_path, with_embeddings, num_workers)
+    paths = [str(p) for p in index["paths"]]
+
+    pairs = hash_pairs(index["hashes"], max_distance)
+    if with_embeddings and "embeddings" in index:
+        pairs += embedding_pairs(index["embeddings"], min_similarity)
+
+    groups = clusters(len(paths), pairs)
+    leaks = []
+    for group in groups:
+        splits = sorted({split_of(paths[i]) for i in group})
+        if len(splits) > 1:
+            leaks.append({"splits": splits, "images": [paths[i] for i in group]})
+
+    report = {
+        "data_dir": data_dir,
+        "images": len(paths),
+        "method": "dhash+embedding" if with_embeddings else "dhash",
+        "max_distance": max_distance,
+        "min_similarity": min_similarity if with_embeddings else None,
+        "duplicate_clusters": len(groups),
+        "redundant_images": sum(len(g) - 1 for g in groups),
+        "cross_split_leaks": len(leaks),
+        "leaks": leaks,
+        "clusters": [[paths[i] for i in group] for group in groups]
+    }
+    Path(report_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{'='*60}")
+    print(f"✅ {len(paths)} images indexed")
+    print(f"   - Duplicate clusters: {report['duplicate_clusters']} ({report['redundant_images']} redundant images)")
+    print(f"   - Cross-split leaks: {report['cross_split_leaks']}")
+    for leak in leaks[:10]:
+        print(f"      ⚠️  {' / '.join(leak['splits'])}: {', '.join(leak['images'][:4])}")
+    print(f"\n📄 Report: {report_path}")
+    print(f"{'='*60}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--index', default=INDEX_PATH)
+    parser.add_argument('--report', default=REPORT_PATH)
+    parser.add_argument('--embeddings', action='store_true', help="also index EfficientNet-B3 embeddings")
+    parser.add_argument('--max-distance', type=int, default=DUPLICATE_DISTANCE)
+    parser.add_argument('--min-similarity', type=float, default=MIN_SIMILARITY)
+    parser.add_argument('--workers', type=int, default=NUM_WORKERS)
+    args = parser.parse_args()
+
+    duplicate_index(args.data_dir, args.index, args.report, args.embeddings, args.max_distance,
+                    args.min_similarity, args.workers)
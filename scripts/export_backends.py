@@ -0,0 +1,181 @@
+"""
+Export the EfficientNet-B3 checkpoint to the CPU inference backends used by app.py
+(INFERENCE_BACKEND=torchscript|int8_dynamic|int8_static) and compare them to eager fp32:
+top-1 agreement on a held-out folder, latency and memory.
+
+Usage: python scripts/export_backends.py [--backends torchscript int8_dynamic int8_static]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+# Always export from the eager fp32 model
+os.environ['INFERENCE_BACKEND'] = 'eager'
+os.environ.setdefault('BATCHING_ENABLED', '0')
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import torch
+
+import app
+from batching import percentiles
+from inference_backends import BACKEND_NOTES, BACKENDS, export_backend, load_backend, save_backend
+from dataset_utils import list_images
+from bench_utils import process_rss_mb
+
+# ===============================
+# CONFIG
+# ===============================
+HELDOUT_DIR = "dataset/splits/test"
+CALIBRATION_DIR = "dataset/splits/val"
+CALIBRATION_IMAGES = 64
+LATENCY_RUNS = 50
+REPORT_PATH = "models/backend_report.json"
+
+# ===============================
+# HELPERS
+# ===============================
+def load_batches(samples: list, batch_size: int = 16):
+    """Preprocessed CPU batches in the same order as `samples`"""
+    for i in range(0, len(samples), batch_size):
+        chunk = samples[i:i + batch_size]
+        yield torch.cat([app.preprocess_image(path).cpu() for path, _ in chunk])
+
+def predict_all(model, batches: list) -> list:
+    """Top-1 index for every image"""
+    predictions = []
+    with torch.no_grad():
+        for batch in batches:
+            predictions.extend(model(batch).argmax(dim=1).tolist())
+    return predictions
+
+def measure_latency(model, batches: list, runs: int) -> dict:
+    """Single-image latency percentiles in ms"""
+    images = [img.unsqueeze(0) for batch in batches for img in batch]
+    times = []
+    with torch.no_grad():
+        model(images[0])
+        for i in range(runs):
+            start = time.perf_counter()
+            model(images[i % len(images)])
+            times.append(time.perf_counter() - start)
+    times.sort()
+    return {'mean_ms': sum(times) / len(times) * 1000, **percentiles(times)}
+
+# ===============================
+# MAIN
+# ===============================
+def export_backends(backends: list, heldout_dir: str, calibration_dir: str,
+                    max_images: int, runs: int, report_path: str):
+    """Export each backend, then compare it with eager fp32"""
+    if not app.model_loaded:
+        print("❌ Eager model could not be loaded, nothing to export")
+        return
+
+    eager = app.model.cpu().eval()
+    heldout = list_images(heldout_dir, app.CLASS_NAMES, max_images)
+    if not heldout:
+        print(f"❌ No images found in {heldout_dir}")
+        return
+    heldout_batches = list(load_batches(heldout))
+    example = heldout_batches[0][:1]
+
+    print(f"📦 Exporting backends: {', '.join(backends)}")
+    print(f"Held-out images: {len(heldout)} from {heldout_dir}\n")
+
+    eager_predictions = predict_all(eager, heldout_batches)
+    labels = [label for _, label in heldout]
+
+    def accuracy(predictions):
+        known = [(p, l) for p, l in zip(predictions, labels) if l is not None]
+        return 100 * sum(p == l for p, l in known) / len(known) if known else None
+
+    report = {
+        'heldout_dir': heldout_dir,
+        'num_images': len(heldout),
+        'threads': torch.get_num_threads(),
+        'backends': {
+            'eager': {
+                'artifact': str(app.MODEL_PATH),
+                'size_mb': app.MODEL_PATH.stat().st_size / 1024 ** 2 if app.MODEL_PATH.exists() else None,
+                'accuracy': accuracy(eager_predictions),
+                'top1_agreement': 100.0,
+                'latency': measure_latency(eager, heldout_batches, runs)
+            }
+        }
+    }
+
+    for name in backends:
+        if name == 'eager':
+            continue
+        print(f"⚙️  {name}")
+        try:
+            calibration = None
+            if name == 'int8_static':
+                calibration = list(load_batches(list_images(calibration_dir, app.CLASS_NAMES, CALIBRATION_IMAGES)))
+                if not calibration:
+                    raise ValueError(f"No calibration images in {calibration_dir}")
+
+            path = save_backend(export_backend(eager, name, example, calibration), name)
+
+            rss_before = process_rss_mb()
+            module = load_backend(name)
+            predictions = predict_all(module, heldout_batches)
+            rss_delta = process_rss_mb() - rss_before
+
+            agreement = 100 * sum(p == e for p, e in zip(predictions, eager_predictions)) / len(predictions)
+            report['backends'][name] = {
+                'artifact': str(path),
+                'size_mb': path.stat().st_size / 1024 ** 2,
+                'rss_delta_mb': rss_delta,
+                'accuracy': accuracy(predictions),
+                'top1_agreement': agreement,
+                'latency': measure_latency(module, heldout_batches, runs)
+            }
+            if name in BACKEND_NOTES:
+                report['backends'][name]['note'] = BACKEND_NOTES[name]
+            print(f"   ✅ Saved: {path} (agreement {agreement:.2f}%)")
+        except Exception as e:
+            print(f"   ⚠️  Failed: {e}")
+            report['backends'][name] = {'error': str(e)}
+
+    # Summary
+    eager_latency = report['backends']['eager']['latency']['mean_ms']
+    print(f"\n{'='*72}")
+    print(f"{'Backend':15s} {'Agree %':>8s} {'Acc %':>7s} {'Mean ms':>8s} {'p95 ms':>8s} {'Speedup':>8s} {'Size MB':>8s}")
+    for name, result in report['backends'].items():
+        if 'error' in result:
+            print(f"{name:15s} failed: {result['error']}")
+            continue
+        latency = result['latency']
+        acc = f"{result['accuracy']:.2f}" if result['accuracy'] is not None else '-'
+        print(f"{name:15s} {result['top1_agreement']:8.2f} {acc:>7s} {latency['mean_ms']:8.1f} "
+              f"{latency['p95']:8.1f} {eager_latency / latency['mean_ms']:7.2f}x {result['size_mb']:8.1f}")
+    for name, note in BACKEND_NOTES.items():
+        if name in report['backends'] and 'error' not in report['backends'][name]:
+            print(f"ℹ️  {name}: {note}")
+    print(f"{'='*72}")
+
+    Path(report_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"📄 Report: {report_path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=[b for b in BACKENDS if b != 'eager'], choices=BACKENDS)
+    parser.add_argument('--heldout-dir', default=HELDOUT_DIR)
+    parser.add_argument('--calibration-dir', default=CALIBRATION_DIR)
+    parser.add_argument('--max-images', type=int, default=None)
+    parser.add_argument('--runs', type=int, default=LATENCY_RUNS)
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--report', default=REPORT_PATH)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    export_backends(args.backends, args.heldout_dir, args.calibration_dir,
+                    args.max_images, args.runs, args.report)
@@ -0,0 +1,269 @@
+"""
+Backbone feature cache: runs the frozen EfficientNet-B3 backbone once over
+dataset/splits and stores the pooled penultimate features (the input of the
+final linear layer) of every image, so the classifier head can be retrained
+and evaluated in seconds (scripts/train_head.py) without decoding a single JPEG.
+
+Layout of dataset/features/:
+    features.f16    float16 (rows, dim), append-only, read by memory-map
+    index.npz       key of every row ("<sha256 of the file>:<view>"), dim and
+                    the checkpoint the features come from (written last)
+    manifest.json   classes and (path, label, sha256) of every sample per split
+
+Rows are keyed by content, so renamed, moved or duplicated images reuse their
+features and later runs only extract new images. Train images can also be
+cached under fixed augmentations (--augment flip rotate_15 ...), one row per view.
+A different checkpoint invalidates the whole cache.
+
+Usage: python scripts/feature_cache.py [--splits train val test] [--augment flip rotate_15] [--batch-size 32]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from augmentation import AUG_TYPES, augment_image
+from dataset_utils import list_images
+from prediction_cache import content_key
+
+# ===============================
+# CONFIG
+# ===============================
+SPLITS_DIR = "dataset/splits"
+FEATURES_DIR = "dataset/features"
+SPLITS = ["train", "val", "test"]
+ORIGINAL = "original"    # view of an unmodified image
+AUGMENTED_SPLITS = ["train"]
+BATCH_SIZE = 32
+CHECKPOINT_EVERY = 10    # batches between two saves of the index
+MANIFEST_FILE = "manifest.json"
+
+# ===============================
+# CACHE
+# ===============================
+class FeatureCache:
+    """
+    Content-addressed float16 feature rows. New rows are appended to
+    features.f16 and only become visible once index.npz is saved, so an
+    interrupted run loses at most the rows written since the last save.
+    """
+
+    def __init__(self, root: str = FEATURES_DIR):
+        self.root = root
+        self.data_path = os.path.join(root, "features.f16")
+        self.index_path = os.path.join(root, "index.npz")
+        self.keys, self.dim, self.backbone = [], None, None
+        if os.path.exists(self.index_path):
+            with np.load(self.index_path, allow_pickle=False) as index:
+                self.keys = [str(k) for k in index["keys"]]
+                self.dim = int(index["dim"])
+                self.backbone = str(index["backbone"])
+        self.rows = {key: i for i, key in enumerate(self.keys)}
+        self._features = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.rows
+
+    @property
+    def features(self) -> np.ndarray:
+        """(rows, dim) float16 read-only memory-map"""
+        if self._features is None or len(self._features) != len(self.keys):
+            if not self.keys:
+                return np.empty((0, self.dim or 0), dtype=np.float16)
+            self._features = np.memmap(self.data_path, dtype=np.float16, mode='r',
+                                       shape=(len(self.keys), self.dim))
+        return self._features
+
+    def reset(self, backbone: str):
+        """Drop every row: the features of another checkpoint are useless"""
+        Path(self.root).mkdir(parents=True, exist_ok=True)
+        self.keys, self.rows, self.dim, self.backbone = [], {}, None, backbone
+        self._features = None
+        open(self.data_path, 'wb').close()
+        self.save()
+
+    def append(self, keys: list, features: np.ndarray):
+        if self.dim is None:
+            self.dim = features.shape[1]
+        with open(self.data_path, 'r+b' if os.path.exists(self.data_path) else 'wb') as f:
+            f.truncate(len(self.keys) * self.dim * 2)  # rows of an interrupted run not in the index
+            f.seek(0, os.SEEK_END)
+            f.write(np.ascontiguousarray(features, dtype=np.float16).tobytes())
+        for key in keys:
+            self.rows[key] = len(self.keys)
+            self.keys.append(key)
+
+    def save(self):
+        Path(self.root).mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path + ".tmp.npz"
+        np.savez(tmp_path, keys=np.array(self.keys, dtype=str), dim=np.array(self.dim or 0),
+                 backbone=np.array(self.backbone or ''))
+        os.replace(tmp_path, self.index_path)
+
+    def lookup(self, keys: list) -> np.ndarray:
+        """(len(keys), dim) float32 features, in the order of `keys`"""
+        rows = np.array([self.rows[key] for key in keys], dtype=np.int64)
+        return self.features[rows].astype(np.float32)
+
+def load_manifest(root: str = FEATURES_DIR) -> dict:
+    with open(os.path.join(root, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def load_split(split: str, root: str = FEATURES_DIR, views: list = None) -> tuple:
+    """
+    (features float32 (N, dim), labels int64 (N,)) of a cached split: the
+    original view of every sample, plus each of `views` (default: every
+    augmentation cached for the split)
+    """
+    manifest = load_manifest(root)
+    cache = FeatureCache(root)
+    samples = manifest["splits"][split]
+    cached_views = manifest["views"].get(split, [])
+    views = [ORIGINAL] + [v for v in (cached_views if views is None else views) if v in cached_views]
+
+    keys = [f"{sha}:{view}" for view in views for _, _, sha in samples]
+    labels = np.array([label for _ in views for _, label, _ in samples], dtype=np.int64)
+    return cache.lookup(keys), labels
+
+# ===============================
+# EXTRACTION
+# ===============================
+def extract(cache: FeatureCache, items: list, batch_size: int) -> set:
+    """
+    Run the backbone over (key, path, view) items and append their features to
+    the cache; returns the paths that could not be decoded
+    """
+    import torch
+    import app
+
+    model = app.model
+    batches = 0
+    unreadable = set()
+    start = time.perf_counter()
+    with torch.no_grad():
+        for first in range(0, len(items), batch_size):
+            keys, images, decoded = [], [], {}
+            for key, path, view in items[first:first + batch_size]:
+                if path not in decoded:
+                    try:
+                        decoded[path] = app.preprocessor.load(path)
+                    except Exception:
+                        decoded[path] = None
+                        unreadable.add(path)
+                        print(f"      ⚠️  Unreadable image skipped: {path}")
+                if decoded[path] is not None:
+                    keys.append(key)
+                    images.append(decoded[path] if view == ORIGINAL else augment_image(decoded[path], view))
+            if not images:
+                continue
+
+            batch = app.preprocessor.batch(images).to(app.device)
+            pooled = model._avg_pooling(model.extract_features(batch)).flatten(1)
+            cache.append(keys, pooled.cpu().numpy())
+
+            batches += 1
+            if batches % CHECKPOINT_EVERY == 0:
+                cache.save()
+            done = min(first + batch_size, len(items))
+            print(f"   ... {done}/{len(items)} rows, {done / (time.perf_counter() - start):.1f} img/s")
+    cache.save()
+    return unreadable
+
+def feature_cache(splits: list = SPLITS, root: str = FEATURES_DIR, augment: list = (),
+                  batch_size: int = BATCH_SIZE):
+    """Bring the cache up to date with SPLITS_DIR and write the manifest"""
+    if not os.path.isdir(SPLITS_DIR):
+        print(f"❌ {SPLITS_DIR} not found")
+        return
+
+    os.environ['INFERENCE_BACKEND'] = 'eager'
+    os.environ.setdefault('BATCHING_ENABLED', '0')
+    os.environ.setdefault('PREDICTION_CACHE', 'off')
+    import app
+
+    if not app.model_loaded:
+        print("❌ The EfficientNet-B3 checkpoint could not be loaded")
+        return
+    backbone = app.model_registry.peek(app.DEFAULT_MODEL).version
+
+    cache = FeatureCache(root)
+    if cache.backbone != backbone:
+        if len(cache):
+            print(f"♻️  Checkpoint changed ({cache.backbone[:12]} → {backbone[:12]}): cache rebuilt")
+        cache.reset(backbone)
+
+    print(f"🧊 Backbone features: {SPLITS_DIR} → {root} (checkpoint {backbone[:12]})")
+    print(f"Augmented views of {', '.join(AUGMENTED_SPLITS)}: {', '.join(augment) or 'none'}\n")
+
+    # Every split shares the class order of the first one found, new classes included
+    classes = None
+    manifest = {"backbone": backbone, "model_classes": app.CLASS_NAMES, "splits": {}, "views": {}}
+    items, queued = [], set()
+    for split in splits:
+        split_dir = os.path.join(SPLITS_DIR, split)
+        if not os.path.isdir(split_dir):
+            print(f"   ⚠️  {split_dir} not found, skipping")
+            continue
+        if classes is None:
+            classes = sorted(d for d in os.listdir(split_dir) if os.path.isdir(os.path.join(split_dir, d)))
+            first_split = split
+        views = [ORIGINAL] + (list(augment) if split in AUGMENTED_SPLITS else [])
+
+        samples = []
+        for path, label in list_images(split_dir, classes):
+            if label is None:
+                print(f"      ⚠️  {path}: class missing from the {first_split} split, skipped")
+                continue
+            with open(path, 'rb') as f:
+                sha = content_key(f.read())
+            for view in views:
+                key = f"{sha}:{view}"
+                if key not in cache and key not in queued:
+                    items.append((key, path, view))
+                    queued.add(key)
+            samples.append((path, label, sha))
+
+        manifest["splits"][split] = samples
+        manifest["views"][split] = views[1:]
+        print(f"   {split}: {len(samples)} images × {len(views)} views")
+
+    manifest["classes"] = classes
+    print(f"   Cached rows: {len(cache)} | To extract: {len(items)}\n")
+
+    start = time.perf_counter()
+    unreadable = extract(cache, items, batch_size) if items else set()
+    for split, samples in manifest["splits"].items():
+        manifest["splits"][split] = [(os.path.relpath(path, os.path.join(SPLITS_DIR, split)), label, sha)
+                                     for path, label, sha in samples if path not in unreadable]
+    with open(os.path.join(root, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+    size_mb = os.path.getsize(cache.data_path) / 1024 ** 2
+    print(f"\n{'='*60}")
+    print(f"✅ {len(items)} rows extracted in {time.perf_counter() - start:.1f}s")
+    print(f"   - Cache: {len(cache)} rows × {cache.dim} float16 ({size_mb:.1f} MB)")
+    print(f"   - Unreadable images: {len(unreadable)}")
+    print(f"\n📄 Features: {root}")
+    print(f"{'='*60}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--splits', nargs='+', default=SPLITS)
+    parser.add_argument('--output', default=FEATURES_DIR)
+    parser.add_argument('--augment', nargs='*', default=[], choices=AUG_TYPES,
+                        help="fixed augmentations also cached for the train split")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    feature_cache(args.splits, args.output, args.augment, args.batch_size)
@@ -0,0 +1,166 @@
+"""
+HTTP load test of the Flask service: replays the sample images at a given
+concurrency against /predict and reports latency percentiles, requests/sec
+and peak memory.
+
+Without --url the app is started in-process on a local port (its own peak RSS
+is then included); with --url an already running server is targeted.
+
+Usage: python scripts/load_test.py [--concurrency 8] [--requests 200] [--url http://localhost:5000]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from bench_utils import compare_to_baseline, environment, peak_rss_mb, summarize_latencies, write_results
+
+# ===============================
+# CONFIG
+# ===============================
+SAMPLES_DIR = "src/public/samples"
+OUTPUT_PATH = "benchmarks/load_test.json"
+ALLOWED_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif')
+CONCURRENCY = 8
+TOTAL_REQUESTS = 200
+TIMEOUT = 60
+
+# ===============================
+# HELPERS
+# ===============================
+def load_samples(samples_dir: str) -> list:
+    """(filename, bytes) of the sample images the API accepts"""
+    samples = []
+    for f in sorted(os.listdir(samples_dir)):
+        if f.lower().endswith(ALLOWED_EXTENSIONS):
+            with open(os.path.join(samples_dir, f), 'rb') as fh:
+                samples.append((f, fh.read()))
+        else:
+            print(f"   ⚠️  Skipping {f} (extension not accepted by /predict)")
+    return samples
+
+def multipart_body(filename: str, data: bytes) -> tuple:
+    """Encode one 'image' file field as multipart/form-data"""
+    boundary = uuid.uuid4().hex
+    body = (f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="image"; filename="{filename}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n").encode() + data + \
+           f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+def start_local_server() -> tuple:
+    """Serve app.py in a background thread on a free local port"""
+    os.environ.setdefault('PREDICTION_CACHE', 'off')
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    import logging
+    from werkzeug.serving import make_server
+    import app
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    server = make_server('127.0.0.1', 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+# ===============================
+# MAIN
+# ===============================
+def load_test(url: str, samples_dir: str, concurrency: int, total: int, endpoint: str,
+              bust_cache: bool, output: str, baseline: str = None, tolerance: float = 0.10) -> bool:
+    """Send `total` requests with `concurrency` workers and summarize them"""
+    samples = load_samples(samples_dir)
+    if not samples:
+        print(f"❌ No usable sample images in {samples_dir}")
+        return False
+
+    server = None
+    if url is None:
+        server, url = start_local_server()
+    target = url.rstrip('/') + endpoint
+
+    print(f"🚀 Load test: {total} requests, concurrency {concurrency} → {target}\n")
+
+    def send(i):
+        filename, data = samples[i % len(samples)]
+        if bust_cache:
+            # Trailing bytes after the image end are ignored by decoders but change the cache key
+            data = data + uuid.uuid4().bytes
+        body, content_type = multipart_body(filename, data)
+        req = urllib.request.Request(target, data=body, headers={'Content-Type': content_type})
+
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=TIMEOUT) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except (urllib.error.URLError, OSError):
+            status = 'error'
+        return status, time.perf_counter() - start
+
+    # Warm-up request outside the measurement
+    send(0)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(send, range(total)))
+    elapsed = time.perf_counter() - start
+
+    statuses = Counter(str(status) for status, _ in results)
+    latencies = [t for status, t in results if status == 200]
+    summary = summarize_latencies(latencies)
+    summary['requests_per_sec'] = len(latencies) / elapsed if elapsed else 0.0
+
+    case = f"{endpoint}/concurrency={concurrency}"
+    print(f"   {case:30s} p50 {summary['p50_ms']:8.1f}  p95 {summary['p95_ms']:8.1f}  "
+          f"p99 {summary['p99_ms']:8.1f} ms  {summary['requests_per_sec']:6.1f} req/s")
+    print(f"   Status codes: {dict(statuses)}")
+
+    results = {
+        'benchmark': 'load_test',
+        'environment': environment(),
+        'config': {'url': url if server is None else 'in-process', 'endpoint': endpoint,
+                   'concurrency': concurrency, 'requests': total, 'bust_cache': bust_cache},
+        'status_codes': dict(statuses),
+        'elapsed_seconds': elapsed,
+        # In-process runs include the server; remote runs only measure this client
+        'peak_rss_mb': peak_rss_mb(),
+        'cases': {case: summary}
+    }
+    print(f"\n💾 Peak RSS ({'server + client' if server else 'client'}): {results['peak_rss_mb']:.0f} MB")
+    write_results(output, results)
+
+    if server is not None:
+        server.shutdown()
+
+    ok = statuses.get('200', 0) == total
+    if baseline:
+        ok &= compare_to_baseline(results['cases'], baseline, tolerance)
+    return ok
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default=None, help="running server (default: start app.py in-process)")
+    parser.add_argument('--endpoint', default='/predict')
+    parser.add_argument('--samples-dir', default=SAMPLES_DIR)
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY)
+    parser.add_argument('--requests', type=int, default=TOTAL_REQUESTS)
+    parser.add_argument('--keep-cache', action='store_true',
+                        help="send identical bytes so repeat images may hit the prediction cache")
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    parser.add_argument('--baseline', default=None, help="previous result file to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="allowed p95 regression (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    ok = load_test(args.url, args.samples_dir, args.concurrency, args.requests, args.endpoint,
+                   not args.keep_cache, args.output, args.baseline, args.tolerance)
+    sys.exit(0 if ok else 1)
@@ -3,7 +3,15 @@ from PIL import Image, ImageEnhance, ImageOps
 import numpy as np
 from pathlib import Path
 from typing import Tuple, Optional
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
 import json
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from image_quality import find_near_duplicates, quality_check_batch, quality_issues
 
 # ===============================
 # CONFIG
@@ -14,6 +22,11 @@ TARGET_SIZE = 384  # Taille plus élevée pour préserver la qualité
 MIN_SIZE_THRESHOLD = 300  # Ne pas upscaler si l'image est plus petite
 CROP_MODE = "center"  # Center crop - pas de padding artificiel
 APPLY_CLAHE = False  # Désactiver CLAHE pour préserver les couleurs naturelles
+JPEG_QUALITY = 98
+NUM_WORKERS = os.cpu_count() or 1
+MANIFEST_PATH = os.path.join(PROCESSED_DIR, "manifest.json")  # source hash, config hash, output per image
+CHECKPOINT_EVERY = 50  # images between manifest saves
+CHUNK_SIZE = 16  # images per worker task, quality-scored in one vectorized pass
 
 # ===============================
 # PREPROCESSING FUNCTIONS
@@ -73,75 +86,211 @@ def enhance_quality(img: Image.Image) -> Image.Image:
     
     return img
 
-def quality_check(img: Image.Image) -> dict:
+# ===============================
+# MANIFEST
+# ===============================
+def get_config() -> dict:
+    """Preprocessing settings; any change invalidates the processed images"""
+    return {
+        "target_size": TARGET_SIZE,
+        "min_size_threshold": MIN_SIZE_THRESHOLD,
+        "crop_mode": CROP_MODE,
+        "apply_clahe": APPLY_CLAHE,
+        "preprocessing_steps": [
+            "center_crop_square",
+            "resize_lanczos",
+            "subtle_enhancement",
+            "quality_check",
+            "blur_check",
+            "near_duplicate_hash"
+        ],
+        "quality_settings": {
+            "resampling": "LANCZOS",
+            "jpeg_quality": JPEG_QUALITY,
+            "no_padding": True
+        }
+    }
+
+def config_hash(config: dict) -> str:
+    """Stable hash of the preprocessing config"""
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+def file_hash(path: str) -> str:
+    """SHA-256 of a source image"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_json(path: str, default: dict) -> dict:
+    """Read a JSON file, `default` if missing or unreadable"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+def save_json(path: str, data: dict):
+    """Write JSON atomically so an interrupted run never leaves a truncated file"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+def is_up_to_date(entry: Optional[dict], img_path: str, cfg_hash: str) -> bool:
+    """Cheap check (size + mtime) that a source image was already processed with this config"""
+    if not entry or entry.get("status") != "processed" or entry.get("config_hash") != cfg_hash:
+        return False
+    if not os.path.exists(entry.get("output_path", "")):
+        return False
+    stat = os.stat(img_path)
+    return entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns
+
+# ===============================
+# WORKER
+# ===============================
+def prepare_image(task: dict) -> tuple:
     """
-    Perform quality checks on image using PIL.
+    Crop and enhance one source image: (manifest entry, enhanced image).
+    Images whose content hash did not change are only re-stamped, not re-encoded
+    (no image returned).
     """
-    img_array = np.array(img.convert('L'))  # Convert to grayscale
-    
-    # Check brightness
-    brightness = float(np.mean(img_array))
-    
-    # Check contrast
-    contrast = float(np.std(img_array))
-    
-    # Get image size
-    width, height = img.size
-    resolution = width * height
-    
-    return {
-        "brightness": brightness,
-        "contrast": contrast,
-        "resolution": resolution,
-        "dimensions": (width, height),
-        "is_too_dark": brightness < 50,
-        "is_too_bright": brightness > 200,
-        "is_low_contrast": contrast < 30
+    img_path = task["img_path"]
+    stat = os.stat(img_path)
+    entry = {
+        "class": task["cls"],
+        "filename": task["img_name"],
+        "output_path": task["output_path"],
+        "config_hash": task["config_hash"],
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns
     }
 
+    try:
+        entry["source_hash"] = file_hash(img_path)
+
+        previous = task.get("previous") or {}
+        if (previous.get("status") == "processed"
+                and previous.get("source_hash") == entry["source_hash"]
+                and previous.get("config_hash") == task["config_hash"]
+                and os.path.exists(task["output_path"])):
+            entry.update({k: previous.get(k) for k in ("quality", "metadata")})
+            entry["status"] = "processed"
+            entry["unchanged"] = True
+            return entry, None
+
+        # Read image with PIL (better quality than cv2)
+        img = Image.open(img_path).convert('RGB')
+
+        # Step 1: Center crop to square (no padding)
+        cropped, metadata = center_crop_resize(img, TARGET_SIZE)
+
+        # Step 2: Subtle quality enhancement (no aggressive processing)
+        enhanced = enhance_quality(cropped)
+
+        entry["metadata"] = metadata
+        return entry, enhanced
+
+    except Exception as e:
+        entry.update({"status": "failed", "error": str(e)})
+        return entry, None
+
+def process_chunk(tasks: list) -> list:
+    """
+    Process a chunk of source images (runs in a worker process): the quality of
+    every re-encoded image is scored in one batched pass, then each is saved.
+    """
+    prepared = [prepare_image(task) for task in tasks]
+
+    # Step 3: Quality check (near-duplicates are found per class in the log)
+    enhanced = [(entry, img) for entry, img in prepared if img is not None]
+    qualities = quality_check_batch([img for _, img in enhanced], detect_duplicates=False)
+
+    for (entry, img), quality in zip(enhanced, qualities):
+        try:
+            # Save processed image with maximum quality
+            img.save(entry["output_path"], 'JPEG', quality=JPEG_QUALITY, optimize=True, subsampling=0)
+            entry.update({"status": "processed", "quality": quality})
+        except Exception as e:
+            entry.pop("metadata", None)
+            entry.update({"status": "failed", "error": str(e)})
+
+    return [entry for entry, _ in prepared]
+
 # ===============================
 # MAIN PREPROCESSING PIPELINE
 # ===============================
-def preprocess_phone_dataset():
+def build_processing_log(config: dict, classes: list, manifest: dict) -> dict:
+    """Per-class statistics and quality issues, from the merged manifest"""
+    processing_log = {"config": config, "classes": {}}
+
+    for cls in classes:
+        entries = [e for e in manifest["images"].values() if e["class"] == cls]
+        class_stats = {
+            "total_images": len(entries),
+            "processed": sum(e["status"] == "processed" for e in entries),
+            "failed": sum(e["status"] == "failed" for e in entries),
+            "quality_issues": [],
+            "near_duplicates": []
+        }
+
+        entries = sorted(entries, key=lambda e: e["filename"])
+        for e in entries:
+            quality = e.get("quality") or {}
+            if quality_issues(quality):
+                class_stats["quality_issues"].append({
+                    "filename": e["filename"],
+                    "issues": quality_issues(quality),
+                    "quality": quality,
+                    "metadata": e.get("metadata")
+                })
+
+        hashed = [e for e in entries if (e.get("quality") or {}).get("dhash")]
+        duplicate_of = find_near_duplicates([int(e["quality"]["dhash"], 16) for e in hashed])
+        for e, original in zip(hashed, duplicate_of):
+            if original is not None:
+                class_stats["near_duplicates"].append({
+                    "filename": e["filename"],
+                    "duplicate_of": hashed[original]["filename"]
+                })
+
+        processing_log["classes"][cls] = class_stats
+
+    return processing_log
+
+def preprocess_phone_dataset(num_workers: int = NUM_WORKERS):
     """
     Preprocess raw phone images with scientific rigor.
+    Runs on a process pool and only (re)processes new or changed images;
+    progress is checkpointed in the manifest so an interrupted run resumes.
     """
     Path(PROCESSED_DIR).mkdir(parents=True, exist_ok=True)
     
     # Get class names from RAW_DIR (folders)
-    classes = [d for d in os.listdir(RAW_DIR) if os.path.isdir(os.path.join(RAW_DIR, d))]
+    classes = sorted(d for d in os.listdir(RAW_DIR) if os.path.isdir(os.path.join(RAW_DIR, d)))
+    
+    config = get_config()
+    cfg_hash = config_hash(config)
     
     print(f"🔬 High-Quality Preprocessing Pipeline")
     print(f"Target size: {TARGET_SIZE}×{TARGET_SIZE} (square crop)")
     print(f"Min threshold: {MIN_SIZE_THRESHOLD}px (no upscaling)")
     print(f"Crop mode: {CROP_MODE} (no padding artifacts)")
     print(f"CLAHE: {'Enabled' if APPLY_CLAHE else 'Disabled (preserving natural colors)'}")
+    print(f"Workers: {num_workers} | Config hash: {cfg_hash}")
     print(f"Classes: {classes}\n")
     
-    processing_log = {
-        "config": {
-            "target_size": TARGET_SIZE,
-            "min_size_threshold": MIN_SIZE_THRESHOLD,
-            "crop_mode": CROP_MODE,
-            "apply_clahe": APPLY_CLAHE,
-            "preprocessing_steps": [
-                "center_crop_square",
-                "resize_lanczos",
-                "subtle_enhancement",
-                "quality_check"
-            ],
-            "quality_settings": {
-                "resampling": "LANCZOS",
-                "jpeg_quality": 98,
-                "no_padding": True
-            }
-        },
-        "classes": {}
-    }
+    # Updated in place from the previous entries: a checkpoint written before a crash
+    # keeps every entry not reprocessed yet, so the next run really resumes
+    manifest = load_json(MANIFEST_PATH, {"images": {}})
+    previous_images = dict(manifest["images"])
+    manifest["config_hash"] = cfg_hash
     
+    # Collect work: skip images already processed with the same source and config
+    tasks = []
+    present = set()
     for cls in classes:
-        print(f"📁 Processing class: {cls}")
-        
         class_input = os.path.join(RAW_DIR, cls)
         class_output = os.path.join(PROCESSED_DIR, cls)
         Path(class_output).mkdir(parents=True, exist_ok=True)
@@ -149,61 +298,77 @@ def preprocess_phone_dataset():
         images = [f for f in os.listdir(class_input)
                  if f.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp'))]
         
-        class_stats = {
-            "total_images": len(images),
-            "processed": 0,
-            "failed": 0,
-            "quality_issues": []
-        }
-        
         for img_name in images:
             img_path = os.path.join(class_input, img_name)
+            key = f"{cls}/{img_name}"
+            previous = previous_images.get(key)
+            present.add(key)
+            
+            if is_up_to_date(previous, img_path, cfg_hash):
+                continue
             
+            base_name = os.path.splitext(img_name)[0]
+            tasks.append({
+                "key": key,
+                "cls": cls,
+                "img_name": img_name,
+                "img_path": img_path,
+                "output_path": os.path.join(class_output, f"{base_name}.jpg"),
+                "config_hash": cfg_hash,
+                "previous": previous
+            })
+    
+    skipped = len(present) - len(tasks)
+    print(f"📋 {skipped} images up to date, {len(tasks)} to process\n")
+    
+    # Process in parallel, checkpointing the manifest as results come in
+    start = time.perf_counter()
+    done = 0
+    unchanged = 0
+    if tasks:
+        with ProcessPoolExecutor(max_workers=num_workers) as pool:
+            chunks = [tasks[i:i + CHUNK_SIZE] for i in range(0, len(tasks), CHUNK_SIZE)]
+            futures = {pool.submit(process_chunk, [{k: v for k, v in task.items() if k != "key"}
+                                                   for task in chunk]): chunk
+                       for chunk in chunks}
             try:
-                # Read image with PIL (better quality than cv2)
-                img = Image.open(img_path).convert('RGB')
-                
-                # Step 1: Center crop to square (no padding)
-                cropped, metadata = center_crop_resize(img, TARGET_SIZE)
-                
-                # Step 2: Subtle quality enhancement (no aggressive processing)
-                enhanced = enhance_quality(cropped)
-                
-                # Step 3: Quality check
-                quality = quality_check(enhanced)
-                
-                # Save processed image with maximum quality
-                base_name = os.path.splitext(img_name)[0]
-                output_path = os.path.join(class_output, f"{base_name}.jpg")
-                enhanced.save(output_path, 'JPEG', quality=98, optimize=True, subsampling=0)
-                
-                # Log quality issues
-                if quality["is_too_dark"] or quality["is_too_bright"] or quality["is_low_contrast"]:
-                    class_stats["quality_issues"].append({
-                        "filename": img_name,
-                        "quality": quality,
-                        "metadata": metadata
-                    })
-                
-                class_stats["processed"] += 1
-                
-            except Exception as e:
-                print(f"   ⚠️  Failed: {img_name} - {e}")
-                class_stats["failed"] += 1
-        
-        processing_log["classes"][cls] = class_stats
-        print(f"   ✅ Processed: {class_stats['processed']}/{len(images)}")
-        
-        if class_stats["quality_issues"]:
-            print(f"   ⚠️  Quality issues: {len(class_stats['quality_issues'])}")
+                for future in as_completed(futures):
+                    for task, entry in zip(futures[future], future.result()):
+                        unchanged += entry.pop("unchanged", False)
+                        manifest["images"][task["key"]] = entry
+                        done += 1
+                        
+                        if entry["status"] == "failed":
+                            print(f"   ⚠️  Failed: {task['key']} - {entry['error']}")
+                        if done % CHECKPOINT_EVERY == 0:
+                            save_json(MANIFEST_PATH, manifest)
+                            print(f"   ... {done}/{len(tasks)} images")
+            except KeyboardInterrupt:
+                pool.shutdown(wait=False, cancel_futures=True)
+                save_json(MANIFEST_PATH, manifest)
+                print(f"\n⏸️  Interrupted after {done}/{len(tasks)} images, re-run to resume")
+                raise
+    
+    # Sources deleted since the last run
+    manifest["images"] = {key: entry for key, entry in manifest["images"].items() if key in present}
+    save_json(MANIFEST_PATH, manifest)
+    elapsed = time.perf_counter() - start
+    
+    processing_log = build_processing_log(config, classes, manifest)
+    for cls, class_stats in processing_log["classes"].items():
+        print(f"📁 {cls}: {class_stats['processed']}/{class_stats['total_images']} processed"
+              + (f", {len(class_stats['quality_issues'])} quality issues" if class_stats["quality_issues"] else "")
+              + (f", {len(class_stats['near_duplicates'])} near-duplicates" if class_stats["near_duplicates"] else ""))
     
     # Save processing log
     log_path = os.path.join(PROCESSED_DIR, "preprocessing_log.json")
-    with open(log_path, 'w') as f:
-        json.dump(processing_log, f, indent=2)
+    save_json(log_path, processing_log)
     
     print(f"\n✅ Preprocessing complete!")
+    print(f"⚡ {done - unchanged} images processed in {elapsed:.1f}s "
+          f"({(done - unchanged) / elapsed if elapsed else 0:.1f} img/s), {skipped + unchanged} unchanged")
     print(f"📊 Log saved: {log_path}")
+    print(f"📋 Manifest: {MANIFEST_PATH}")
 
 # ===============================
 # RUN
@@ -0,0 +1,230 @@
+"""
+Packed dataset shards: turns dataset/splits/<split>/<class>/*.jpg into a few
+.npy files of pre-resized uint8 images that are memory-mapped for training and
+evaluation, instead of opening and decoding thousands of small JPEGs per epoch.
+
+Layout of dataset/shards/<split>/:
+    shard_000.npy ...   uint8 (n, size, size, 3) images, RGB
+    labels.npy          int64 (N,) class index of every sample
+    index.npy           int64 (N, 2) (shard, row) of every sample
+    meta.json           size, classes, shard files, source paths (written last)
+
+Usage: python scripts/shard_dataset.py [--splits train val test] [--size 384] [--workers 4]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from dataset_utils import list_images
+from preprocess_phone_images import TARGET_SIZE
+
+# ===============================
+# CONFIG
+# ===============================
+SPLITS_DIR = "dataset/splits"
+SHARDS_DIR = "dataset/shards"
+SPLITS = ["train", "val", "test"]
+SHARD_SIZE_MB = 1024
+NUM_WORKERS = os.cpu_count() or 1
+META_FILE = "meta.json"
+
+# ===============================
+# PACKING
+# ===============================
+def load_square(task: tuple) -> Optional[np.ndarray]:
+    """Worker: decode, center crop to a square and resize to (size, size, 3) uint8 (None if unreadable)"""
+    path, size = task
+    try:
+        img = Image.open(path)
+    except Exception:
+        return None
+    with img:
+        try:
+            img = img.convert('RGB')
+        except Exception:
+            return None
+        w, h = img.size
+        crop = min(w, h)
+        left, top = (w - crop) // 2, (h - crop) // 2
+        img = img.crop((left, top, left + crop, top + crop))
+        if crop != size:
+            img = img.resize((size, size), Image.LANCZOS)
+        return np.asarray(img, dtype=np.uint8)
+
+def pack_split(split_dir: str, output_dir: str, size: int = TARGET_SIZE,
+               shard_size_mb: int = SHARD_SIZE_MB, num_workers: int = NUM_WORKERS,
+               class_names: list = None) -> dict:
+    """
+    Pack one split directory into shards. Images are decoded on a process pool and
+    written in order straight into memory-mapped .npy files; meta.json is written
+    last, so a split without it is an interrupted pack. Unreadable images keep an
+    empty row in their shard but are left out of the index.
+    """
+    samples = [(path, label) for path, label in list_images(split_dir, class_names) if label is not None]
+    classes = class_names or sorted(d for d in os.listdir(split_dir)
+                                    if os.path.isdir(os.path.join(split_dir, d)))
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    meta_path = os.path.join(output_dir, META_FILE)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    per_shard = max(1, (shard_size_mb * 1024 ** 2) // (size * size * 3))
+    shards = []
+    labels, index, paths, failed = [], [], [], []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=num_workers) as pool:
+        for first in range(0, len(samples), per_shard):
+            chunk = samples[first:first + per_shard]
+            name = f"shard_{len(shards):03d}.npy"
+            tmp_path = os.path.join(output_dir, name + ".tmp")
+            array = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint8,
+                                              shape=(len(chunk), size, size, 3))
+
+            tasks = [(path, size) for path, _ in chunk]
+            for row, ((path, label), result) in enumerate(zip(chunk, pool.map(load_square, tasks, chunksize=8))):
+                if result is None:
+                    print(f"      ⚠️  Unreadable image skipped: {path}")
+                    failed.append(os.path.relpath(path, split_dir))
+                    continue
+                array[row] = result
+                labels.append(label)
+                index.append((len(shards), row))
+                paths.append(os.path.relpath(path, split_dir))
+            array.flush()
+            del array
+            os.replace(tmp_path, os.path.join(output_dir, name))
+            shards.append({"file": name, "count": len(chunk)})
+            print(f"   📦 {name}: {len(chunk)} images")
+    elapsed = time.perf_counter() - start
+
+    np.save(os.path.join(output_dir, "labels.npy"), np.array(labels, dtype=np.int64))
+    np.save(os.path.join(output_dir, "index.npy"), np.array(index, dtype=np.int64).reshape(-1, 2))
+
+    meta = {
+        "size": size,
+        "count": len(labels),
+        "classes": classes,
+        "shards": shards,
+        "paths": paths,
+        "failed": failed,
+        "pack_seconds": elapsed
+    }
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+# ===============================
+# READER
+# ===============================
+class ShardDataset:
+    """
+    Random access to a packed split. Shards are memory-mapped read-only, so
+    dataset[i] is a zero-copy (size, size, 3) uint8 view and the page cache is
+    shared by every DataLoader worker. The maps are opened lazily in each process
+    (and dropped when pickled) so workers never copy the arrays.
+
+    Works as a torch Dataset: without a transform use collate_shards, which
+    copies each batch once into a (B, size, size, 3) uint8 tensor; pass
+    transform=... to convert per sample, e.g. Image.fromarray for torchvision pipelines.
+    """
+
+    def __init__(self, root: str, transform=None):
+        self.root = root
+        self.transform = transform
+        with open(os.path.join(root, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.classes = self.meta["classes"]
+        self.size = self.meta["size"]
+        self.labels = np.load(os.path.join(root, "labels.npy"))
+        self.index = np.load(os.path.join(root, "index.npy"))
+        self._shards = None
+
+    @property
+    def shards(self) -> list:
+        if self._shards is None:
+            self._shards = [np.load(os.path.join(self.root, shard["file"]), mmap_mode='r')
+                            for shard in self.meta["shards"]]
+        return self._shards
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_shards"] = None
+        return state
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, idx):
+        shard, row = self.index[idx]
+        image = self.shards[shard][row]
+        if self.transform:
+            image = self.transform(image)
+        return image, int(self.labels[idx])
+
+    def path(self, idx: int) -> str:
+        """Source image of a sample, relative to the split directory it was packed from"""
+        return self.meta["paths"][idx]
+
+def collate_shards(batch: list) -> tuple:
+    """DataLoader collate_fn for untransformed samples: one copy out of the read-only maps"""
+    import torch
+    images, labels = zip(*batch)
+    return torch.from_numpy(np.stack(images)), torch.tensor(labels)
+
+# ===============================
+# MAIN
+# ===============================
+def read_throughput(dataset: ShardDataset) -> float:
+    """Images/sec of a random-order pass reading from every image"""
+    order = np.random.default_rng(0).permutation(len(dataset))
+    start = time.perf_counter()
+    checksum = 0
+    for idx in order:
+        image, _ = dataset[idx]
+        checksum += int(image[::32, ::32].sum())
+    elapsed = time.perf_counter() - start
+    return len(order) / elapsed if elapsed else 0.0
+
+def pack_splits(splits: list, size: int, shard_size_mb: int, num_workers: int):
+    """Pack every split found under SPLITS_DIR into SHARDS_DIR"""
+    print(f"📦 Packing {SPLITS_DIR} → {SHARDS_DIR} ({size}×{size} uint8, ≤{shard_size_mb} MB shards, "
+          f"{num_workers} workers)\n")
+
+    class_names = None
+    for split in splits:
+        split_dir = os.path.join(SPLITS_DIR, split)
+        if not os.path.isdir(split_dir):
+            print(f"   ⚠️  {split_dir} not found, skipping")
+            continue
+
+        # Every split shares the class order of the first one packed
+        print(f"🔄 {split}")
+        meta = pack_split(split_dir, os.path.join(SHARDS_DIR, split), size, shard_size_mb,
+                          num_workers, class_names)
+        class_names = class_names or meta["classes"]
+
+        dataset = ShardDataset(os.path.join(SHARDS_DIR, split))
+        size_mb = sum(os.path.getsize(os.path.join(dataset.root, s["file"])) for s in meta["shards"]) / 1024 ** 2
+        print(f"   ✅ {meta['count']} images in {len(meta['shards'])} shards ({size_mb:.0f} MB) "
+              f"in {meta['pack_seconds']:.1f}s, random read {read_throughput(dataset):.0f} img/s\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--splits', nargs='+', default=SPLITS)
+    parser.add_argument('--size', type=int, default=TARGET_SIZE)
+    parser.add_argument('--shard-size-mb', type=int, default=SHARD_SIZE_MB)
+    parser.add_argument('--workers', type=int, default=NUM_WORKERS)
+    args = parser.parse_args()
+
+    pack_splits(args.splits, args.size, args.shard_size_mb, args.workers)
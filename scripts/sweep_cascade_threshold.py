@@ -0,0 +1,154 @@
+"""
+Sweep the MobileNetV3 -> EfficientNet-B3 cascade threshold (CASCADE_THRESHOLD in app.py)
+on the test split and report accuracy against mean latency.
+
+Both models are run once per image; every threshold is then evaluated from the
+recorded probabilities and per-image stage latencies.
+
+Usage: python scripts/sweep_cascade_threshold.py [--test-dir dataset/splits/test]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+os.environ['INFERENCE_MODE'] = 'cascade'
+os.environ.setdefault('BATCHING_ENABLED', '0')
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import torch
+
+import app
+from dataset_utils import list_images
+
+# ===============================
+# CONFIG
+# ===============================
+TEST_DIR = "dataset/splits/test"
+REPORT_PATH = "models/cascade_sweep.json"
+THRESHOLDS = [round(0.50 + 0.01 * i, 2) for i in range(50)]
+MAX_ACCURACY_DROP = 0.5  # points of accuracy we accept to lose against EfficientNet-B3 alone
+
+# ===============================
+# HELPERS
+# ===============================
+def timed_softmax(model, tensor: torch.Tensor):
+    """Softmax of a single-image forward pass and its latency in seconds"""
+    start = time.perf_counter()
+    with torch.no_grad():
+        probabilities = torch.nn.functional.softmax(model(tensor.to(app.device)), dim=1)[0].cpu()
+    return probabilities, time.perf_counter() - start
+
+def record(samples: list) -> list:
+    """Run both stages on every image"""
+    records = []
+    for i, (path, label) in enumerate(samples, 1):
+        image = app.preprocessor.load(path)
+
+        probs1, time1 = timed_softmax(app.stage1_model, app.stage1_preprocessor(image))
+        probs2, time2 = timed_softmax(app.model, app.preprocess_image(image))
+
+        records.append({
+            'label': label,
+            'stage1_confidence': probs1.max().item(),
+            'stage1_prediction': probs1.argmax().item(),
+            'stage2_prediction': probs2.argmax().item(),
+            'stage1_ms': time1 * 1000,
+            'stage2_ms': time2 * 1000
+        })
+        if i % 50 == 0:
+            print(f"   {i}/{len(samples)} images")
+    return records
+
+def evaluate(records: list, threshold: float) -> dict:
+    """Accuracy, mean latency and escalation rate of the cascade at `threshold`"""
+    correct = 0
+    escalated = 0
+    latency = 0.0
+    for r in records:
+        if r['stage1_confidence'] >= threshold:
+            prediction = r['stage1_prediction']
+            latency += r['stage1_ms']
+        else:
+            prediction = r['stage2_prediction']
+            latency += r['stage1_ms'] + r['stage2_ms']
+            escalated += 1
+        correct += prediction == r['label']
+
+    return {
+        'threshold': threshold,
+        'accuracy': 100 * correct / len(records),
+        'mean_latency_ms': latency / len(records),
+        'escalation_rate': 100 * escalated / len(records)
+    }
+
+# ===============================
+# MAIN
+# ===============================
+def sweep_cascade_threshold(test_dir: str, max_images: int, report_path: str):
+    """Evaluate every threshold and suggest the fastest one within MAX_ACCURACY_DROP"""
+    if app.stage1_model is None:
+        print("❌ Cascade could not be loaded (both checkpoints are needed in models/)")
+        return
+
+    samples = [(p, l) for p, l in list_images(test_dir, app.CLASS_NAMES, max_images) if l is not None]
+    if not samples:
+        print(f"❌ No labelled images found in {test_dir}")
+        return
+
+    print(f"🪜 Cascade threshold sweep on {len(samples)} images from {test_dir}\n")
+    records = record(samples)
+
+    n = len(records)
+    baselines = {
+        'mobilenetv3_only': {
+            'accuracy': 100 * sum(r['stage1_prediction'] == r['label'] for r in records) / n,
+            'mean_latency_ms': sum(r['stage1_ms'] for r in records) / n
+        },
+        'efficientnet_only': {
+            'accuracy': 100 * sum(r['stage2_prediction'] == r['label'] for r in records) / n,
+            'mean_latency_ms': sum(r['stage2_ms'] for r in records) / n
+        }
+    }
+    results = [evaluate(records, t) for t in THRESHOLDS]
+
+    target = baselines['efficientnet_only']['accuracy'] - MAX_ACCURACY_DROP
+    candidates = [r for r in results if r['accuracy'] >= target]
+    suggested = min(candidates, key=lambda r: r['mean_latency_ms']) if candidates else None
+
+    print(f"\n{'='*60}")
+    print(f"{'Threshold':>9s} {'Accuracy %':>11s} {'Mean ms':>9s} {'Escalated %':>12s}")
+    for r in results:
+        marker = '  ←' if r is suggested else ''
+        print(f"{r['threshold']:9.2f} {r['accuracy']:11.2f} {r['mean_latency_ms']:9.1f} {r['escalation_rate']:12.1f}{marker}")
+    print(f"{'-'*60}")
+    for name, b in baselines.items():
+        print(f"{name:20s} accuracy {b['accuracy']:.2f}%  mean {b['mean_latency_ms']:.1f} ms")
+    if suggested:
+        print(f"\n✅ Suggested CASCADE_THRESHOLD={suggested['threshold']:.2f} "
+              f"({suggested['accuracy']:.2f}%, {suggested['mean_latency_ms']:.1f} ms)")
+    print(f"{'='*60}")
+
+    Path(report_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(report_path, 'w') as f:
+        json.dump({
+            'test_dir': test_dir,
+            'num_images': n,
+            'max_accuracy_drop': MAX_ACCURACY_DROP,
+            'baselines': baselines,
+            'thresholds': results,
+            'suggested_threshold': suggested['threshold'] if suggested else None
+        }, f, indent=2)
+    print(f"📄 Report: {report_path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--test-dir', default=TEST_DIR)
+    parser.add_argument('--max-images', type=int, default=None)
+    parser.add_argument('--report', default=REPORT_PATH)
+    args = parser.parse_args()
+
+    sweep_cascade_threshold(args.test_dir, args.max_images, args.report)
@@ -0,0 +1,242 @@
+"""
+Head-only training and evaluation on cached backbone features
+(scripts/feature_cache.py): the EfficientNet-B3 backbone stays frozen, only the
+final linear layer is fitted, so adding a class to dataset/splits or re-tuning
+the classifier takes seconds on a CPU.
+
+The best head on the val split is written into a copy of the checkpoint
+(models/model_efficientnet_head.pth), served by app.py through
+models/registry.json. With --evaluate-only, the head of the current checkpoint
+is scored on the cached features instead.
+
+Usage: python scripts/train_head.py [--epochs 100] [--lr 1e-3] [--views flip rotate_15]
+                                    [--output models/model_efficientnet_head.pth] [--evaluate-only]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import torch
+import torch.nn as nn
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from feature_cache import FEATURES_DIR, load_manifest, load_split
+from prediction_cache import file_fingerprint
+
+# ===============================
+# CONFIG
+# ===============================
+CHECKPOINT_PATH = "models/model_efficientnet_best.pth"
+OUTPUT_PATH = "models/model_efficientnet_head.pth"
+REPORT_PATH = "models/head_report.json"
+EPOCHS = 100
+BATCH_SIZE = 256
+LEARNING_RATE = 1e-3
+WEIGHT_DECAY = 1e-4
+DROPOUT = 0.3            # dropout_rate of efficientnet-b3 before its final layer
+PATIENCE = 15            # epochs without val improvement before stopping
+RANDOM_SEED = 42
+
+# ===============================
+# HEAD
+# ===============================
+def initial_head(state_dict: dict, model_classes: list, classes: list) -> nn.Linear:
+    """
+    Linear head for `classes`, starting from the rows of the checkpoint head
+    for the classes it already knows (new classes start from a random row)
+    """
+    weight, bias = state_dict['_fc.weight'], state_dict['_fc.bias']
+    head = nn.Linear(weight.shape[1], len(classes))
+    with torch.no_grad():
+        for i, cls in enumerate(classes):
+            if cls in model_classes:
+                head.weight[i] = weight[model_classes.index(cls)]
+                head.bias[i] = bias[model_classes.index(cls)]
+    return head
+
+def evaluate(head: nn.Module, features: torch.Tensor, labels: torch.Tensor, classes: list) -> dict:
+    """Accuracy, per-class recall and confusion matrix of a head on cached features"""
+    head.eval()
+    with torch.no_grad():
+        predicted = head(features).argmax(1)
+    confusion = torch.zeros(len(classes), len(classes), dtype=torch.int64)
+    confusion.index_put_((labels, predicted), torch.ones_like(labels), accumulate=True)
+    support = confusion.sum(1)
+    return {
+        'samples': len(labels),
+        'accuracy': round((predicted == labels).float().mean().item() * 100, 2) if len(labels) else None,
+        'per_class_recall': {cls: round(confusion[i, i].item() / support[i].item() * 100, 2)
+                             for i, cls in enumerate(classes) if support[i]},
+        'confusion_matrix': confusion.tolist()
+    }
+
+def train(head: nn.Linear, train_x: torch.Tensor, train_y: torch.Tensor, val_x: torch.Tensor,
+          val_y: torch.Tensor, epochs: int, lr: float, batch_size: int) -> tuple:
+    """
+    Fit the head with AdamW on standardized features (the standardization is
+    folded back into the weights at the end); returns (best head on val by
+    accuracy then loss, best epoch, epochs run)
+    """
+    mean, std = train_x.mean(0), train_x.std(0) + 1e-6
+    train_x, val_x = (train_x - mean) / std, (val_x - mean) / std
+    with torch.no_grad():
+        # w·x + b = (w * std)·((x - mean) / std) + b + w·mean
+        head.bias += head.weight @ mean
+        head.weight *= std
+
+    generator = torch.Generator().manual_seed(RANDOM_SEED)
+    model = nn.Sequential(nn.Dropout(DROPOUT), head)
+    optimizer = torch.optim.AdamW(head.parameters(), lr=lr, weight_decay=WEIGHT_DECAY)
+    scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, epochs)
+    criterion = nn.CrossEntropyLoss()
+
+    best = ((-1.0, float('-inf')), {k: v.clone() for k, v in head.state_dict().items()}, 0)
+    for epoch in range(1, epochs + 1):
+        model.train()
+        order = torch.randperm(len(train_y), generator=generator)
+        total = 0.0
+        for first in range(0, len(order), batch_size):
+            idx = order[first:first + batch_size]
+            optimizer.zero_grad()
+            loss = criterion(model(train_x[idx]), train_y[idx])
+            loss.backward()
+            optimizer.step()
+            total += loss.item() * len(idx)
+        scheduler.step()
+
+        head.eval()
+        with torch.no_grad():
+            logits = head(val_x)
+            val_acc = (logits.argmax(1) == val_y).float().mean().item() * 100 if len(val_y) else 0.0
+            val_loss = criterion(logits, val_y).item() if len(val_y) else total / len(order)
+        if (val_acc, -val_loss) > best[0]:
+            best = ((val_acc, -val_loss), {k: v.clone() for k, v in head.state_dict().items()}, epoch)
+        if epoch == 1 or epoch % 10 == 0:
+            print(f"   Epoch {epoch:3d}: loss {total / len(order):.4f} | val loss {val_loss:.4f} | "
+                  f"val acc {val_acc:.2f}%")
+        if epoch - best[2] >= PATIENCE:
+            print(f"   ⏹️  No val improvement for {PATIENCE} epochs")
+            break
+
+    head.load_state_dict(best[1])
+    with torch.no_grad():
+        head.weight /= std
+        head.bias -= head.weight @ mean
+    return head, best[2], epoch
+
+# ===============================
+# MAIN
+# ===============================
+def train_head(root: str = FEATURES_DIR, checkpoint_path: str = CHECKPOINT_PATH, output: str = OUTPUT_PATH,
+               report_path: str = REPORT_PATH, epochs: int = EPOCHS, lr: float = LEARNING_RATE,
+               batch_size: int = BATCH_SIZE, views: list = None, evaluate_only: bool = False):
+    """Train (or only evaluate) the classifier head from the feature cache"""
+    if not os.path.exists(os.path.join(root, "manifest.json")):
+        print(f"❌ No feature cache in {root}: run scripts/feature_cache.py first")
+        return
+    if not os.path.exists(checkpoint_path):
+        print(f"❌ {checkpoint_path} not found")
+        return
+
+    manifest = load_manifest(root)
+    if file_fingerprint(checkpoint_path) != manifest["backbone"]:
+        print(f"❌ The features of {root} were extracted with another checkpoint than {checkpoint_path}: "
+              f"run scripts/feature_cache.py again")
+        return
+
+    torch.manual_seed(RANDOM_SEED)
+    start = time.perf_counter()
+    classes, model_classes = manifest["classes"], manifest["model_classes"]
+    splits = {}
+    for split in ("train", "val", "test"):
+        if split in manifest["splits"]:
+            x, y = load_split(split, root, views if split == "train" else [])
+            splits[split] = torch.from_numpy(x), torch.from_numpy(y)
+    load_seconds = time.perf_counter() - start
+
+    checkpoint = torch.load(checkpoint_path, map_location='cpu')
+    state_dict = checkpoint['model_state_dict']
+    new_classes = [cls for cls in classes if cls not in model_classes]
+
+    print(f"🎯 Head-only {'evaluation' if evaluate_only else 'training'}: {root} → "
+          f"{report_path if evaluate_only else output}")
+    print(f"Classes: {len(classes)} (new: {', '.join(new_classes) or 'none'}) | "
+          + " | ".join(f"{split}: {len(y)}" for split, (_, y) in splits.items())
+          + f" | features loaded in {load_seconds:.2f}s\n")
+
+    report = {'features': root, 'checkpoint': checkpoint_path, 'classes': classes}
+    if evaluate_only:
+        if new_classes or len(classes) != len(model_classes):
+            print(f"❌ The checkpoint head predicts {len(model_classes)} classes, the dataset has {len(classes)}")
+            return
+        head = initial_head(state_dict, model_classes, classes)
+    else:
+        if "train" not in splits:
+            print("❌ No train split in the feature cache")
+            return
+        head = initial_head(state_dict, model_classes, classes)
+        train_x, train_y = splits["train"]
+        val_x, val_y = splits.get("val", (train_x[:0], train_y[:0]))
+        train_start = time.perf_counter()
+        head, best_epoch, epochs_run = train(head, train_x, train_y, val_x, val_y, epochs, lr, batch_size)
+        report.update({
+            'output': output,
+            'train_samples': len(train_y),
+            'views': views,
+            'epochs_run': epochs_run,
+            'best_epoch': best_epoch,
+            'train_seconds': round(time.perf_counter() - train_start, 2)
+        })
+
+    for split in ("val", "test"):
+        if split in splits:
+            report[split] = evaluate(head, *splits[split], classes)
+
+    if not evaluate_only:
+        # Same checkpoint format as the training notebooks, loadable by the registry
+        state_dict = dict(state_dict, **{'_fc.weight': head.weight.detach().clone(),
+                                         '_fc.bias': head.bias.detach().clone()})
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        torch.save({**checkpoint, 'model_state_dict': state_dict, 'class_names': classes,
+                    'head_only': {'backbone': manifest["backbone"], 'best_epoch': report['best_epoch']}}, output)
+
+    Path(report_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(f"\n{'='*60}")
+    print(f"✅ Done in {time.perf_counter() - start:.1f}s")
+    for split in ("val", "test"):
+        if split in report:
+            print(f"   - {split} accuracy: {report[split]['accuracy']}% ({report[split]['samples']} images)")
+    if not evaluate_only:
+        print(f"\n💾 Checkpoint: {output}")
+        print(f"   Serve it with models/registry.json:")
+        print('   ' + json.dumps({"efficientnet_head": {"path": output, "arch": "efficientnet_b3",
+                                                       "image_size": 300, "class_names": classes}},
+                                  ensure_ascii=False))
+    print(f"\n📄 Report: {report_path}")
+    print(f"{'='*60}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--features', default=FEATURES_DIR)
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH)
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    parser.add_argument('--report', default=REPORT_PATH)
+    parser.add_argument('--epochs', type=int, default=EPOCHS)
+    parser.add_argument('--lr', type=float, default=LEARNING_RATE)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--views', nargs='*', default=None,
+                        help="augmented train views to use (default: every cached one)")
+    parser.add_argument('--evaluate-only', action='store_true', help="score the checkpoint head, no training")
+    args = parser.parse_args()
+
+    train_head(args.features, args.checkpoint, args.output, args.report, args.epochs, args.lr,
+               args.batch_size, args.views, args.evaluate_only)
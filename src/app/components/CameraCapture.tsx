@@ -1,5 +1,10 @@
 import { useEffect, useRef, useState } from "react";
 import { Camera, X, FlipHorizontal } from "lucide-react";
+import { openFrameStream, StreamPrediction } from "../services/api";
+
+// Live preview: downscaled frames sent over the camera stream
+const LIVE_FRAME_SIZE = 320;
+const LIVE_FRAME_INTERVAL_MS = 200;
 
 interface CameraCaptureProps {
   isOpen: boolean;
@@ -14,7 +19,10 @@ export function CameraCapture({
 }: CameraCaptureProps) {
   const videoRef = useRef<HTMLVideoElement>(null);
   const canvasRef = useRef<HTMLCanvasElement>(null);
+  const liveCanvasRef = useRef<HTMLCanvasElement>(null);
   const [stream, setStream] = useState<MediaStream | null>(null);
+  const [livePrediction, setLivePrediction] =
+    useState<StreamPrediction | null>(null);
   const [error, setError] = useState<string>("");
   const [facingMode, setFacingMode] = useState<"user" | "environment">(
     "environment",
@@ -32,6 +40,38 @@ export function CameraCapture({
     };
   }, [isOpen, facingMode]);
 
+  useEffect(() => {
+    if (!isOpen || !stream) return;
+
+    const frames = openFrameStream((result) => {
+      if (result.success) {
+        setLivePrediction(result);
+      }
+    });
+
+    const timer = window.setInterval(() => {
+      const video = videoRef.current;
+      const canvas = liveCanvasRef.current;
+      const context = canvas?.getContext("2d");
+      if (!video || !canvas || !context || !video.videoWidth) return;
+
+      const scale = Math.min(
+        1,
+        LIVE_FRAME_SIZE / Math.max(video.videoWidth, video.videoHeight),
+      );
+      canvas.width = Math.round(video.videoWidth * scale);
+      canvas.height = Math.round(video.videoHeight * scale);
+      context.drawImage(video, 0, 0, canvas.width, canvas.height);
+      canvas.toBlob((blob) => blob && frames.send(blob), "image/jpeg", 0.7);
+    }, LIVE_FRAME_INTERVAL_MS);
+
+    return () => {
+      window.clearInterval(timer);
+      frames.close();
+      setLivePrediction(null);
+    };
+  }, [isOpen, stream]);
+
   const startCamera = async () => {
     try {
       setError("");
@@ -139,6 +179,19 @@ export function CameraCapture({
                 className="w-full h-full object-cover"
               />
 
+              {/* Live prediction overlay */}
+              {livePrediction && (
+                <div className="absolute top-4 left-4 px-3 py-2 bg-black/60 backdrop-blur-sm rounded-lg text-white text-sm">
+                  <span className="font-semibold capitalize">
+                    {livePrediction.predicted_class}
+                  </span>{" "}
+                  {livePrediction.confidence?.toFixed(1)}%
+                  <span className="ml-2 text-white/60">
+                    {Math.round(livePrediction.latency_ms ?? 0)} ms
+                  </span>
+                </div>
+              )}
+
               {/* Camera controls overlay */}
               <div className="absolute bottom-0 left-0 right-0 p-6 bg-gradient-to-t from-black/60 to-transparent">
                 <div className="flex items-center justify-center gap-4">
@@ -165,6 +218,7 @@ export function CameraCapture({
 
         {/* Hidden canvas for capture */}
         <canvas ref={canvasRef} className="hidden" />
+        <canvas ref={liveCanvasRef} className="hidden" />
 
         {/* Instructions */}
         <div className="p-4 bg-[var(--moroccan-beige)] text-sm text-center">
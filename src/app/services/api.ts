@@ -9,7 +9,7 @@ interface PredictionResponse {
     class: string;
     probability: number;
   }>;
-  image_path?: string;
+  pending_path?: string;
   error?: string;
 }
 
@@ -38,6 +38,110 @@ export const uploadImage = async (file: File): Promise<PredictionResponse> => {
   }
 };
 
+export interface BatchPredictionLine extends PredictionResponse {
+  index?: number;
+  filename?: string;
+  stage?: string;
+  cached?: boolean;
+  done?: boolean;
+  total?: number;
+  failed?: number;
+}
+
+// Classify many images (or zip/tar archives) in one call; results arrive as NDJSON lines
+export const uploadImages = async (
+  files: File[],
+  onResult: (line: BatchPredictionLine) => void
+): Promise<void> => {
+  const formData = new FormData();
+  files.forEach((file) => {
+    const isArchive = /\.(zip|tar|tar\.gz|tgz)$/i.test(file.name);
+    formData.append(isArchive ? 'archive' : 'images', file);
+  });
+
+  try {
+    const response = await fetch(`${API_BASE_URL}/predict/batch`, {
+      method: 'POST',
+      body: formData,
+    });
+
+    if (!response.ok || !response.body) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      const lines = buffer.split('\n');
+      buffer = lines.pop() ?? '';
+      lines.filter((line) => line.trim()).forEach((line) => onResult(JSON.parse(line)));
+    }
+
+    if (buffer.trim()) {
+      onResult(JSON.parse(buffer));
+    }
+  } catch (error) {
+    console.error('Error uploading images:', error);
+    onResult({
+      success: false,
+      error: error instanceof Error ? error.message : 'Unknown error occurred'
+    });
+  }
+};
+
+export interface StreamPrediction extends PredictionResponse {
+  frame_id: number;
+  stage?: string;
+  smoothed_over?: number;
+  frame_prediction?: {
+    class: string;
+    confidence: number;
+  };
+  latency_ms?: number;
+  inference_ms?: number;
+  dropped?: number;
+}
+
+export interface FrameStream {
+  send: (frame: Blob) => void;
+  reset: () => void;
+  close: () => void;
+}
+
+// Live camera classification over one WebSocket (served by asgi.py, not by the Flask server).
+// The server only classifies the newest frame and averages results over the last frames.
+export const openFrameStream = (
+  onResult: (result: StreamPrediction) => void,
+  model?: string
+): FrameStream => {
+  const query = model ? `?model=${encodeURIComponent(model)}` : '';
+  const socket = new WebSocket(`${API_BASE_URL.replace(/^http/, 'ws')}/stream${query}`);
+
+  socket.onmessage = (event) => onResult(JSON.parse(event.data));
+  socket.onerror = () => console.error('Camera stream unavailable');
+
+  return {
+    // A frame is skipped while the previous one is still being uploaded
+    send: (frame) => {
+      if (socket.readyState === WebSocket.OPEN && socket.bufferedAmount === 0) {
+        socket.send(frame);
+      }
+    },
+    reset: () => {
+      if (socket.readyState === WebSocket.OPEN) {
+        socket.send('reset');
+      }
+    },
+    close: () => socket.close(),
+  };
+};
+
 export const checkHealth = async (): Promise<any> => {
   try {
     const response = await fetch(`${API_BASE_URL}/health`);
@@ -0,0 +1,71 @@
+"""
+Live camera classification over one persistent connection
+Frames are never queued: a frame that arrives while the previous one is being
+classified replaces any frame still waiting, so the model always works on the
+newest one. Predictions are averaged over the last frames classified.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Optional, Tuple
+
+import torch
+
+
+class FrameStream:
+    """
+    State of one streaming connection: a one-frame slot holding the newest
+    unclassified frame and the softmax outputs of the last `window` classified
+    frames. Only touched from the event loop.
+    """
+
+    def __init__(self, window: int = 5):
+        self.window = deque(maxlen=max(1, int(window)))
+        self.received = 0
+        self.classified = 0
+        self.dropped = 0
+        self.failed = 0
+        self._latest: Optional[Tuple[int, bytes, float]] = None
+        self._ready = asyncio.Event()
+
+    def push(self, data: bytes) -> int:
+        """Make `data` the next frame to classify; returns its frame id (1, 2, ... per connection)"""
+        self.received += 1
+        if self._latest is not None:
+            self.dropped += 1  # stale: never classified
+        self._latest = (self.received, data, time.perf_counter())
+        self._ready.set()
+        return self.received
+
+    def skip(self) -> int:
+        """Count a frame refused without classification (e.g. too large); returns its frame id"""
+        self.received += 1
+        self.failed += 1
+        return self.received
+
+    async def next_frame(self) -> Tuple[int, bytes, float]:
+        """Wait for a frame: (frame id, bytes, perf_counter() when it was received)"""
+        await self._ready.wait()
+        self._ready.clear()
+        frame, self._latest = self._latest, None
+        return frame
+
+    def smooth(self, probabilities: torch.Tensor) -> torch.Tensor:
+        """Add one frame's softmax output; returns the mean over the window"""
+        self.window.append(probabilities)
+        self.classified += 1
+        return torch.stack(tuple(self.window)).mean(0)
+
+    def reset(self):
+        """Forget the smoothing window, e.g. when the camera is pointed at another spice"""
+        self.window.clear()
+
+    def stats(self) -> dict:
+        return {
+            'received': self.received,
+            'classified': self.classified,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'window': self.window.maxlen
+        }
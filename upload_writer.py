@@ -0,0 +1,103 @@
+"""
+Sampled, asynchronous persistence of uploaded images
+Keeps a fraction of uploads on disk without blocking the prediction path
+"""
+
+import os
+import queue
+import random
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Optional
+
+
+class UploadWriter:
+    """
+    Write a random sample of uploads to `folder` from a background thread.
+    At most `retention` files are kept, the oldest are deleted first.
+    """
+
+    def __init__(self, folder: str, sample_rate: float = 0.01,
+                 retention: int = 1000, max_pending: int = 64):
+        self.folder = folder
+        self.sample_rate = min(1.0, max(0.0, float(sample_rate)))
+        self.retention = max(0, int(retention))
+
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+        self._kept = deque()
+        self.saved = 0
+        self.dropped = 0
+        self.failed = 0
+
+        os.makedirs(folder, exist_ok=True)
+        existing = [os.path.join(folder, f) for f in os.listdir(folder)]
+        existing = [f for f in existing if os.path.isfile(f)]
+        self._kept.extend(sorted(existing, key=os.path.getmtime))
+
+    def _ensure_worker(self):
+        """Start the writer thread (again after a fork)"""
+        if self._worker is not None and self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker_pid == os.getpid():
+                return
+            self._worker = threading.Thread(target=self._loop, name='upload-writer', daemon=True)
+            self._worker_pid = os.getpid()
+            self._worker.start()
+
+    def maybe_save(self, data: bytes, filename: str) -> Optional[str]:
+        """
+        Decide whether this upload is kept. Returns the path it is queued to
+        be written to (the write itself may still fail, see `failed`), or None
+        when it is not sampled (or the writer is busy).
+        """
+        if self.retention == 0 or self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f_')
+        filepath = os.path.join(self.folder, timestamp + filename)
+
+        self._ensure_worker()
+        try:
+            self._pending.put_nowait((filepath, data))
+        except queue.Full:
+            self.dropped += 1
+            return None
+        return filepath
+
+    def _loop(self):
+        """Writer thread: save pending uploads and enforce the retention cap"""
+        while True:
+            filepath, data = self._pending.get()
+            try:
+                with open(filepath, 'wb') as f:
+                    f.write(data)
+                self.saved += 1
+                self._kept.append(filepath)
+            except OSError as e:
+                self.failed += 1
+                print(f"⚠️  Could not save upload {filepath}: {e}")
+                continue
+
+            while len(self._kept) > self.retention:
+                oldest = self._kept.popleft()
+                try:
+                    os.remove(oldest)
+                except OSError:
+                    pass
+
+    def stats(self) -> dict:
+        """Sampling configuration and write counters"""
+        return {
+            'sample_rate': self.sample_rate,
+            'retention': self.retention,
+            'kept': len(self._kept),
+            'saved': self.saved,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'pending': self._pending.qsize()
+        }